@@ -4,7 +4,7 @@ from collections import Counter
 
 import pandas as pd
 
-from utils.code_file_check import is_code_file
+from utils.code_file_check import FileCategory, classify_paths
 
 
 def analyze_pr_and_issue_data(jsonl_file, issue_excel_file):
@@ -183,11 +183,8 @@ def analyze_pr_commit_and_file_statistics(jsonl_file):
         total_files += file_count
 
         # 代码文件数量统计
-        code_file_count = 0
-        for file_info in pr_files:
-            filename = file_info.get('filename', '')
-            if is_code_file(filename):
-                code_file_count += 1
+        file_categories = classify_paths(file_info.get('filename', '') for file_info in pr_files)
+        code_file_count = sum(1 for category in file_categories if category is FileCategory.CODE)
         code_file_count_distribution[code_file_count] += 1
         total_code_files += code_file_count
 
@@ -1,307 +1,476 @@
 import json
 import os
+from datetime import datetime, timezone
+from multiprocessing import Pool
+from pathlib import Path
 
+from data.pr_data.processing.schema_profiler import SchemaSketch, load_or_profile
 from utils.code_file_check import is_code_file
 from utils.diff_utils import get_diff_segments
 
 
-def get_all_keys_recursive(data, parent_key=''):
+def parse_time(value):
     """
-    递归获取数据结构中所有的key，包括嵌套对象中的key
+    解析 ISO 8601 时间字符串（支持结尾的 Z），不带时区的按 UTC 处理，无法解析时返回 None
+    时区偏移或格式不同的时间字符串不能按字典序比较，统一转成 datetime 后再比较
     """
-    keys = set()
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
-    if isinstance(data, dict):
-        for key, value in data.items():
-            full_key = f"{parent_key}.{key}" if parent_key else key
-            if key == 'pr_files':
-                continue
-            keys.add(full_key)
 
-            # 如果值是字典或列表，递归处理
-            if isinstance(value, dict):
-                keys.update(get_all_keys_recursive(value, full_key))
-            elif isinstance(value, list):
-                for i, item in enumerate(value):
-                    if isinstance(item, dict):
-                        keys.update(get_all_keys_recursive(item, f"{full_key}[{i}]"))
+# =========================
+# 单次扫描：每条记录只解析一次，派生字段只计算一次，再分发给各个统计器
+# =========================
+class NeedCheckRecord:
+    """
+    一条 *_with_files.jsonl 记录及其预先计算好的派生字段，供所有统计器共享
+    """
 
-    elif isinstance(data, list):
-        for i, item in enumerate(data):
-            if isinstance(item, dict):
-                keys.update(get_all_keys_recursive(item, f"[{i}]"))
+    def __init__(self, line_num, data):
+        self.line_num = line_num
+        self.data = data
+        self.pr_number = data.get('number')
+        self.diff_comment_num = data.get('diff_comment_num', 0)
+        self.commit_count = data.get('commit_count', 0)
+        self.pr_files = data.get('pr_files') or []
+        self.diff_comments = data.get('diff_comments') or []
+        # 如果user已注销，那么user_id为None
+        user = data.get('user')
+        self.user_id = user.get('id') if user else None
+
+        # 从pr_commits中获取最晚的提交时间（解析为带时区的 datetime 后比较）
+        commit_times = []
+        for commit in data.get('pr_commits') or []:
+            author = (commit.get('commit') or {}).get('author') or {}
+            commit_time = parse_time(author.get('date'))
+            if commit_time is not None:
+                commit_times.append(commit_time)
+        self.last_commit_time = max(commit_times) if commit_times else None
+
+        # 获取diff_comments中最早的评论时间
+        comment_times = [parse_time(c.get('created_at')) for c in self.diff_comments]
+        comment_times = [t for t in comment_times if t is not None]
+        self.early_comment_time = min(comment_times) if comment_times else None
+
+    @property
+    def comment_before_last_commit(self):
+        """评论时间早于最后一次提交时间，也即在评论后还更新了代码"""
+        return bool(self.early_comment_time and self.last_commit_time
+                    and self.early_comment_time < self.last_commit_time)
+
+
+class MetricAccumulator:
+    """
+    统计器基类：update 处理单条记录，merge 合并另一个分块的结果，summary 返回统计值，report 打印
+    hits 中保存 (行号, 描述)，分块扫描时行号为分块内的相对行号，merge 时统一加上偏移
+    """
+    name = 'metric'
 
-    return keys
+    def __init__(self):
+        self.hits = []
 
+    def update(self, record):
+        raise NotImplementedError
 
-def print_all_jsonl_keys(jsonl_file_path):
-    """
-    读取JSONL文件并打印每行数据的所有嵌套key
-    """
-    if not os.path.exists(jsonl_file_path):
-        print(f"文件 {jsonl_file_path} 不存在")
-        return
+    def merge(self, other, line_offset=0):
+        self.hits.extend((line_num + line_offset, text) for line_num, text in other.hits)
 
-    all_keys = set()
-    line_count = 0
+    def summary(self):
+        raise NotImplementedError
 
-    print(f"正在读取文件: {jsonl_file_path}")
-    print("-" * 50)
+    def report(self):
+        for line_num, text in sorted(self.hits, key=lambda hit: hit[0]):
+            print(f"第 {line_num} 行的 PR {text}")
 
-    with open(jsonl_file_path, 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
-                continue
 
-            try:
-                data = json.loads(line)
+class KeySchemaAccumulator(MetricAccumulator):
+    """统计所有记录中出现过的嵌套 key，使用有界的 SchemaSketch，列表只抽样前 max_list_items 个元素"""
+    name = 'key_schema'
 
-                # 获取当前行的所有key（包括嵌套的）
-                line_keys = get_all_keys_recursive(data)
-                all_keys.update(line_keys)
+    def __init__(self, verbose=False, max_list_items=3):
+        super().__init__()
+        self.verbose = verbose
+        self.sketch = SchemaSketch(max_list_items=max_list_items)
 
-                print(f"第 {line_num} 行的所有 keys: {sorted(list(line_keys))}")
-                line_count += 1
+    def update(self, record):
+        if self.verbose:
+            line_sketch = SchemaSketch(max_list_items=self.sketch.max_list_items)
+            line_sketch.add_record(record.data)
+            self.sketch.merge(line_sketch)
+            print(f"第 {record.line_num} 行的所有 keys: {line_sketch.keys()}")
+        else:
+            self.sketch.add_record(record.data)
 
-            except json.JSONDecodeError as e:
-                print(f"第 {line_num} 行 JSON 解析错误: {e}")
+    def merge(self, other, line_offset=0):
+        super().merge(other, line_offset)
+        self.sketch.merge(other.sketch)
 
-    print("-" * 50)
-    print(f"总共处理了 {line_count} 行数据")
-    print(f"所有出现的嵌套 keys: {sorted(list(all_keys))}")
-    print(f"keys 总数: {len(all_keys)}")
+    def summary(self):
+        return {'all_keys': self.sketch.keys(), 'key_count': len(self.sketch.fields), 'schema': self.sketch.to_dict()}
 
+    def report(self):
+        print(f"所有出现的嵌套 keys: {self.sketch.keys()}")
+        print(f"keys 总数: {len(self.sketch.fields)}")
 
 
-# 使用示例 - 替换为你实际的文件路径
-# 注意：根据原始代码，输出文件路径为 f"{REPO}/{OWNER}_{REPO}_pr_commit_comment_details_with_files.jsonl"
-# 即 "xts_acts/openharmony_xts_acts_pr_commit_comment_details_with_files.jsonl"
+class CommentBeforeLastCommitAccumulator(MetricAccumulator):
+    """情况1：在diff_comments中，有评论时间早于最后一次提交时间"""
+    name = 'comment_before_last_commit'
 
-def count_records_need_issue_detection(jsonl_file_path):
-    """
-    分别统计diff_comment_num>=threshold、commit_count>=threshold的数量，以及两者都>=threshold的数量
-    """
-    if not os.path.exists(jsonl_file_path):
-        print(f"文件 {jsonl_file_path} 不存在")
-        return 0, 0, 0
-    # 情况1： 在diff_comments中，有评论时间早于最后一次提交时间
-    early_comment_time_earlier_than_last_commit_time_count = 0
-    diff_comment_threshold = 1
-    commit_count_threshold = 2
-    diff_comment_ge_threshold = 0
-    commit_count_ge_threshold = 0
-    both_ge_threshold = 0
-    total_lines = 0
-    file_type_set = set()
+    def __init__(self):
+        super().__init__()
+        self.count = 0
 
-    print(f"正在读取文件: {jsonl_file_path}")
-    print(
-        f"统计 diff_comment_num >= {diff_comment_threshold}、commit_count >= {commit_count_threshold} 以及两者都满足的数据条数...")
-    print("-" * 70)
+    def update(self, record):
+        if not record.comment_before_last_commit:
+            return
+        self.count += 1
+        self.hits.append((
+            record.line_num,
+            f"{record.pr_number} 满足条件：early_comment_time = {record.early_comment_time.isoformat()} < "
+            f"last_commit_times = {record.last_commit_time.isoformat()} (评论时间早于最后一次提交时间)"
+            f"diff_comment_num = {record.diff_comment_num}, commit_count = {record.commit_count}  "
+            f"pr_files_len={len(record.pr_files)}"))
+
+    def merge(self, other, line_offset=0):
+        super().merge(other, line_offset)
+        self.count += other.count
+
+    def summary(self):
+        return {'early_comment_time_earlier_than_last_commit_time_count': self.count}
 
-    with open(jsonl_file_path, 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
+    def report(self):
+        super().report()
+        print(f"其中 early_comment_time_earlier_than_last_commit_time_count 的数据条数: {self.count}")
+
+
+class ThresholdAccumulator(MetricAccumulator):
+    """
+    情况2：不属于情况1的记录中，分别统计diff_comment_num>=threshold、commit_count>=threshold的数量，以及两者都>=threshold的数量
+    """
+    name = 'thresholds'
+
+    def __init__(self, diff_comment_threshold=1, commit_count_threshold=2):
+        super().__init__()
+        self.diff_comment_threshold = diff_comment_threshold
+        self.commit_count_threshold = commit_count_threshold
+        self.diff_comment_ge_threshold = 0
+        self.commit_count_ge_threshold = 0
+        self.both_ge_threshold = 0
+        self.total_lines = 0
+        self.file_type_set = set()
+
+    def update(self, record):
+        for pr_file in record.pr_files:
+            # 统计文件类型提取.后的文件名后缀名，如果后缀包含/说明没有扩展名
+            file_type = pr_file.get('filename').split('.')[-1]
+            self.file_type_set.add("no_extension" if '/' in file_type else file_type)
+        if record.comment_before_last_commit:
+            return
+        is_diff_ge_threshold = record.diff_comment_num >= self.diff_comment_threshold
+        is_commit_ge_threshold = record.commit_count >= self.commit_count_threshold
+        if is_diff_ge_threshold:
+            self.diff_comment_ge_threshold += 1
+            if is_commit_ge_threshold:
+                self.both_ge_threshold += 1
+        elif is_commit_ge_threshold:
+            self.commit_count_ge_threshold += 1
+        self.total_lines += 1
+
+    def merge(self, other, line_offset=0):
+        super().merge(other, line_offset)
+        self.diff_comment_ge_threshold += other.diff_comment_ge_threshold
+        self.commit_count_ge_threshold += other.commit_count_ge_threshold
+        self.both_ge_threshold += other.both_ge_threshold
+        self.total_lines += other.total_lines
+        self.file_type_set.update(other.file_type_set)
+
+    def summary(self):
+        return {
+            'diff_comment_ge_threshold': self.diff_comment_ge_threshold,
+            'commit_count_ge_threshold': self.commit_count_ge_threshold,
+            'both_ge_threshold': self.both_ge_threshold,
+            'total_lines': self.total_lines,
+            'file_type_set': sorted(self.file_type_set),
+        }
+
+    def report(self):
+        print(f"阈值统计共处理了 {self.total_lines} 行数据")
+        print(f"其中 diff_comment_num >= {self.diff_comment_threshold} 的数据条数: {self.diff_comment_ge_threshold}")
+        print(f"其中 commit_count >= {self.commit_count_threshold} 的数据条数: {self.commit_count_ge_threshold}")
+        print(
+            f"其中 diff_comment_num >= {self.diff_comment_threshold} 且 commit_count >= {self.commit_count_threshold} "
+            f"的数据条数: {self.both_ge_threshold}")
+        print(f"file_type_set: {self.file_type_set}")
+
+
+class SelfReviewAccumulator(MetricAccumulator):
+    """两个阈值都满足的记录中，看一下有多少是作者自己评论自己的PR的情况"""
+    name = 'self_review'
+
+    def __init__(self, diff_comment_threshold=1, commit_count_threshold=2):
+        super().__init__()
+        self.diff_comment_threshold = diff_comment_threshold
+        self.commit_count_threshold = commit_count_threshold
+        self.pr_count = 0
+        self.user_comment_total = 0
+
+    def update(self, record):
+        if record.comment_before_last_commit:
+            return
+        if record.diff_comment_num < self.diff_comment_threshold or record.commit_count < self.commit_count_threshold:
+            return
+        user_comment_num = 0
+        for comment in record.diff_comments:
+            if comment.get('user') is None:
+                if record.user_id is None:
+                    user_comment_num += 1
+            elif comment.get('user').get('id') == record.user_id:
+                user_comment_num += 1
+        self.pr_count += 1
+        self.user_comment_total += user_comment_num
+        self.hits.append((
+            record.line_num,
+            f"{record.pr_number} 满足条件 : diff_comment_num = {record.diff_comment_num}, "
+            f"user_comment_num = {user_comment_num}, commit_count = {record.commit_count} (两者都满足) "
+            f"pr_files_len={len(record.pr_files)}"))
+
+    def merge(self, other, line_offset=0):
+        super().merge(other, line_offset)
+        self.pr_count += other.pr_count
+        self.user_comment_total += other.user_comment_total
+
+    def summary(self):
+        return {'pr_count': self.pr_count, 'user_comment_total': self.user_comment_total}
+
+    def report(self):
+        super().report()
+        print(f"两者都满足的 PR 中作者自评论总数: {self.user_comment_total}，涉及 PR 数: {self.pr_count}")
+
+
+class CodeFileSegmentAccumulator(MetricAccumulator):
+    """统计落在代码文件 diff 段内的评论数量，每个 diff 段只计一次"""
+    name = 'code_file_segments'
+
+    def __init__(self):
+        super().__init__()
+        self.comment_in_diff_count = 0
+        self.comment_in_new_file_count = 0
+        self.comment_in_old_file_count = 0
+        self.pr_number_set = set()
+
+    @staticmethod
+    def _mark_segments(segments_by_path, paths, start_line, end_line, start_key, end_key):
+        """在同路径的每个文件中标记第一个覆盖评论行且尚未被评论的 diff 段，返回标记数量"""
+        marked = 0
+        for diff_segments in segments_by_path.get(paths, ()):
+            for segment in diff_segments:
+                if segment[start_key] <= start_line <= segment[end_key] and \
+                        segment[start_key] <= end_line <= segment[end_key] and segment['is_commented'] is False:
+                    segment['is_commented'] = True
+                    marked += 1
+                    break
+        return marked
+
+    def update(self, record):
+        if not record.diff_comments:
+            return
+        # 这里统计一下每个file对应的diff段，按 (old_path, new_path) 建索引
+        segments_by_path = {}
+        for pr_file in record.pr_files:
+            pr_file_patch = pr_file.get('patch') or {}
+            paths = (pr_file_patch.get('old_path'), pr_file_patch.get('new_path'))
+            segments_by_path.setdefault(paths, []).append(get_diff_segments(pr_file_patch.get('diff')))
+
+        # 逐一核对评论的位置，如果是代码文件,且old_path 和 new_path都存在那说明这个PR的这段提交需要被评审
+        for diff_comment in record.diff_comments:
+            comment_position = diff_comment.get('position') or {}
+            paths = (comment_position.get('old_path'), comment_position.get('new_path'))
+            if not (is_code_file(paths[0]) and is_code_file(paths[1])):
+                continue
+            diff_position = diff_comment.get('diff_position') or {}
+            start_new_line = diff_position.get('start_new_line')
+            end_new_line = diff_position.get('end_new_line')
+            if start_new_line is not None and end_new_line is not None:
+                marked = self._mark_segments(segments_by_path, paths, start_new_line, end_new_line,
+                                             'new_start', 'new_end')
+                if marked:
+                    self.comment_in_diff_count += marked
+                    self.comment_in_new_file_count += marked
+                    self.pr_number_set.add(record.pr_number)
+            start_old_line = diff_position.get('start_old_line')
+            end_old_line = diff_position.get('end_old_line')
+            if start_old_line is not None and end_old_line is not None:
+                marked = self._mark_segments(segments_by_path, paths, start_old_line, end_old_line,
+                                             'old_start', 'old_end')
+                if marked:
+                    self.comment_in_diff_count += marked
+                    self.comment_in_old_file_count += marked
+                    self.pr_number_set.add(record.pr_number)
+
+    def merge(self, other, line_offset=0):
+        super().merge(other, line_offset)
+        self.comment_in_diff_count += other.comment_in_diff_count
+        self.comment_in_new_file_count += other.comment_in_new_file_count
+        self.comment_in_old_file_count += other.comment_in_old_file_count
+        self.pr_number_set.update(other.pr_number_set)
+
+    def summary(self):
+        return {
+            'comment_in_diff_count': self.comment_in_diff_count,
+            'comment_in_new_file_count': self.comment_in_new_file_count,
+            'comment_in_old_file_count': self.comment_in_old_file_count,
+            'pr_number_count': len(self.pr_number_set),
+        }
+
+    def report(self):
+        print(f"其中comment_in_diff_count 的数据条数: {self.comment_in_diff_count} 涉及的pr_number数量: "
+              f"{len(self.pr_number_set)},comment_in_new_file_count:{self.comment_in_new_file_count},"
+              f"comment_in_old_file_count:{self.comment_in_old_file_count}")
+
+
+DEFAULT_ACCUMULATORS = (
+    KeySchemaAccumulator,
+    ThresholdAccumulator,
+    SelfReviewAccumulator,
+    CodeFileSegmentAccumulator,
+    CommentBeforeLastCommitAccumulator,
+)
+
+
+def _split_file_chunks(jsonl_file_path, chunk_count):
+    """按字节把文件切成 chunk_count 段，每段边界对齐到行首"""
+    file_size = os.path.getsize(jsonl_file_path)
+    bounds = [0]
+    with open(jsonl_file_path, 'rb') as f:
+        for i in range(1, chunk_count):
+            f.seek(file_size * i // chunk_count)
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < file_size:
+                bounds.append(pos)
+    bounds.append(file_size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _scan_chunk(task):
+    """扫描 [start, end) 字节区间，返回 (分块行数, 解析错误列表, 统计器列表)，行号为分块内相对行号"""
+    jsonl_file_path, start, end, accumulator_factories = task
+    accumulators = [factory() for factory in accumulator_factories]
+    errors = []
+    line_num = 0
+    pos = start
+    with open(jsonl_file_path, 'rb') as f:
+        f.seek(start)
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            line_num += 1
+            line = raw.decode('utf-8').strip()
             if not line:
                 continue
-
             try:
                 data = json.loads(line)
-                pr_file_list = data.get('pr_files', [])
-                for pr_file in pr_file_list:
-                    # 统计文件类型提取.后的文件名后缀名
-                    file_type = pr_file.get('filename').split('.')[-1]
-                    # 如果file_tupe包含/
-                    if '/' in file_type:
-                        file_type_set.add("no_extension")
-                    else:
-                        file_type_set.add(file_type)
-                # 获取diff_comment_num和commit_count的值
-                diff_comment_num = data.get('diff_comment_num', 0)
-                commit_count = data.get('commit_count', 0)
-                pr_file_len = len(data.get('pr_files', []))
-                pr_number = data.get('number')
-
-                # 从pr_commits中获取最晚的提交时间
-                pr_all_commits = data.get('pr_commits', [])
-                last_commit_times = None
-                for commit in pr_all_commits:
-                    if commit.get('commit') is None:
-                        continue
-                    if commit.get('commit').get('author') is None:
-                        continue
-                    if commit.get('commit').get('author').get('date') is None:
-                        continue
-                    commit_time = commit.get('commit').get('author').get('date')
-                    if last_commit_times is None:
-                        last_commit_times = commit_time
-                    elif commit_time > last_commit_times:
-                        last_commit_times = commit_time
-
-                # 获取diff_comments中最早的评论时间
-                diff_comments = data.get('diff_comments')
-                early_comment_time = None
-                if diff_comments:
-                    for comment in diff_comments:
-                        comment_time = comment.get('created_at')
-                        if early_comment_time is None:
-                            early_comment_time = comment_time
-                        elif comment_time < early_comment_time:
-                            early_comment_time = comment_time
-
-                # 如果user已注销，那么就用Commit中的user_id
-                if data.get('user') is None:
-                    user_id = None
-                else:
-                    user_id = data.get('user').get('id')
-                # 1.检测是否有评论时间早于最后一次提交时间的情况，也即在评论后还更新了代码
-                if early_comment_time and last_commit_times and early_comment_time < last_commit_times:
-                    early_comment_time_earlier_than_last_commit_time_count += 1
-                    print(
-                        f"第 {line_num} 行的 PR {pr_number} 满足条件：early_comment_time = {early_comment_time} < last_commit_times = {last_commit_times} (评论时间早于最后一次提交时间)"
-                        f"diff_comment_num = {diff_comment_num}, commit_count = {commit_count}  pr_files_len={pr_file_len}")
-                # 2. 统计diff_comment_num和commit_count的情况 如果这两者都大于threashold则纳入总数中
-                else:
-                    # 检查各个条件
-                    is_diff_ge_threshold = diff_comment_num >= diff_comment_threshold
-                    is_commit_ge_threshold = commit_count >= commit_count_threshold
-
-                    if is_diff_ge_threshold:
-                        diff_comment_ge_threshold += 1
-                        if is_commit_ge_threshold:
-                            # 看一下有多少是作者自己评论自己的PR的情况
-                            diff_comment = data.get('diff_comments')
-                            user_comment_num = 0
-                            for comment in diff_comment:
-                                if comment.get('user') is None:
-                                    if user_id is None:
-                                        user_comment_num += 1
-                                elif comment.get('user').get('id') == user_id:
-                                    user_comment_num += 1
-                            both_ge_threshold += 1
-                            print(
-                                f"第 {line_num} 行的 PR {pr_number} 满足条件 : diff_comment_num = {diff_comment_num}, user_comment_num = {user_comment_num}, commit_count = {commit_count} (两者都满足) pr_files_len={pr_file_len}")
-
-                    elif is_commit_ge_threshold:
-                        commit_count_ge_threshold += 1
-
-
-                    total_lines += 1
-
             except json.JSONDecodeError as e:
-                print(f"第 {line_num} 行 JSON 解析错误: {e}")
-
-    print("-" * 70)
-    print(f"总共处理了 {total_lines} 行数据")
-    print(
-        f"其中 early_comment_time_earlier_than_last_commit_time_count 的数据条数: {early_comment_time_earlier_than_last_commit_time_count}")
-    print(f"其中 diff_comment_num >= {diff_comment_threshold} 的数据条数: {diff_comment_ge_threshold}")
-    print(f"其中 commit_count >= {commit_count_threshold} 的数据条数: {commit_count_ge_threshold}")
-    print(
-        f"其中 diff_comment_num >= {diff_comment_threshold} 且 commit_count >= {commit_count_threshold} 的数据条数: {both_ge_threshold}")
-    print(f"总共的需要评审的记录数: {early_comment_time_earlier_than_last_commit_time_count + both_ge_threshold}")
-    print(f"file_type_set: {file_type_set}")
-
-    return diff_comment_ge_threshold, commit_count_ge_threshold, both_ge_threshold
+                errors.append((line_num, str(e)))
+                continue
+            record = NeedCheckRecord(line_num, data)
+            for accumulator in accumulators:
+                accumulator.update(record)
+    return line_num, errors, accumulators
 
 
+def scan_need_check_metrics(jsonl_file_path, accumulator_factories=DEFAULT_ACCUMULATORS, processes=1,
+                            print_report=True):
+    """
+    单次流式扫描 JSONL 文件：每条记录只解析一次，并同时喂给所有统计器
+    processes > 1 时按字节把文件切块，多进程并行扫描后按顺序合并
+    返回 {统计器名: summary} 字典
+    """
+    if not os.path.exists(jsonl_file_path):
+        print(f"文件 {jsonl_file_path} 不存在")
+        return {}
 
-def count_diff_need_check(jsonl_file_path):
+    print(f"正在读取文件: {jsonl_file_path}")
+    chunks = _split_file_chunks(jsonl_file_path, max(1, processes))
+    tasks = [(jsonl_file_path, start, end, tuple(accumulator_factories)) for start, end in chunks]
+    if processes > 1 and len(tasks) > 1:
+        with Pool(processes=min(processes, len(tasks))) as pool:
+            chunk_results = pool.map(_scan_chunk, tasks)
+    else:
+        chunk_results = [_scan_chunk(task) for task in tasks]
+
+    # 按分块顺序合并，行号加上前面分块的总行数
+    accumulators = None
+    errors = []
+    line_offset = 0
+    for chunk_line_count, chunk_errors, chunk_accumulators in chunk_results:
+        errors.extend((line_num + line_offset, message) for line_num, message in chunk_errors)
+        if accumulators is None:
+            accumulators = chunk_accumulators
+        else:
+            for accumulator, other in zip(accumulators, chunk_accumulators):
+                accumulator.merge(other, line_offset)
+        line_offset += chunk_line_count
+
+    if print_report:
+        print("-" * 70)
+        for line_num, message in errors:
+            print(f"第 {line_num} 行 JSON 解析错误: {message}")
+        for accumulator in accumulators:
+            accumulator.report()
+        print("-" * 70)
+        print(f"总共读取了 {line_offset} 行数据")
+    return {accumulator.name: accumulator.summary() for accumulator in accumulators}
+
+
+def print_all_jsonl_keys(jsonl_file_path, sample_size=None, max_list_items=3, refresh=False):
     """
-    分别统计diff_comment_num>=threshold、commit_count>=threshold的数量，以及两者都>=threshold的数量
+    推断JSONL文件的嵌套key结构并打印；推断结果持久化到 <文件名>.schema.json，文件未变化时直接复用
+    sample_size 不为空时对记录做蓄水池抽样，只解析被抽中的行
     """
     if not os.path.exists(jsonl_file_path):
         print(f"文件 {jsonl_file_path} 不存在")
-        return 0, 0, 0
-    # 情况1： 在diff_comments中，有评论时间早于最后一次提交时间
-    comment_in_diff_count = 0
-    comment_in_new_file_count = 0
-    comment_in_old_file_count = 0
-    total_lines = 0
+        return set()
+    sketch = load_or_profile(Path(jsonl_file_path), sample_size=sample_size, max_list_items=max_list_items,
+                             refresh=refresh)
+    print(f"总共分析了 {sketch.record_count} 行数据")
+    print(f"所有出现的嵌套 keys: {sketch.keys()}")
+    print(f"keys 总数: {len(sketch.fields)}")
+    return set(sketch.keys())
 
-    pr_number_set = set()
 
-    print(f"正在读取文件: {jsonl_file_path}")
+# 使用示例 - 替换为你实际的文件路径
+# 注意：根据原始代码，输出文件路径为 f"{REPO}/{OWNER}_{REPO}_pr_commit_comment_details_with_files.jsonl"
+# 即 "xts_acts/openharmony_xts_acts_pr_commit_comment_details_with_files.jsonl"
 
-    with open(jsonl_file_path, 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                data = json.loads(line)
-                pr_files = data.get('pr_files')
-                pr_number = data.get('number')
-                # 获取diff_comments中最早的评论时间
-                diff_comments = data.get('diff_comments')
-                # 这里统计一下每个file对应的diff段
-                file_path_segments = []
-                for pr_file in pr_files:
-                    pr_file_patch=pr_file.get('patch')
-                    pr_file_patch_diff=get_diff_segments(pr_file_patch.get('diff'))
-                    file_temp={}
-                    file_temp['old_path']=pr_file_patch.get('old_path')
-                    file_temp['new_path']=pr_file_patch.get('new_path')
-                    file_temp['diff_segments']=pr_file_patch_diff
-                    file_path_segments.append(file_temp)
-                if diff_comments:
-                    # 这里逐一去核对如下内容，1. 评论的位置是哪里？如果是代码文件,且old_path 和 new_path都存在那说明这个PR的这段提交需要被评审
-                    for diff_comment in diff_comments:
-                        comment_position = diff_comment.get('position')
-                        old_path = comment_position.get('old_path')
-                        new_path = comment_position.get('new_path')
-                        if is_code_file(old_path) and is_code_file(new_path):
-                            # 在判断一下这个comment所处的diff是否已经被评论过了
-                            start_new_line = diff_comment.get('diff_position').get('start_new_line')
-                            end_new_line = diff_comment.get('diff_position').get('end_new_line')
-                            if start_new_line is not None and end_new_line is not None:
-                                for file_path_segment in file_path_segments:
-                                    file_old_path = file_path_segment.get('old_path')
-                                    file_new_path = file_path_segment.get('new_path')
-                                    diff_segments = file_path_segment.get('diff_segments')
-                                    if file_old_path == old_path and file_new_path == new_path:
-                                        for file_diff_segment in diff_segments:
-                                            if file_diff_segment.get('new_start') <= start_new_line <= file_diff_segment.get(
-                                                'new_end') and file_diff_segment.get('new_start') <= end_new_line <= file_diff_segment.get(
-                                                'new_end'):
-                                                if file_diff_segment.get('is_commented') is False:
-                                                    file_diff_segment['is_commented'] = True
-                                                    comment_in_diff_count += 1
-                                                    pr_number_set.add(pr_number)
-                                                    comment_in_new_file_count+=1
-                                                    break
-                                                else:
-                                                    continue
-                            start_old_line = diff_comment.get('diff_position').get('start_old_line')
-                            end_old_line = diff_comment.get('diff_position').get('end_old_line')
-                            if start_old_line is not None and end_old_line is not None:
-                                for file_path_segment in file_path_segments:
-                                    file_old_path = file_path_segment.get('old_path')
-                                    file_new_path = file_path_segment.get('new_path')
-                                    diff_segments = file_path_segment.get('diff_segments')
-                                    if file_old_path == old_path and file_new_path == new_path:
-                                        for file_diff_segment in diff_segments:
-                                            if file_diff_segment.get('old_start') <= start_old_line <= file_diff_segment.get(
-                                                'old_end') and file_diff_segment.get('old_start') <= end_old_line <= file_diff_segment.get(
-                                                'old_end'):
-                                                if file_diff_segment.get('is_commented') is False:
-                                                    file_diff_segment['is_commented'] = True
-                                                    comment_in_diff_count += 1
-                                                    pr_number_set.add(pr_number)
-                                                    comment_in_old_file_count+=1
-                                                    break
-                                                else:
-                                                    continue
-
-                total_lines += 1
+def count_records_need_issue_detection(jsonl_file_path):
+    """
+    分别统计diff_comment_num>=threshold、commit_count>=threshold的数量，以及两者都>=threshold的数量
+    """
+    summaries = scan_need_check_metrics(
+        jsonl_file_path,
+        [CommentBeforeLastCommitAccumulator, ThresholdAccumulator, SelfReviewAccumulator],
+    )
+    if not summaries:
+        return 0, 0, 0
+    thresholds = summaries['thresholds']
+    early_count = summaries['comment_before_last_commit']['early_comment_time_earlier_than_last_commit_time_count']
+    print(f"总共的需要评审的记录数: {early_count + thresholds['both_ge_threshold']}")
+    return thresholds['diff_comment_ge_threshold'], thresholds['commit_count_ge_threshold'], \
+        thresholds['both_ge_threshold']
 
-            except json.JSONDecodeError as e:
-                print(f"第 {line_num} 行 JSON 解析错误: {e}")
 
-    print("-" * 70)
-    print(f"总共处理了 {total_lines} 行数据")
-    print(f"其中comment_in_diff_count 的数据条数: {comment_in_diff_count} 涉及的pr_number数量: {len(pr_number_set)},comment_in_new_file_count:{comment_in_new_file_count},comment_in_old_file_count:{comment_in_old_file_count}")
+def count_diff_need_check(jsonl_file_path):
+    """
+    统计评论落在代码文件diff段内的数量，区分新文件行号与旧文件行号
+    """
+    return scan_need_check_metrics(jsonl_file_path, [CodeFileSegmentAccumulator]).get('code_file_segments')
 
 
 # 根据原始代码中的变量定义
@@ -309,8 +478,6 @@ OWNER = "openharmony"
 REPO = "web_webview"
 OUTPUT_JSONL_FILE = f"{REPO}/{OWNER}_{REPO}_pr_commit_comment_details_with_files.jsonl"
 
-# 执行函数
-# print_all_jsonl_keys(OUTPUT_JSONL_FILE)
-
-# result = count_records_need_issue_detection(OUTPUT_JSONL_FILE)
-count_diff_need_check(OUTPUT_JSONL_FILE)
+if __name__ == "__main__":
+    # 一次扫描同时得到 key 结构、阈值、自评论、代码文件 diff 段以及评论早于最后提交等全部统计
+    scan_need_check_metrics(OUTPUT_JSONL_FILE, processes=os.cpu_count() or 1)
@@ -2,6 +2,7 @@
 from .dataset_builder import PRReviewDatasetBuilder
 from .diff_parser import DiffParser
 from .outputs import QuestionOutputPaths
+from .schema_profiler import SchemaSketch, load_or_profile, profile_jsonl
 from . import question_one, question_two, question_three, question_four
 from .structures import DiffFile, DiffHunk, DiffLine, PRReviewSample
 
@@ -9,6 +10,9 @@ __all__ = [
     "PRReviewDatasetBuilder",
     "DiffParser",
     "QuestionOutputPaths",
+    "SchemaSketch",
+    "profile_jsonl",
+    "load_or_profile",
     "DiffLine",
     "DiffHunk",
     "DiffFile",
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List
 
 from .diff_parser import DiffParser
 from .io_utils import read_jsonl
@@ -24,18 +24,33 @@ class PRReviewDatasetBuilder:
         pr_commit_file: Path,
         code_refinement_file: Path,
     ) -> List[PRReviewSample]:
+        return list(
+            self.iter_samples(
+                pr_issue_file=pr_issue_file,
+                pr_commit_file=pr_commit_file,
+                code_refinement_file=code_refinement_file,
+            )
+        )
+
+    def iter_samples(
+        self,
+        *,
+        pr_issue_file: Path,
+        pr_commit_file: Path,
+        code_refinement_file: Path,
+    ) -> Iterator[PRReviewSample]:
+        """Yield samples lazily while streaming the refinement file."""
+
         pr_metadata_map = {entry["number"]: entry for entry in read_jsonl(pr_issue_file)}
         commit_map = {entry["number"]: entry for entry in read_jsonl(pr_commit_file)}
-        refinement_entries = list(read_jsonl(code_refinement_file))
-        samples: List[PRReviewSample] = []
-        for entry in refinement_entries:
+        for entry in read_jsonl(code_refinement_file):
             pr_number = entry.get("pr_number")
             if pr_number is None:
                 continue
             metadata_entry = pr_metadata_map.get(pr_number, {})
             commit_entry = commit_map.get(pr_number, {})
             diff_files = self._build_diff_files(entry)
-            sample = PRReviewSample(
+            yield PRReviewSample(
                 repo=self.repo,
                 pr_number=pr_number,
                 metadata=self._extract_metadata(metadata_entry),
@@ -43,8 +58,6 @@ class PRReviewDatasetBuilder:
                 comments=self._extract_comments(entry, commit_entry),
                 commit_history=self._extract_commit_history(commit_entry),
             )
-            samples.append(sample)
-        return samples
 
     # Internal helpers -------------------------------------------------
     def _build_diff_files(self, entry: Dict[str, object]) -> List[DiffFile]:
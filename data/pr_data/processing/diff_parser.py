@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from typing import List, Optional, Tuple
 
-from .structures import DiffHunk, DiffLine
+from .structures import DiffHunk, DiffLine, HunkStats
 
 
 class DiffParser:
@@ -46,6 +46,7 @@ class DiffParser:
                     new_start=new_start,
                     new_end=new_start + max(new_count - 1, 0),
                     lines=[],
+                    stats=HunkStats(),
                 )
                 hunks.append(current_hunk)
             else:
@@ -55,18 +56,18 @@ class DiffParser:
                 prefix = line[:1]
                 content = line[1:] if len(line) > 1 else ""
                 if prefix == "+":
-                    current_hunk.lines.append(
+                    current_hunk.append_line(
                         DiffLine(status="added", content=content, old_line_no=None, new_line_no=new_line)
                     )
                     new_line += 1
                 elif prefix == "-":
-                    current_hunk.lines.append(
+                    current_hunk.append_line(
                         DiffLine(status="removed", content=content, old_line_no=old_line, new_line_no=None)
                     )
                     old_line += 1
                 else:
                     text = line[1:] if line.startswith(" ") else line
-                    current_hunk.lines.append(
+                    current_hunk.append_line(
                         DiffLine(status="context", content=text, old_line_no=old_line, new_line_no=new_line)
                     )
                     old_line += 1
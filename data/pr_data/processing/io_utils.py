@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Dict, Iterable, Iterator
+from typing import Any, Dict, Iterable, Iterator, Mapping
 
 
 def read_jsonl(path: Path) -> Iterator[Dict[str, object]]:
@@ -15,6 +15,13 @@ def read_jsonl(path: Path) -> Iterator[Dict[str, object]]:
             yield json.loads(line)
 
 
+def _json_default(value: Any) -> Any:
+    # Read-only or lazily built mappings (e.g. agent payloads) are resolved only when written.
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 def read_json(path: Path) -> Dict[str, object]:
     with path.open("r", encoding="utf-8") as handle:
         return json.load(handle)
@@ -24,4 +31,4 @@ def write_jsonl(path: Path, records: Iterable[Dict[str, object]]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("a", encoding="utf-8") as handle:
         for record in records:
-            handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+            handle.write(json.dumps(record, ensure_ascii=False, default=_json_default) + "\n")
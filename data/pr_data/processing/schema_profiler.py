@@ -0,0 +1,221 @@
+"""Bounded schema inference for crawler JSONL outputs."""
+from __future__ import annotations
+
+import json
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+_TYPE_NAMES = {
+    dict: "object",
+    list: "array",
+    str: "string",
+    bool: "boolean",
+    int: "integer",
+    float: "number",
+    type(None): "null",
+}
+
+
+@dataclass
+class FieldStats:
+    """Observed types and occurrence count for one schema path."""
+
+    types: List[str] = field(default_factory=list)
+    count: int = 0
+
+    def observe(self, type_name: str) -> None:
+        self.count += 1
+        if type_name not in self.types:
+            self.types.append(type_name)
+
+    def merge(self, other: "FieldStats") -> None:
+        self.count += other.count
+        for type_name in other.types:
+            if type_name not in self.types:
+                self.types.append(type_name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"types": sorted(self.types), "count": self.count}
+
+
+@dataclass
+class SchemaSketch:
+    """Mergeable schema summary whose size is bounded by the distinct paths, not the data volume.
+
+    List elements collapse onto a single ``path[]`` entry and only the first
+    ``max_list_items`` elements of each list are inspected, so file-content-heavy
+    records cost roughly the same as small ones. ``sample_size`` records how many
+    lines were sampled to build the sketch (``None`` for a full scan).
+    """
+
+    max_list_items: int = 3
+    max_depth: int = 8
+    skip_keys: Tuple[str, ...] = ("pr_files",)
+    fields: Dict[str, FieldStats] = field(default_factory=dict)
+    record_count: int = 0
+    sample_size: Optional[int] = None
+
+    def add_record(self, record: Any) -> None:
+        self.record_count += 1
+        self._walk(record, "", 0)
+
+    def _walk(self, value: Any, path: str, depth: int) -> None:
+        if path:
+            stats = self.fields.get(path)
+            if stats is None:
+                stats = self.fields[path] = FieldStats()
+            stats.observe(_TYPE_NAMES.get(type(value), type(value).__name__))
+        if depth >= self.max_depth:
+            return
+        if isinstance(value, dict):
+            for key, child in value.items():
+                if key in self.skip_keys:
+                    continue
+                self._walk(child, f"{path}.{key}" if path else key, depth + 1)
+        elif isinstance(value, list):
+            item_path = f"{path}[]"
+            for item in value[: self.max_list_items]:
+                self._walk(item, item_path, depth + 1)
+
+    def merge(self, other: "SchemaSketch") -> None:
+        self.record_count += other.record_count
+        for path, stats in other.fields.items():
+            if path in self.fields:
+                self.fields[path].merge(stats)
+            else:
+                self.fields[path] = FieldStats(types=list(stats.types), count=stats.count)
+
+    def keys(self) -> List[str]:
+        return sorted(self.fields)
+
+    def top_level_fields(self) -> Dict[str, List[str]]:
+        """Return ``{column: types}`` for first-level keys, e.g. for columnar converters."""
+
+        return {
+            path: sorted(stats.types)
+            for path, stats in self.fields.items()
+            if "." not in path and "[" not in path
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "record_count": self.record_count,
+            "max_list_items": self.max_list_items,
+            "max_depth": self.max_depth,
+            "skip_keys": list(self.skip_keys),
+            "sample_size": self.sample_size,
+            "fields": {path: self.fields[path].to_dict() for path in self.keys()},
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "SchemaSketch":
+        sketch = cls(
+            max_list_items=payload.get("max_list_items", 3),
+            max_depth=payload.get("max_depth", 8),
+            skip_keys=tuple(payload.get("skip_keys", ("pr_files",))),
+            record_count=payload.get("record_count", 0),
+            sample_size=payload.get("sample_size"),
+        )
+        for path, stats in payload.get("fields", {}).items():
+            sketch.fields[path] = FieldStats(types=list(stats.get("types", [])), count=stats.get("count", 0))
+        return sketch
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> "SchemaSketch":
+        with path.open("r", encoding="utf-8") as handle:
+            return cls.from_dict(json.load(handle))
+
+
+def schema_path_for(jsonl_path: Path) -> Path:
+    """Location where the inferred schema of ``jsonl_path`` is persisted."""
+
+    return jsonl_path.with_name(jsonl_path.name + ".schema.json")
+
+
+def _reservoir_lines(jsonl_path: Path, sample_size: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    reservoir: List[str] = []
+    seen = 0
+    with jsonl_path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            seen += 1
+            if len(reservoir) < sample_size:
+                reservoir.append(line)
+            else:
+                slot = rng.randrange(seen)
+                if slot < sample_size:
+                    reservoir[slot] = line
+    return reservoir
+
+
+def profile_jsonl(
+    jsonl_path: Path,
+    *,
+    sample_size: Optional[int] = None,
+    max_list_items: int = 3,
+    max_depth: int = 8,
+    seed: int = 0,
+) -> SchemaSketch:
+    """Infer a :class:`SchemaSketch` for a JSONL file.
+
+    With ``sample_size`` set, a reservoir of raw lines is kept while streaming and
+    only the sampled lines are decoded.
+    """
+
+    sketch = SchemaSketch(max_list_items=max_list_items, max_depth=max_depth, sample_size=sample_size or None)
+    if sample_size:
+        lines = _reservoir_lines(jsonl_path, sample_size, seed)
+    else:
+        lines = jsonl_path.open("r", encoding="utf-8")
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                sketch.add_record(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    finally:
+        if not isinstance(lines, list):
+            lines.close()
+    return sketch
+
+
+def load_or_profile(
+    jsonl_path: Path,
+    *,
+    sample_size: Optional[int] = None,
+    max_list_items: int = 3,
+    refresh: bool = False,
+) -> SchemaSketch:
+    """Reuse the persisted schema when it is newer than ``jsonl_path`` and was built
+    with the same ``sample_size`` and ``max_list_items``; otherwise profile and persist."""
+
+    schema_path = schema_path_for(jsonl_path)
+    if (
+        not refresh
+        and schema_path.exists()
+        and schema_path.stat().st_mtime >= jsonl_path.stat().st_mtime
+    ):
+        with schema_path.open("r", encoding="utf-8") as handle:
+            payload = json.load(handle)
+        # Schemas persisted before ``sample_size`` was recorded are treated as stale.
+        if (
+            "sample_size" in payload
+            and payload["sample_size"] == (sample_size or None)
+            and payload.get("max_list_items") == max_list_items
+        ):
+            return SchemaSketch.from_dict(payload)
+    sketch = profile_jsonl(jsonl_path, sample_size=sample_size, max_list_items=max_list_items)
+    sketch.save(schema_path)
+    return sketch
@@ -2,7 +2,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 新增行超过该长度时记录其位置，供行级定位直接读取
+LONG_LINE_THRESHOLD = 100
 
 
 @dataclass
@@ -23,6 +26,63 @@ class DiffLine:
         }
 
 
+@dataclass
+class HunkStats:
+    """Per-hunk counters accumulated while the diff is parsed.
+
+    ``long_lines`` holds indexes into ``DiffHunk.lines`` of added lines longer
+    than :data:`LONG_LINE_THRESHOLD`.
+    """
+
+    added: int = 0
+    removed: int = 0
+    context: int = 0
+    max_line_length: int = 0
+    total_line_length: int = 0
+    long_lines: List[int] = field(default_factory=list)
+
+    @property
+    def line_count(self) -> int:
+        return self.added + self.removed + self.context
+
+    @property
+    def changed(self) -> int:
+        return self.added + self.removed
+
+    @property
+    def mean_line_length(self) -> float:
+        return self.total_line_length / self.line_count if self.line_count else 0.0
+
+    def add(self, index: int, line: DiffLine) -> None:
+        length = len(line.content)
+        if line.status == "added":
+            self.added += 1
+            if length > LONG_LINE_THRESHOLD:
+                self.long_lines.append(index)
+        elif line.status == "removed":
+            self.removed += 1
+        else:
+            self.context += 1
+        self.max_line_length = max(self.max_line_length, length)
+        self.total_line_length += length
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[DiffLine]) -> "HunkStats":
+        stats = cls()
+        for index, line in enumerate(lines):
+            stats.add(index, line)
+        return stats
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "added": self.added,
+            "removed": self.removed,
+            "max_line_length": self.max_line_length,
+            "mean_line_length": self.mean_line_length,
+            "long_lines": list(self.long_lines),
+        }
+
+
 @dataclass
 class DiffHunk:
     """Represents a diff hunk with expanded line-level information."""
@@ -34,6 +94,24 @@ class DiffHunk:
     new_end: int
     lines: List[DiffLine] = field(default_factory=list)
     has_comment: bool = False
+    stats: Optional[HunkStats] = field(default=None, repr=False, compare=False)
+    _snippets: Dict[int, str] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def append_line(self, line: DiffLine) -> None:
+        """Append ``line`` and update :attr:`stats` in the same step."""
+
+        if self.stats is None:
+            self.stats = HunkStats.from_lines(self.lines)
+        self.stats.add(len(self.lines), line)
+        self.lines.append(line)
+        self._snippets.clear()
+
+    def ensure_stats(self) -> HunkStats:
+        """Statistics of the hunk; computed once for hunks not built by ``DiffParser``."""
+
+        if self.stats is None:
+            self.stats = HunkStats.from_lines(self.lines)
+        return self.stats
 
     def to_dict(self, include_lines: bool = True) -> Dict[str, object]:
         payload: Dict[str, object] = {
@@ -49,6 +127,9 @@ class DiffHunk:
         return payload
 
     def render_snippet(self, context: int = 2) -> str:
+        cached = self._snippets.get(context)
+        if cached is not None:
+            return cached
         snippet_lines: List[str] = []
         context_budget = context
         for line in self.lines:
@@ -58,7 +139,8 @@ class DiffHunk:
             elif context_budget > 0:
                 snippet_lines.append(line.content)
                 context_budget -= 1
-        return "\n".join(snippet_lines)
+        snippet = self._snippets[context] = "\n".join(snippet_lines)
+        return snippet
 
 
 @dataclass
@@ -68,6 +150,7 @@ class DiffFile:
     file_path: str
     hunks: List[DiffHunk] = field(default_factory=list)
     historical_comments: List[Dict[str, object]] = field(default_factory=list)
+    _line_index: Optional[Dict[int, DiffLine]] = field(default=None, init=False, repr=False, compare=False)
 
     def to_dict(self, include_lines: bool = True) -> Dict[str, object]:
         return {
@@ -83,11 +166,14 @@ class DiffFile:
         return None
 
     def get_line_by_new_no(self, new_no: int) -> Optional[DiffLine]:
-        for hunk in self.hunks:
-            for line in hunk.lines:
-                if line.new_line_no == new_no:
-                    return line
-        return None
+        if self._line_index is None:
+            index: Dict[int, DiffLine] = {}
+            for hunk in self.hunks:
+                for line in hunk.lines:
+                    if line.new_line_no is not None:
+                        index.setdefault(line.new_line_no, line)
+            self._line_index = index
+        return self._line_index.get(new_no)
 
 
 @dataclass
@@ -5,7 +5,7 @@ import os
 import re
 import sys
 import time
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -17,6 +17,9 @@ from transformers import AutoTokenizer, AutoModel
 
 from eval_code_sim import calculate_exact_match, calculate_exact_match2, calculate_bleu_score, calculate_codebleu_score, \
     calculate_rouge_l_score, calculate_edit_progress
+from hre_concurrency import RateLimiter, run_ordered
+from hre_embedding import embedding_service, load_onnx_backend
+from hre_store import open_store, close_stores, rerank_experiences, trigger_refs
 
 
 # =========================
@@ -24,67 +27,25 @@ from eval_code_sim import calculate_exact_match, calculate_exact_match2, calcula
 # =========================
 def load_embedding_model(model_dir: str):
     tokenizer = AutoTokenizer.from_pretrained(model_dir, trust_remote_code=True)
+    if EMBED_BACKEND == "onnx":
+        # 不加载 PyTorch 模型，直接用量化后的 onnx 文件（第一次运行时导出）
+        return tokenizer, load_onnx_backend(model_dir, threads=EMBED_THREADS)
     model = AutoModel.from_pretrained(model_dir, trust_remote_code=True)
     model.to(DEVICE)
     model.eval()
     return tokenizer, model
 
 
-def _mean_pooling(model_output, attention_mask):
-    token_embeddings = model_output.last_hidden_state
-    input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
-    sum_embeddings = torch.sum(token_embeddings * input_mask_expanded, dim=1)
-    sum_mask = torch.clamp(input_mask_expanded.sum(dim=1), min=1e-9)
-    return sum_embeddings / sum_mask
-
-
 def embed_texts(texts: List[str], tokenizer, model) -> List[np.ndarray]:
-    embeddings = []
-    for i in range(0, len(texts), BATCH_SIZE):
-        # print(f"Embedding texts {i} to {min(i+BATCH_SIZE, len(texts))} / {len(texts)}")
-        batch = texts[i:i + BATCH_SIZE]
-        encoded = tokenizer(batch, padding=True, truncation=True, return_tensors="pt", max_length=4096)
-        input_ids = encoded["input_ids"].to(DEVICE)
-        attention_mask = encoded["attention_mask"].to(DEVICE)
-        with torch.no_grad():
-            out = model(input_ids=input_ids, attention_mask=attention_mask)
-            pooled = _mean_pooling(out, attention_mask)
-            pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
-            embeddings.append(pooled.cpu().numpy())
-    if embeddings:
-        return np.vstack(embeddings)
-    return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    # 按长度分桶、按 token 预算组批，并带持久化的内容哈希缓存，返回顺序与 texts 一致
+    service = embedding_service(tokenizer, model, device=DEVICE, max_length=4096,
+                                max_batch_tokens=MAX_BATCH_TOKENS, cache_path=EMBED_CACHE_PATH)
+    return service.embed(texts)
 
 
 def load_index_and_meta(index_path: str, meta_path: str, vec_path: str, RQ: str):
-    import faiss
-    idx = faiss.read_index(index_path)
-    meta_list = []
-    with open(meta_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                meta_list.append(json.loads(line.strip()))
-            except Exception:
-                meta_list.append({})
-    vecs = np.load(vec_path)
-    if len(meta_list) != vecs.shape[0]:
-        raise ValueError(
-            f"meta 数量 {len(meta_list)} 与 vec 数量{vecs.shape[0]}不一致"
-        )
-    if idx.ntotal != len(meta_list):
-        raise ValueError(
-            f"faiss index 数量 {idx.ntotal} 与 meta 数量 {len(meta_list)} 不一致"
-        )
-    text_to_vecs = {}
-    for meta, vec in zip(meta_list, vecs):
-        original_item = meta.get("original_item", {})
-        if RQ == "RQ1":
-            patch_text = original_item.get("patch")
-        else:
-            patch_text = original_item.get("old")
-        if patch_text:
-            text_to_vecs[patch_text] = vec.astype(np.float32)
-    return idx, meta_list, text_to_vecs
+    # 常驻的 HREStore 只在第一次调用时读盘，之后直接复用内存中的 index / meta / vecs
+    return open_store(index_path, meta_path, vec_path, RQ)
 
 
 def process_diff_code(diff_code: str) -> str:
@@ -145,15 +106,64 @@ def retrieve_and_rerank_experiences(
     3. 对每条经验，计算 sim(query, trigger_snippet) —— 若 trigger_snippet 为空，则用 anchor_diff
     4. 按该相似度重排序，返回 top-N 经验
     """
-    idx, metas, text_to_vecs = load_index_and_meta(index_path, meta_path, vec_path, RQ)
+    store = load_index_and_meta(index_path, meta_path, vec_path, RQ)
     q_vec = embed_texts([query], tokenizer, model).astype('float32')
-    D, I = idx.search(q_vec, top_k_anchors + 20)
+    D, I = store.search(q_vec, top_k_anchors + 20)
+    all_candidate_experiences, pending = _collect_candidates(store.metas, query, D[0], I[0], RQ)
+    if pending:
+        rerank_experiences(store, q_vec, query, pending, lambda texts: embed_texts(texts, tokenizer, model))
+    return _top_experiences(all_candidate_experiences, top_k_anchors)
+
 
+def retrieve_and_rerank_batch(
+        index_path: str,
+        meta_path: str,
+        vec_path: str,
+        queries: List[str],
+        RQ: str,
+        tokenizer,
+        model,
+        top_k_anchors: int = 5,
+) -> List[list]:
+    """
+    记忆冻结（不 add / update）时的批量检索，结果与逐条调用 retrieve_and_rerank_experiences 相同：
+    所有查询按长度分桶一次嵌入，一次多查询 faiss 检索，所有候选经验的 trigger 向量一次取出（缺失的一次嵌入），
+    再逐条做向量化重排。
+    """
+    store = load_index_and_meta(index_path, meta_path, vec_path, RQ)
+    if not queries:
+        return []
+    q_vecs = embed_texts(queries, tokenizer, model).astype('float32')
+    D, I = store.search(q_vecs, top_k_anchors + 20)
+    collected = [_collect_candidates(store.metas, query, D[i], I[i], RQ) for i, query in enumerate(queries)]
+
+    # 预取全部 trigger 向量，之后逐条重排只读缓存
+    hashes, texts = [], []
+    for query, (_, pending) in zip(queries, collected):
+        for _, experiences, _ in pending:
+            for exp in experiences:
+                for snippet, h in trigger_refs(exp):
+                    if snippet and snippet != query:
+                        hashes.append(h)
+                        texts.append(snippet)
+    store.vectors_for(hashes, texts, lambda batch: embed_texts(batch, tokenizer, model))
+
+    results = []
+    for i, (query, (candidates, pending)) in enumerate(zip(queries, collected)):
+        if pending:
+            rerank_experiences(store, q_vecs[i:i + 1], query, pending)
+        results.append(_top_experiences(candidates, top_k_anchors))
+    return results
+
+
+def _collect_candidates(metas: List[dict], query: str, scores, positions, RQ: str):
+    """把一个查询的检索结果展开成候选经验；多条经验的锚点放进 pending，由 rerank_experiences 打分"""
     all_candidate_experiences = []
+    pending = []
     had_code = set()
 
     if RQ == "RQ2":
-        for score, pos in zip(D[0], I[0]):
+        for score, pos in zip(scores, positions):
             if pos < 0 or pos >= len(metas) or metas[pos]["original_item"]["old"] == query or \
                     metas[pos]["original_item"][
                         "old"] in had_code:
@@ -188,77 +198,38 @@ def retrieve_and_rerank_experiences(
                     "meta": patch_meta
                 })
             else:
-                # 找到具有最高score的经验
-                best_exp = None
-                best_score = -float('inf')
-                best_trigger_diff = None
-                for exp in experiences:
-                    # ### KEY: 决定 ref_diff 用于重排序 ### 是谁触发了该经验的更新
-                    trigger_diff = exp.get("trigger_snippet")
-                    trigger_snippets = trigger_diff if isinstance(trigger_diff, list) else [trigger_diff]
-                    valid_snippets = [s for s in trigger_snippets if s and s != query]
-                    if not valid_snippets:
-                        final_score = float(score)
-                    else:
-                        sim_scores = []
-                        used_snippets = []
-                    for snippet in valid_snippets:
-                        # 这里不再在线embed
-                        # 而是直接从text_to_vecs里取trigger 对应的向量
-                        ref_vec = text_to_vecs.get(snippet)
-                        if ref_vec is None:
-                            continue
-                        sim = float(np.dot(q_vec[0], ref_vec))
-                        sim_scores.append(sim)
-                        used_snippets.append(snippet)
-                    if not sim_scores:
-                        final_score = float(score)
-                    elif len(sim_scores) == 1:
-                        final_score = sim_scores[0]
-                    else:  # 最后一个trigger 权重 0.5,其余 trigger 的均值权重 0.5
-                        final_score = float(0.5 * sim_scores[-1] + 0.5 * np.mean(sim_scores[:-1]))
-                    if final_score > best_score:
-                        best_score = final_score
-                        best_exp = exp
-                        best_trigger_diff = valid_snippets
-
-                # 只添加得分最高的经验
-                if best_exp is not None:
-                    all_candidate_experiences.append({
-                        "experience": best_exp["experience"],
-                        "comment": comment,
-                        "diff_snippet": hunk,
-                        "score": best_score,
-                        "old": old,
-                        "new": new,
-                        "trigger_snippet": best_trigger_diff,
-                        "meta": patch_meta
-                    })
+                # 多条经验：先占位，循环结束后对所有候选的 trigger 统一向量化打分，只保留得分最高的经验
+                candidate = {
+                    "experience": None,
+                    "comment": comment,
+                    "diff_snippet": hunk,
+                    "score": float(score),
+                    "old": old,
+                    "new": new,
+                    "trigger_snippet": None,
+                    "meta": patch_meta
+                }
+                all_candidate_experiences.append(candidate)
+                pending.append((candidate, experiences, float(score)))
             had_code.add(old)
 
+    return all_candidate_experiences, pending
+
+
+def _top_experiences(all_candidate_experiences: list, top_k_anchors: int) -> list:
     # 过滤掉不包含"experience"字段的条目
     filtered_experiences = [exp for exp in all_candidate_experiences if "experience" in exp]
 
     # 按 score 降序排序
     filtered_experiences.sort(key=lambda x: x.get("score", 0), reverse=True)
 
-    # 更新原列表
-    all_candidate_experiences = filtered_experiences
-
     # 返回 top-N
-    return all_candidate_experiences[:top_k_anchors]
+    return filtered_experiences[:top_k_anchors]
 
 
-def update_hre_experience(index_path, meta_path, experiences_str, RQ):
+def update_hre_experience(index_path, meta_path, vec_path, experiences_str, RQ):
     experiences = json.loads(experiences_str)
-    # 读取现有的元数据
-    meta_list = []
-    with open(meta_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                meta_list.append(json.loads(line.strip()))
-            except Exception:
-                meta_list.append({})
+    store = load_index_and_meta(index_path, meta_path, vec_path, RQ)
 
     # 将experiences转换为便于查找的字典
     exp_dict = {}
@@ -267,59 +238,19 @@ def update_hre_experience(index_path, meta_path, experiences_str, RQ):
             key = (exp.get("before_code"))
             exp_dict[key] = exp
 
-    # 更新匹配的元数据条目
-    updated_count = 0
-    for meta_org in meta_list:
-        meta_data_org = meta_org.get("original_item")
-        key = ""
-        if RQ == "RQ2":
-            key = (meta_data_org.get("old"))
-            # key = process_diff_code(key)
-        if key in exp_dict and exp_dict[key]:
-            if "experiences" not in meta_data_org:
-                meta_data_org["experiences"] = []
-
-            new_trigger = exp_dict[key]['trigger_snippet']
-            old_trigger_snippets = exp_dict[key].get("old_trigger_snippets", [])
-            trigger_snippets = old_trigger_snippets if isinstance(old_trigger_snippets, list) else [
-                old_trigger_snippets]
-            trigger_snippets.append(new_trigger)
-            meta_data_org["experiences"].append({
-                "experience": exp_dict[key]['experience'],
-                "trigger_snippet": trigger_snippets
-            })
-            updated_count += 1
-
-    # 写回更新后的元数据，不会新增数据，只会更新已有的meta条目
-    with open(meta_path, 'w', encoding='utf-8') as f:
-        for meta in meta_list:
-            f.write(json.dumps(meta, ensure_ascii=False) + '\n')
-
+    # 只在内存中给匹配的条目追加经验，由 HREStore 异步写回 meta，不会新增数据
     # 注意：这不会影响index_path，因为索引是基于代码片段的向量表示，
     # 而我们只更新了元数据中的经验信息，没有更改任何与索引相关的数据。
+    updated_count = store.update(exp_dict)
     return str({"updated_count": updated_count, "message": f"成功更新了{updated_count}条经验数据"})
 
 
 def add_hre_experience(index_path, meta_path, vec_path, experiences_str, RQ, tokenizer, model):
     experiences = json.loads(experiences_str)
+    store = load_index_and_meta(index_path, meta_path, vec_path, RQ)
 
-    # 读取现有的元数据
-    meta_list = []
-    with open(meta_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                meta_list.append(json.loads(line.strip()))
-            except Exception:
-                meta_list.append({})
-
-    # 检查每个经验是否已存在
+    # 检查每个经验是否已存在（直接查询常驻的 key 索引，不再重读 meta 文件）
     existing_keys = set()
-    for meta in meta_list:
-        meta_data_org = meta.get("original_item", {})
-        if RQ == "RQ2":
-            key = meta_data_org.get("old", "")
-            # key = process_diff_code(key)
-            existing_keys.add(key)
 
     # 准备新经验
     new_texts = []
@@ -332,7 +263,7 @@ def add_hre_experience(index_path, meta_path, vec_path, experiences_str, RQ, tok
         #     before_code = process_diff_code(before_code)
 
         # 检查是否已存在
-        if before_code in existing_keys:
+        if before_code in existing_keys or store.contains(before_code):
             print(f"  经验已存在，跳过: {before_code[:50]}...")
             continue
 
@@ -371,32 +302,9 @@ def add_hre_experience(index_path, meta_path, vec_path, experiences_str, RQ, tok
     if not new_texts:
         return str({"added_count": 0, "message": "没有新经验需要添加"})
 
-    # 生成嵌入向量
+    # 生成嵌入向量，同步追加到内存中的索引 / meta / vecs，由 HREStore 异步落盘
     new_vecs = embed_texts(new_texts, tokenizer, model).astype('float32')
-    import faiss
-    # 加载现有索引
-    index = faiss.read_index(index_path)
-    old_total = index.ntotal
-
-    # 添加新向量到索引
-    index.add(new_vecs)
-
-    # 保存更新后的索引
-    faiss.write_index(index, index_path)
-
-    # 添加新元数据到文件
-    with open(meta_path, 'a', encoding='utf-8') as f:
-        for meta in new_metas:
-            f.write(json.dumps(meta, ensure_ascii=False) + '\n')
-
-    old_vecs = np.load(vec_path)  # 同步追加 vecs.npy
-    all_vecs = np.concatenate([old_vecs, new_vecs], axis=0)
-    np.save(vec_path, all_vecs)
-    # 4)基本一致性校验
-    if all_vecs.shape[0] != index.ntotal:
-        raise ValueError(f"vecs 数量 {all_vecs.shape[0]} 与 faiss 数量 {index.ntotal} 不一致")
-    if old_total + len(new_metas) != index.ntotal:
-        raise ValueError("faiss 增量数量异常")
+    store.add(new_metas, new_vecs)
 
     return str({"added_count": len(new_texts), "message": f"成功添加了{len(new_texts)}条经验数据"})
 
@@ -404,6 +312,9 @@ def add_hre_experience(index_path, meta_path, vec_path, experiences_str, RQ, tok
 def RHE_search_subprocess(RHE_index_path, RHE_meta_path, RHE_vec_path, tok, mod, query, top_k, operation, experiences,
                           RQ):
     start_time = time.time()
+    if FROZEN_MEMORY and operation in ("update", "add"):
+        # 记忆冻结：检索结果已预先批量算好，不再改动 HRE
+        return str({"message": f"记忆已冻结，跳过 {operation}"}), time.time() - start_time
     if operation == "search":
         try:
             time0 = time.time()
@@ -420,7 +331,7 @@ def RHE_search_subprocess(RHE_index_path, RHE_meta_path, RHE_vec_path, tok, mod,
         try:
             time0 = time.time()
             print(f"  [update] 开始执行")
-            res = update_hre_experience(RHE_index_path, RHE_meta_path, experiences, RQ)
+            res = update_hre_experience(RHE_index_path, RHE_meta_path, RHE_vec_path, experiences, RQ)
             time1 = time.time() - time0
             print(f"  [update] 更新用时: {time1:.4f}s")
         except Exception as e:
@@ -491,18 +402,21 @@ def load_model():
 
 def gen_with_messages(messages, client) -> Tuple[str, str, float, int, int, list, str]:
     start_time = time.time()
-    completion = client.chat.completions.create(
+    # 粗略按 4 个字符一个 token 估算，用于 token 限额；完成后按真实用量校正
+    estimated_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+    completion = LLM_RATE_LIMITER.call(lambda: client.chat.completions.create(
         model="qwen3.5-plus",
         messages=messages,
         extra_body={"enable_thinking": False},
         stream=False
-    )
+    ), estimated_tokens)
 
     elapsed_time = time.time() - start_time
     text = completion.choices[0].message.content
 
     input_tokens = completion.usage.prompt_tokens if hasattr(completion, 'usage') and completion.usage else 0
     output_tokens = completion.usage.completion_tokens if hasattr(completion, 'usage') and completion.usage else 0
+    LLM_RATE_LIMITER.record(input_tokens + output_tokens, estimated_tokens)
 
     think_pattern = r"</think>(.*?)</think>"
     think_match = re.search(think_pattern, text, re.DOTALL)
@@ -554,9 +468,12 @@ def process_diff_code(diff_code: str) -> str:
 
 
 def generate_refinement_code(before_code, review_comment, repo, client):
-    history_repair_experiences, search_time = RHE_search_subprocess(RHE_index_path, RHE_meta_path, RHE_vec_path, tok,
-                                                                    mod,
-                                                                    before_code, TOPK_HRE, "search", "", "RQ2")
+    if before_code in PRECOMPUTED_HRE:
+        history_repair_experiences, search_time = PRECOMPUTED_HRE[before_code]
+    else:
+        history_repair_experiences, search_time = RHE_search_subprocess(RHE_index_path, RHE_meta_path, RHE_vec_path,
+                                                                        tok, mod,
+                                                                        before_code, TOPK_HRE, "search", "", "RQ2")
     hre_block = ""
     experiences = []
     if history_repair_experiences:
@@ -942,8 +859,319 @@ def update_experience(pr_number, repo: str, before_code: str, review_comment: st
     return total_gen_time, update_rhe_time, total_input_tokens, total_output_tokens, prompts, outputs
 
 
+def process_item(item, gen_client) -> Optional[Dict[str, Any]]:
+    """处理一条测试样本：检索、生成、反思重试、总结并写回经验，返回结果行；跳过的样本返回 None"""
+    start_time = time.time()
+    pr_number = item.get("ghid", item.get("id", "unknown_pr"))
+    repo = item.get("proj")
+    before_code = item.get("old") or ""
+    input = process_diff_code(before_code)
+    lang = item.get("lang", "unknown")
+
+    check_done_key = (repo, before_code)
+    if check_done_key in processed_repo_pr_code:
+        print(f"      跳过已处理样本：仓库 {repo}，before code {before_code}。")
+        return None
+
+    after_code = item.get("new") or ""
+    after_code = process_diff_code(after_code)
+    print(f"      仓库 {repo}，before code {before_code}，after code {after_code}")
+    review_comment = item.get("comment") or ""
+    hunk = item.get("old_hunk", item.get("hunk", ""))
+    print(f"      仓库 {repo}，before code {before_code}，修复开始=======================")
+
+    if not item.get("y", 1):
+        print(f"      跳过不需要检查的样本：仓库 {repo}，PR号 {pr_number}。========================")
+        return None
+
+    think1, out1, history_repair_experiences, experiences, messages_hre, search_time, gen_time, \
+        input_tokens, output_tokens, gen0_full_output = generate_refinement_code(before_code,
+                                                                                 review_comment,
+                                                                                 repo,
+                                                                                 gen_client)
+    if not think1 and not out1 and not history_repair_experiences and not messages_hre:
+        print(f"      仓库 {repo}，PR号 {pr_number}，修复异常")
+        return None
+    print(f"      仓库 {repo}，PR号 {pr_number}，修复结果结束")
+    outs = []
+    new_out = out1
+    reflections = []
+    reflection = ""
+    eval_scores = []
+    outs.append(out1)
+    ems = []
+    em2s = []
+    bleus = []
+    cbleus = []
+    rouges = []
+    edit_progresses = []
+    reflection_times = []
+    reflection_input_tokens_list = []
+    reflection_output_tokens_list = []
+    gen_times = [gen_time]
+    gen_input_tokens_list = [input_tokens]
+    gen_output_tokens_list = [output_tokens]
+    retry = 0
+    # 存储所有模型prompts和outputs
+    gen_prompts = [messages_hre]
+    gen_outputs = [gen0_full_output]
+    reflection_prompts = []
+    reflection_outputs = []
+    em = calculate_exact_match(out1, after_code)
+    em2 = calculate_exact_match2(out1, after_code)
+    bleu = calculate_bleu_score(out1, after_code)
+    cbleu = calculate_codebleu_score(out1, after_code, lang, repo)
+    rouge = calculate_rouge_l_score(out1, after_code)
+    edit_progress = calculate_edit_progress(input, out1, after_code)
+
+    ems.append(em)
+    em2s.append(em2)
+    bleus.append(bleu)
+    cbleus.append(cbleu)
+    rouges.append(rouge)
+    edit_progresses.append(edit_progress)
+
+    update_output = out1
+    update_cbleu = cbleu
+    update_em = em
+    update_bleu = bleu
+    update_rouge = rouge
+    update_edit_progress = edit_progress
+
+    for retry_count in range(MAX_RETRIES):
+        if cbleu >= TARGET_THRESHOLD:
+            print(
+                f"      仓库 {repo}，PR号 {pr_number}，第{retry_count}次尝试达到目标阈值({cbleu:.4f} >= {TARGET_THRESHOLD:.4f})，修复成功")
+            break
+        print(f"第{retry_count}次尝试未达到目标阈值({cbleu:.4f} < {TARGET_THRESHOLD:.4f})，开始反思重试...")
+        retry += 1
+        reflection, reflection_time, reflection_input_tokens, reflection_output_tokens, reflection_prompt, \
+            reflection_full_output = generate_reflection(pr_number, repo, before_code, review_comment,
+                                                         after_code, outs, reflections,
+                                                         history_repair_experiences, experiences,
+                                                         gen_client,
+                                                         ems, bleus, cbleus, rouges, edit_progresses)
+        reflections.append(reflection)
+        reflection_times.append(reflection_time)
+        reflection_input_tokens_list.append(reflection_input_tokens)
+        reflection_output_tokens_list.append(reflection_output_tokens)
+        reflection_prompts.append(reflection_prompt)
+        reflection_outputs.append(reflection_full_output)
+
+        think, new_out, messages, gen_time, input_tokens, output_tokens, gen_full_output = \
+            generate_fix_with_reflection(pr_number, repo, before_code, review_comment, after_code, outs,
+                                         reflections,
+                                         history_repair_experiences, experiences,
+                                         gen_client,
+                                         ems, bleus, cbleus, rouges, edit_progresses)
+        if not think and not new_out:
+            print(f"  第{retry_count}次反思修复生成失败，返回之前的结果")
+            continue
+
+        gen_times.append(gen_time)
+        gen_input_tokens_list.append(input_tokens)
+        gen_output_tokens_list.append(output_tokens)
+        gen_prompts.append(messages)
+        gen_outputs.append(gen_full_output)
+        outs.append(new_out)
+        em = calculate_exact_match(new_out, after_code)
+        em2 = calculate_exact_match2(new_out, after_code)
+        bleu = calculate_bleu_score(new_out, after_code)
+        cbleu = calculate_codebleu_score(new_out, after_code, lang, repo)
+        rouge = calculate_rouge_l_score(new_out, after_code)
+        edit_progress = calculate_edit_progress(input, new_out, after_code)
+
+        ems.append(em)
+        em2s.append(em2)
+        bleus.append(bleu)
+        cbleus.append(cbleu)
+        rouges.append(rouge)
+        edit_progresses.append(edit_progress)
+
+        if cbleu > update_cbleu:
+            update_output = new_out
+            update_cbleu = cbleu
+            update_em = em
+            update_bleu = bleu
+            update_rouge = rouge
+            update_edit_progress = edit_progress
+        if cbleu >= TARGET_THRESHOLD:
+            print(f"  达到目标阈值({cbleu:.4f} ≥ {TARGET_THRESHOLD:.4f})，修复完成")
+            break
+
+    print(f"      仓库 {repo}，PR号 {pr_number}，第{retry_count}次尝试反思修复CodeBLEU得分：{cbleu:.4f}")
+    if FROZEN_MEMORY:
+        # 记忆冻结：不总结、不更新经验，省去这两次 LLM 调用，耗时与 token 记为 0
+        print(f"      仓库 {repo}，PR号 {pr_number}，记忆已冻结，跳过经验总结与更新")
+    else:
+        print(f"      仓库 {repo}，PR号 {pr_number}，总结经验开始")
+        summarized_experience, summarize_time, summarize_input_tokens, summarize_output_tokens, summarize_prompt, summarize_full_output = summarize_experience(
+            pr_number, repo, before_code, review_comment, after_code, outs, reflections,
+            history_repair_experiences, experiences,
+            gen_client,
+            ems, bleus, cbleus, rouges, edit_progresses)
+        # 确保 original_item 包含正确的字段
+        original_item = item.copy()
+        # 确保 old 字段存在且与 before_code 一致
+        original_item["old"] = item.get("old", before_code)
+        # 确保 new 字段存在
+        original_item["new"] = item.get("new", after_code)
+        # 确保 comment 字段存在
+        original_item["comment"] = item.get("comment", review_comment)
+        # 确保 hunk 字段存在
+        original_item["hunk"] = item.get("hunk", item.get("old_hunk", hunk))
+        # 确保 y 字段存在
+        original_item["y"] = item.get("y", 1)
+
+        add_experience_list = [{
+            "before_code": before_code,
+            "after_code": after_code,
+            "review_comment": review_comment,
+            "trigger_snippet": before_code,
+            "experience": summarized_experience,
+            "pr_number": pr_number,
+            "hunk": hunk,
+            "original_item": original_item  # 完整的原始数据
+        }]
+
+        try:
+            add_experience_str = json.dumps(add_experience_list, ensure_ascii=False)
+            json.loads(add_experience_str)
+        except (TypeError, ValueError) as e:
+            print(f"     add_experience无法被json化: {e}")
+            add_experience_str = "[]"
+
+        result, save_exp_time = RHE_search_subprocess(RHE_index_path, RHE_meta_path, RHE_vec_path, tok, mod,
+                                                      before_code, TOPK_HRE, "add", add_experience_str, "RQ2")
+        print(f"  保存经验的结果：{result}")
+
+        print(f"      仓库 {repo}，PR号 {pr_number}，update_experience 开始")
+        if update_cbleu >= 0.95:
+            print("模型预测Codebleu>=0.95，无需更新经验，只追加")
+        else:
+            update_gen_time, update_rhe_time, update_exp_input_tokens, update_exp_output_tokens, update_prompts, update_outputs = \
+                update_experience(pr_number, repo, before_code, review_comment, after_code, update_output,
+                                  reflections,
+                                  history_repair_experiences, experiences,
+                                  gen_client,
+                                  update_em, update_bleu, update_cbleu, update_rouge, update_edit_progress)
+
+    processing_time = time.time() - start_time
+    print(f"      仓库 {repo}，PR号 {pr_number}，总处理时间：{processing_time:.4f} 秒")
+
+    row = {
+        "pr_number": pr_number,
+        "repo": repo,
+        "before_code": before_code,
+        "review_comment": review_comment,
+        "prompt_with_hre": messages_hre,
+        "think_with_hre": think1,
+        "output_with_hre": outs[0],
+        "after_code": after_code,
+        "EM_hre": ems[0],
+        "EM2_hre": em2s[0],
+        "BLEU_hre": bleus[0],
+        "CodeBLEU_hre": cbleus[0],
+        "ROUGE-L_hre": rouges[0],
+        "Edit_Progress_hre": edit_progresses[0],
+        "Processing_Time_Seconds": processing_time,
+        "retry_count": retry,
+        "search_time": search_time,
+        "gen0_time": gen_times[0] if len(gen_times) > 0 else 0.0,
+        "gen0_input_tokens": gen_input_tokens_list[0] if len(gen_input_tokens_list) > 0 else 0,
+        "gen0_output_tokens": gen_output_tokens_list[0] if len(gen_output_tokens_list) > 0 else 0,
+        "gen0_prompt": gen_prompts[0] if len(gen_prompts) > 0 else None,
+        "gen0_full_output": gen_outputs[0] if len(gen_outputs) > 0 else None,
+        "reflection1_time": reflection_times[0] if len(reflection_times) > 0 else 0.0,
+        "reflection1_input_tokens": reflection_input_tokens_list[0] if len(
+            reflection_input_tokens_list) > 0 else 0,
+        "reflection1_output_tokens": reflection_output_tokens_list[0] if len(
+            reflection_output_tokens_list) > 0 else 0,
+        "reflection1_prompt": reflection_prompts[0] if len(reflection_prompts) > 0 else None,
+        "reflection1_full_output": reflection_outputs[0] if len(reflection_outputs) > 0 else None,
+
+        # 第一次反思后的指标（对应gen1的输出）
+        "gen1_time": gen_times[1] if len(gen_times) > 1 else 0.0,
+        "gen1_input_tokens": gen_input_tokens_list[1] if len(gen_input_tokens_list) > 1 else 0,
+        "gen1_output_tokens": gen_output_tokens_list[1] if len(gen_output_tokens_list) > 1 else 0,
+        "gen1_prompt": gen_prompts[1] if len(gen_prompts) > 1 else None,
+        "gen1_full_output": gen_outputs[1] if len(gen_outputs) > 1 else None,
+        "EM_after_reflection1": ems[1] if len(ems) > 1 else None,
+        "EM2_after_reflection1": em2s[1] if len(em2s) > 1 else None,
+        "BLEU_after_reflection1": bleus[1] if len(bleus) > 1 else None,
+        "CodeBLEU_after_reflection1": cbleus[1] if len(cbleus) > 1 else None,
+        "ROUGE-L_after_reflection1": rouges[1] if len(rouges) > 1 else None,
+        "Edit_Progress_after_reflection1": edit_progresses[1] if len(edit_progresses) > 1 else None,
+        "reflection2_time": reflection_times[1] if len(reflection_times) > 1 else 0.0,
+        "reflection2_input_tokens": reflection_input_tokens_list[1] if len(
+            reflection_input_tokens_list) > 1 else 0,
+        "reflection2_output_tokens": reflection_output_tokens_list[1] if len(
+            reflection_output_tokens_list) > 1 else 0,
+        "reflection2_prompt": reflection_prompts[1] if len(reflection_prompts) > 1 else None,
+        "reflection2_full_output": reflection_outputs[1] if len(reflection_outputs) > 1 else None,
+
+        # 第二次反思后的指标（对应gen2的输出）
+        "gen2_time": gen_times[2] if len(gen_times) > 2 else 0.0,
+        "gen2_input_tokens": gen_input_tokens_list[2] if len(gen_input_tokens_list) > 2 else 0,
+        "gen2_output_tokens": gen_output_tokens_list[2] if len(gen_output_tokens_list) > 2 else 0,
+        "gen2_prompt": gen_prompts[2] if len(gen_prompts) > 2 else None,
+        "gen2_full_output": gen_outputs[2] if len(gen_outputs) > 2 else None,
+        "EM_after_reflection2": ems[2] if len(ems) > 2 else None,
+        "EM2_after_reflection2": em2s[2] if len(em2s) > 2 else None,
+        "BLEU_after_reflection2": bleus[2] if len(bleus) > 2 else None,
+        "CodeBLEU_after_reflection2": cbleus[2] if len(cbleus) > 2 else None,
+        "ROUGE-L_after_reflection2": rouges[2] if len(rouges) > 2 else None,
+        "Edit_Progress_after_reflection2": edit_progresses[2] if len(edit_progresses) > 2 else None,
+        "reflection3_time": reflection_times[2] if len(reflection_times) > 2 else 0.0,
+        "reflection3_input_tokens": reflection_input_tokens_list[2] if len(
+            reflection_input_tokens_list) > 2 else 0,
+        "reflection3_output_tokens": reflection_output_tokens_list[2] if len(
+            reflection_output_tokens_list) > 2 else 0,
+        "reflection3_prompt": reflection_prompts[2] if len(reflection_prompts) > 2 else None,
+        "reflection3_full_output": reflection_outputs[2] if len(reflection_outputs) > 2 else None,
+
+        # 第三次反思后的指标（对应gen3的输出）
+        "gen3_time": gen_times[3] if len(gen_times) > 3 else 0.0,
+        "gen3_input_tokens": gen_input_tokens_list[3] if len(gen_input_tokens_list) > 3 else 0,
+        "gen3_output_tokens": gen_output_tokens_list[3] if len(gen_output_tokens_list) > 3 else 0,
+        "gen3_prompt": gen_prompts[3] if len(gen_prompts) > 3 else None,
+        "gen3_full_output": gen_outputs[3] if len(gen_outputs) > 3 else None,
+        "EM_after_reflection3": ems[3] if len(ems) > 3 else None,
+        "EM2_after_reflection3": em2s[3] if len(em2s) > 3 else None,
+        "BLEU_after_reflection3": bleus[3] if len(bleus) > 3 else None,
+        "CodeBLEU_after_reflection3": cbleus[3] if len(cbleus) > 3 else None,
+        "ROUGE-L_after_reflection3": rouges[3] if len(rouges) > 3 else None,
+        "Edit_Progress_after_reflection3": edit_progresses[3] if len(edit_progresses) > 3 else None,
+
+        # 经验总结和更新
+        "summarize_time": summarize_time if 'summarize_time' in locals() else 0.0,
+        "summarize_input_tokens": summarize_input_tokens if 'summarize_input_tokens' in locals() else 0,
+        "summarize_output_tokens": summarize_output_tokens if 'summarize_output_tokens' in locals() else 0,
+        "summarize_prompt": summarize_prompt if 'summarize_prompt' in locals() else None,
+        "summarize_full_output": summarize_full_output if 'summarize_full_output' in locals() else None,
+        "update_gen_time": update_gen_time if 'update_gen_time' in locals() else 0.0,
+        "update_rhe_time": update_rhe_time if 'update_rhe_time' in locals() else 0.0,
+        "update_exp_input_tokens": update_exp_input_tokens if 'update_exp_input_tokens' in locals() else 0,
+        "update_exp_output_tokens": update_exp_output_tokens if 'update_exp_output_tokens' in locals() else 0,
+        "update_prompts": update_prompts if 'update_prompts' in locals() else None,
+        "update_outputs": update_outputs if 'update_outputs' in locals() else None,
+        "save_exp_time": save_exp_time if 'save_exp_time' in locals() else 0.0,
+    }
+    return row
+
+
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-BATCH_SIZE = 4
+# 每批补齐后的 token 总数上限（批内最长长度 × 条数）
+MAX_BATCH_TOKENS = 16384
+EMBED_CACHE_PATH = "./hre/embed_cache.sqlite"
+# "torch": transformers fp32；"onnx": 导出一次的 int8 ONNX 模型，用 onnxruntime 在 CPU 上多线程推理
+EMBED_BACKEND = "torch"
+EMBED_THREADS = None
+# 记忆冻结时同时在途的样本数；提供方限额（每分钟请求数 / token 数），None 表示不限制
+LLM_CONCURRENCY = 8
+LLM_RPM = 600
+LLM_TPM = 1000000
+LLM_RATE_LIMITER = RateLimiter(rpm=LLM_RPM, tpm=LLM_TPM)
 if __name__ == "__main__":
     REPO_List = [
         "space-wizards-space-station-14",
@@ -966,6 +1194,11 @@ if __name__ == "__main__":
     TOPK_HRE = 5
     MAX_RETRIES = 3
     TARGET_THRESHOLD = 0.8
+    # 记忆冻结：不 add / update 经验，生成开始前对整个测试集批量检索并重排
+    FROZEN_MEMORY = False
+    # 只做检索消融：批量检索结果写入 jsonl 后直接进入下一个仓库，不调用生成模型
+    RETRIEVAL_ONLY = False
+    PRECOMPUTED_HRE = {}
 
     for repo in REPO_List:
         DATA_PATH = f"./repo_data2/{repo}/{repo}_test.jsonl"
@@ -990,304 +1223,60 @@ if __name__ == "__main__":
                 before_code = row['before_code']
                 processed_repo_pr_code.add((repo_name, before_code))
 
-        results = []
-
-        for item in tqdm(data, desc="RQ2-HRE processing", unit="item"):
-            start_time = time.time()
-            pr_number = item.get("ghid", item.get("id", "unknown_pr"))
-            repo = item.get("proj")
-            before_code = item.get("old") or ""
-            input = process_diff_code(before_code)
-            lang = item.get("lang", "unknown")
-
-            check_done_key = (repo, before_code)
-            if check_done_key in processed_repo_pr_code:
-                print(f"      跳过已处理样本：仓库 {repo}，before code {before_code}。")
+        PRECOMPUTED_HRE = {}
+        if FROZEN_MEMORY or RETRIEVAL_ONLY:
+            queries = list(dict.fromkeys(
+                item.get("old") or "" for item in data
+                if item.get("y", 1) and (item.get("proj"), item.get("old") or "") not in processed_repo_pr_code
+            ))
+            batch_start = time.time()
+            batch_results = retrieve_and_rerank_batch(RHE_index_path, RHE_meta_path, RHE_vec_path, queries, "RQ2",
+                                                      tok, mod, top_k_anchors=TOPK_HRE)
+            batch_time = time.time() - batch_start
+            print(f"  [batch search] {len(queries)} 条查询批量检索用时: {batch_time:.4f}s")
+            # 每条样本记录均摊的检索耗时
+            per_query_time = batch_time / max(1, len(queries))
+            PRECOMPUTED_HRE = {query: (res, per_query_time) for query, res in zip(queries, batch_results)}
+            if RETRIEVAL_ONLY:
+                RETRIEVAL_FILE = f"./result/rq2/{repo}/{repo}_qwen3_8B_test_HRE_retrieval_plus_0.jsonl"
+                with open(RETRIEVAL_FILE, 'w', encoding='utf-8') as f:
+                    for query, res in zip(queries, batch_results):
+                        f.write(json.dumps({
+                            "before_code": query,
+                            "experiences": [{k: v for k, v in exp.items() if k != "meta"} for exp in res],
+                        }, ensure_ascii=False) + '\n')
+                print(f"  检索结果已写入 {RETRIEVAL_FILE}")
+                close_stores()
                 continue
 
-            after_code = item.get("new") or ""
-            after_code = process_diff_code(after_code)
-            print(f"      仓库 {repo}，before code {before_code}，after code {after_code}")
-            review_comment = item.get("comment") or ""
-            hunk = item.get("old_hunk", item.get("hunk", ""))
-            print(f"      仓库 {repo}，before code {before_code}，修复开始=======================")
+        results = []
 
-            if not item.get("y", 1):
-                print(f"      跳过不需要检查的样本：仓库 {repo}，PR号 {pr_number}。========================")
+        # 已处理过的样本（断点续跑）和重复样本在提交前过滤
+        pending_items = []
+        seen_keys = set(processed_repo_pr_code)
+        for item in data:
+            check_done_key = (item.get("proj"), item.get("old") or "")
+            if check_done_key in seen_keys:
+                print(f"      跳过已处理样本：仓库 {check_done_key[0]}，before code {check_done_key[1]}。")
                 continue
+            seen_keys.add(check_done_key)
+            pending_items.append(item)
 
-            think1, out1, history_repair_experiences, experiences, messages_hre, search_time, gen_time, \
-                input_tokens, output_tokens, gen0_full_output = generate_refinement_code(before_code,
-                                                                                         review_comment,
-                                                                                         repo,
-                                                                                         gen_client)
-            if not think1 and not out1 and not history_repair_experiences and not messages_hre:
-                print(f"      仓库 {repo}，PR号 {pr_number}，修复异常")
-                continue
-            print(f"      仓库 {repo}，PR号 {pr_number}，修复结果结束")
-            outs = []
-            new_out = out1
-            reflections = []
-            reflection = ""
-            eval_scores = []
-            outs.append(out1)
-            ems = []
-            em2s = []
-            bleus = []
-            cbleus = []
-            rouges = []
-            edit_progresses = []
-            reflection_times = []
-            reflection_input_tokens_list = []
-            reflection_output_tokens_list = []
-            gen_times = [gen_time]
-            gen_input_tokens_list = [input_tokens]
-            gen_output_tokens_list = [output_tokens]
-            retry = 0
-            # 存储所有模型prompts和outputs
-            gen_prompts = [messages_hre]
-            gen_outputs = [gen0_full_output]
-            reflection_prompts = []
-            reflection_outputs = []
-            em = calculate_exact_match(out1, after_code)
-            em2 = calculate_exact_match2(out1, after_code)
-            bleu = calculate_bleu_score(out1, after_code)
-            cbleu = calculate_codebleu_score(out1, after_code, lang, repo)
-            rouge = calculate_rouge_l_score(out1, after_code)
-            edit_progress = calculate_edit_progress(input, out1, after_code)
-
-            ems.append(em)
-            em2s.append(em2)
-            bleus.append(bleu)
-            cbleus.append(cbleu)
-            rouges.append(rouge)
-            edit_progresses.append(edit_progress)
-
-            update_output = out1
-            update_cbleu = cbleu
-            update_em = em
-            update_bleu = bleu
-            update_rouge = rouge
-            update_edit_progress = edit_progress
-
-            for retry_count in range(MAX_RETRIES):
-                if cbleu >= TARGET_THRESHOLD:
-                    print(
-                        f"      仓库 {repo}，PR号 {pr_number}，第{retry_count}次尝试达到目标阈值({cbleu:.4f} >= {TARGET_THRESHOLD:.4f})，修复成功")
-                    break
-                print(f"第{retry_count}次尝试未达到目标阈值({cbleu:.4f} < {TARGET_THRESHOLD:.4f})，开始反思重试...")
-                retry += 1
-                reflection, reflection_time, reflection_input_tokens, reflection_output_tokens, reflection_prompt, \
-                    reflection_full_output = generate_reflection(pr_number, repo, before_code, review_comment,
-                                                                 after_code, outs, reflections,
-                                                                 history_repair_experiences, experiences,
-                                                                 gen_client,
-                                                                 ems, bleus, cbleus, rouges, edit_progresses)
-                reflections.append(reflection)
-                reflection_times.append(reflection_time)
-                reflection_input_tokens_list.append(reflection_input_tokens)
-                reflection_output_tokens_list.append(reflection_output_tokens)
-                reflection_prompts.append(reflection_prompt)
-                reflection_outputs.append(reflection_full_output)
-
-                think, new_out, messages, gen_time, input_tokens, output_tokens, gen_full_output = \
-                    generate_fix_with_reflection(pr_number, repo, before_code, review_comment, after_code, outs,
-                                                 reflections,
-                                                 history_repair_experiences, experiences,
-                                                 gen_client,
-                                                 ems, bleus, cbleus, rouges, edit_progresses)
-                if not think and not new_out:
-                    print(f"  第{retry_count}次反思修复生成失败，返回之前的结果")
-                    continue
-
-                gen_times.append(gen_time)
-                gen_input_tokens_list.append(input_tokens)
-                gen_output_tokens_list.append(output_tokens)
-                gen_prompts.append(messages)
-                gen_outputs.append(gen_full_output)
-                outs.append(new_out)
-                em = calculate_exact_match(new_out, after_code)
-                em2 = calculate_exact_match2(new_out, after_code)
-                bleu = calculate_bleu_score(new_out, after_code)
-                cbleu = calculate_codebleu_score(new_out, after_code, lang, repo)
-                rouge = calculate_rouge_l_score(new_out, after_code)
-                edit_progress = calculate_edit_progress(input, new_out, after_code)
-
-                ems.append(em)
-                em2s.append(em2)
-                bleus.append(bleu)
-                cbleus.append(cbleu)
-                rouges.append(rouge)
-                edit_progresses.append(edit_progress)
-
-                if cbleu > update_cbleu:
-                    update_output = new_out
-                    update_cbleu = cbleu
-                    update_em = em
-                    update_bleu = bleu
-                    update_rouge = rouge
-                    update_edit_progress = edit_progress
-                if cbleu >= TARGET_THRESHOLD:
-                    print(f"  达到目标阈值({cbleu:.4f} ≥ {TARGET_THRESHOLD:.4f})，修复完成")
-                    break
-
-            print(f"      仓库 {repo}，PR号 {pr_number}，第{retry_count}次尝试反思修复CodeBLEU得分：{cbleu:.4f}")
-            print(f"      仓库 {repo}，PR号 {pr_number}，总结经验开始")
-            summarized_experience, summarize_time, summarize_input_tokens, summarize_output_tokens, summarize_prompt, summarize_full_output = summarize_experience(
-                pr_number, repo, before_code, review_comment, after_code, outs, reflections,
-                history_repair_experiences, experiences,
-                gen_client,
-                ems, bleus, cbleus, rouges, edit_progresses)
-            # 确保 original_item 包含正确的字段
-            original_item = item.copy()
-            # 确保 old 字段存在且与 before_code 一致
-            original_item["old"] = item.get("old", before_code)
-            # 确保 new 字段存在
-            original_item["new"] = item.get("new", after_code)
-            # 确保 comment 字段存在
-            original_item["comment"] = item.get("comment", review_comment)
-            # 确保 hunk 字段存在
-            original_item["hunk"] = item.get("hunk", item.get("old_hunk", hunk))
-            # 确保 y 字段存在
-            original_item["y"] = item.get("y", 1)
-
-            add_experience_list = [{
-                "before_code": before_code,
-                "after_code": after_code,
-                "review_comment": review_comment,
-                "trigger_snippet": before_code,
-                "experience": summarized_experience,
-                "pr_number": pr_number,
-                "hunk": hunk,
-                "original_item": original_item  # 完整的原始数据
-            }]
+        progress = tqdm(total=len(pending_items), desc="RQ2-HRE processing", unit="item")
 
-            try:
-                add_experience_str = json.dumps(add_experience_list, ensure_ascii=False)
-                json.loads(add_experience_str)
-            except (TypeError, ValueError) as e:
-                print(f"     add_experience无法被json化: {e}")
-                add_experience_str = "[]"
-
-            result, save_exp_time = RHE_search_subprocess(RHE_index_path, RHE_meta_path, RHE_vec_path, tok, mod,
-                                                          before_code, TOPK_HRE, "add", add_experience_str, "RQ2")
-            print(f"  保存经验的结果：{result}")
-
-            print(f"      仓库 {repo}，PR号 {pr_number}，update_experience 开始")
-            if update_cbleu >= 0.95:
-                print("模型预测Codebleu>=0.95，无需更新经验，只追加")
-            else:
-                update_gen_time, update_rhe_time, update_exp_input_tokens, update_exp_output_tokens, update_prompts, update_outputs = \
-                    update_experience(pr_number, repo, before_code, review_comment, after_code, update_output,
-                                      reflections,
-                                      history_repair_experiences, experiences,
-                                      gen_client,
-                                      update_em, update_bleu, update_cbleu, update_rouge, update_edit_progress)
-
-            processing_time = time.time() - start_time
-            print(f"      仓库 {repo}，PR号 {pr_number}，总处理时间：{processing_time:.4f} 秒")
-
-            row = {
-                "pr_number": pr_number,
-                "repo": repo,
-                "before_code": before_code,
-                "review_comment": review_comment,
-                "prompt_with_hre": messages_hre,
-                "think_with_hre": think1,
-                "output_with_hre": outs[0],
-                "after_code": after_code,
-                "EM_hre": ems[0],
-                "EM2_hre": em2s[0],
-                "BLEU_hre": bleus[0],
-                "CodeBLEU_hre": cbleus[0],
-                "ROUGE-L_hre": rouges[0],
-                "Edit_Progress_hre": edit_progresses[0],
-                "Processing_Time_Seconds": processing_time,
-                "retry_count": retry,
-                "search_time": search_time,
-                "gen0_time": gen_times[0] if len(gen_times) > 0 else 0.0,
-                "gen0_input_tokens": gen_input_tokens_list[0] if len(gen_input_tokens_list) > 0 else 0,
-                "gen0_output_tokens": gen_output_tokens_list[0] if len(gen_output_tokens_list) > 0 else 0,
-                "gen0_prompt": gen_prompts[0] if len(gen_prompts) > 0 else None,
-                "gen0_full_output": gen_outputs[0] if len(gen_outputs) > 0 else None,
-                "reflection1_time": reflection_times[0] if len(reflection_times) > 0 else 0.0,
-                "reflection1_input_tokens": reflection_input_tokens_list[0] if len(
-                    reflection_input_tokens_list) > 0 else 0,
-                "reflection1_output_tokens": reflection_output_tokens_list[0] if len(
-                    reflection_output_tokens_list) > 0 else 0,
-                "reflection1_prompt": reflection_prompts[0] if len(reflection_prompts) > 0 else None,
-                "reflection1_full_output": reflection_outputs[0] if len(reflection_outputs) > 0 else None,
-
-                # 第一次反思后的指标（对应gen1的输出）
-                "gen1_time": gen_times[1] if len(gen_times) > 1 else 0.0,
-                "gen1_input_tokens": gen_input_tokens_list[1] if len(gen_input_tokens_list) > 1 else 0,
-                "gen1_output_tokens": gen_output_tokens_list[1] if len(gen_output_tokens_list) > 1 else 0,
-                "gen1_prompt": gen_prompts[1] if len(gen_prompts) > 1 else None,
-                "gen1_full_output": gen_outputs[1] if len(gen_outputs) > 1 else None,
-                "EM_after_reflection1": ems[1] if len(ems) > 1 else None,
-                "EM2_after_reflection1": em2s[1] if len(em2s) > 1 else None,
-                "BLEU_after_reflection1": bleus[1] if len(bleus) > 1 else None,
-                "CodeBLEU_after_reflection1": cbleus[1] if len(cbleus) > 1 else None,
-                "ROUGE-L_after_reflection1": rouges[1] if len(rouges) > 1 else None,
-                "Edit_Progress_after_reflection1": edit_progresses[1] if len(edit_progresses) > 1 else None,
-                "reflection2_time": reflection_times[1] if len(reflection_times) > 1 else 0.0,
-                "reflection2_input_tokens": reflection_input_tokens_list[1] if len(
-                    reflection_input_tokens_list) > 1 else 0,
-                "reflection2_output_tokens": reflection_output_tokens_list[1] if len(
-                    reflection_output_tokens_list) > 1 else 0,
-                "reflection2_prompt": reflection_prompts[1] if len(reflection_prompts) > 1 else None,
-                "reflection2_full_output": reflection_outputs[1] if len(reflection_outputs) > 1 else None,
-
-                # 第二次反思后的指标（对应gen2的输出）
-                "gen2_time": gen_times[2] if len(gen_times) > 2 else 0.0,
-                "gen2_input_tokens": gen_input_tokens_list[2] if len(gen_input_tokens_list) > 2 else 0,
-                "gen2_output_tokens": gen_output_tokens_list[2] if len(gen_output_tokens_list) > 2 else 0,
-                "gen2_prompt": gen_prompts[2] if len(gen_prompts) > 2 else None,
-                "gen2_full_output": gen_outputs[2] if len(gen_outputs) > 2 else None,
-                "EM_after_reflection2": ems[2] if len(ems) > 2 else None,
-                "EM2_after_reflection2": em2s[2] if len(em2s) > 2 else None,
-                "BLEU_after_reflection2": bleus[2] if len(bleus) > 2 else None,
-                "CodeBLEU_after_reflection2": cbleus[2] if len(cbleus) > 2 else None,
-                "ROUGE-L_after_reflection2": rouges[2] if len(rouges) > 2 else None,
-                "Edit_Progress_after_reflection2": edit_progresses[2] if len(edit_progresses) > 2 else None,
-                "reflection3_time": reflection_times[2] if len(reflection_times) > 2 else 0.0,
-                "reflection3_input_tokens": reflection_input_tokens_list[2] if len(
-                    reflection_input_tokens_list) > 2 else 0,
-                "reflection3_output_tokens": reflection_output_tokens_list[2] if len(
-                    reflection_output_tokens_list) > 2 else 0,
-                "reflection3_prompt": reflection_prompts[2] if len(reflection_prompts) > 2 else None,
-                "reflection3_full_output": reflection_outputs[2] if len(reflection_outputs) > 2 else None,
-
-                # 第三次反思后的指标（对应gen3的输出）
-                "gen3_time": gen_times[3] if len(gen_times) > 3 else 0.0,
-                "gen3_input_tokens": gen_input_tokens_list[3] if len(gen_input_tokens_list) > 3 else 0,
-                "gen3_output_tokens": gen_output_tokens_list[3] if len(gen_output_tokens_list) > 3 else 0,
-                "gen3_prompt": gen_prompts[3] if len(gen_prompts) > 3 else None,
-                "gen3_full_output": gen_outputs[3] if len(gen_outputs) > 3 else None,
-                "EM_after_reflection3": ems[3] if len(ems) > 3 else None,
-                "EM2_after_reflection3": em2s[3] if len(em2s) > 3 else None,
-                "BLEU_after_reflection3": bleus[3] if len(bleus) > 3 else None,
-                "CodeBLEU_after_reflection3": cbleus[3] if len(cbleus) > 3 else None,
-                "ROUGE-L_after_reflection3": rouges[3] if len(rouges) > 3 else None,
-                "Edit_Progress_after_reflection3": edit_progresses[3] if len(edit_progresses) > 3 else None,
-
-                # 经验总结和更新
-                "summarize_time": summarize_time if 'summarize_time' in locals() else 0.0,
-                "summarize_input_tokens": summarize_input_tokens if 'summarize_input_tokens' in locals() else 0,
-                "summarize_output_tokens": summarize_output_tokens if 'summarize_output_tokens' in locals() else 0,
-                "summarize_prompt": summarize_prompt if 'summarize_prompt' in locals() else None,
-                "summarize_full_output": summarize_full_output if 'summarize_full_output' in locals() else None,
-                "update_gen_time": update_gen_time if 'update_gen_time' in locals() else 0.0,
-                "update_rhe_time": update_rhe_time if 'update_rhe_time' in locals() else 0.0,
-                "update_exp_input_tokens": update_exp_input_tokens if 'update_exp_input_tokens' in locals() else 0,
-                "update_exp_output_tokens": update_exp_output_tokens if 'update_exp_output_tokens' in locals() else 0,
-                "update_prompts": update_prompts if 'update_prompts' in locals() else None,
-                "update_outputs": update_outputs if 'update_outputs' in locals() else None,
-                "save_exp_time": save_exp_time if 'save_exp_time' in locals() else 0.0,
-            }
+        def commit_row(item, row):
+            # 按输入顺序落盘，中断后已写入的前缀即为断点
+            progress.update(1)
+            if row is None:
+                return
             save_xlsx_append(RESULT_XLSX, row)
             results.append(row)
-            processed_repo_pr_code.add((repo, before_code))
+            processed_repo_pr_code.add((row["repo"], row["before_code"]))
+
+        # 记忆未冻结时，后一条样本的检索依赖前面样本写入的经验，只能串行
+        concurrency = LLM_CONCURRENCY if FROZEN_MEMORY else 1
+        run_ordered(pending_items, lambda item: process_item(item, gen_client), concurrency, commit_row)
+        progress.close()
 
         if results:
             em_h = np.mean([r["EM_hre"] for r in results])
@@ -1361,3 +1350,6 @@ if __name__ == "__main__":
             print(f"     平均每条数据处理时间：{avg_processing_time:.4f} 秒")
         else:
             print("      无可评估样本。")
+
+        # 切换仓库前把常驻 HREStore 中的改动刷回磁盘
+        close_stores()
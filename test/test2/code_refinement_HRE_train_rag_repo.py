@@ -17,11 +17,18 @@ from transformers import AutoTokenizer, AutoModel
 
 from eval_code_sim import calculate_exact_match, calculate_exact_match2, calculate_bleu_score, calculate_codebleu_score, \
     calculate_rouge_l_score, calculate_edit_progress
+from hre_embedding import embedding_service, load_onnx_backend
+from hre_store import open_store, close_stores, rerank_experiences
 
 MODEL_DIR = "/Users/jiajunyu/llm_models/Qwen3-Embedding-0.6B"
 DEVICE = "mps" if torch.backends.mps.is_available() else "cpu"
-BATCH_SIZE = 8
 MAX_LENGTH = 4096
+# 每批补齐后的 token 总数上限（批内最长长度 × 条数）
+MAX_BATCH_TOKENS = 16384
+EMBED_CACHE_PATH = "./hre/embed_cache.sqlite"
+# "torch": transformers fp32；"onnx": 导出一次的 int8 ONNX 模型，用 onnxruntime 在 CPU 上多线程推理
+EMBED_BACKEND = "torch"
+EMBED_THREADS = None
 
 
 
@@ -30,6 +37,9 @@ MAX_LENGTH = 4096
 # =========================
 def load_embedding_model(model_dir: str):
     tokenizer = AutoTokenizer.from_pretrained(model_dir, trust_remote_code=True)
+    if EMBED_BACKEND == "onnx":
+        # 不加载 PyTorch 模型，直接用量化后的 onnx 文件（第一次运行时导出）
+        return tokenizer, load_onnx_backend(model_dir, threads=EMBED_THREADS)
     model = AutoModel.from_pretrained(
         model_dir,
         trust_remote_code=True,
@@ -40,79 +50,24 @@ def load_embedding_model(model_dir: str):
     return tokenizer, model
 
 
-def mean_pooling(model_output, attention_mask):
-    token_embeddings = model_output.last_hidden_state
-    mask = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
-    emb = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
-    return emb
-
-
 def embed_texts(texts: List[str], tokenizer, model) -> List[np.ndarray]:
+    # 按长度分桶、按 token 预算组批，并带持久化的内容哈希缓存，返回顺序与 texts 一致
     start_time = time.time()
-    all_embeddings = []
-
-    for i in range(0, len(texts), BATCH_SIZE):
-        batch = texts[i:i + BATCH_SIZE]
-        print(f"[embed] batch {i} - {min(i + BATCH_SIZE, len(texts))}/{len(texts)}", flush=True)
-
-        encoded = tokenizer(
-            batch,
-            padding=True,
-            truncation=True,
-            return_tensors="pt",
-            max_length=MAX_LENGTH,
-        )
-        encoded = {k: v.to(DEVICE) for k, v in encoded.items()}
-
-        with torch.no_grad():
-            out = model(**encoded)
-            emb = mean_pooling(out, encoded["attention_mask"])
-            emb = torch.nn.functional.normalize(emb, p=2, dim=1)
-            emb = emb.detach().float().cpu().numpy()
-            all_embeddings.append(emb)
-
-        if DEVICE == "mps":
-            torch.mps.empty_cache()
+    service = embedding_service(tokenizer, model, device=DEVICE, max_length=MAX_LENGTH,
+                                max_batch_tokens=MAX_BATCH_TOKENS, cache_path=EMBED_CACHE_PATH)
+    embeddings = service.embed(texts)
     elapsed_time = time.time() - start_time
     print(f"  [embed_texts] 嵌入 {len(texts)} 条文本，用时: {elapsed_time:.4f}s", file=sys.stderr)
-    if all_embeddings:
-        return np.vstack(all_embeddings).astype(np.float32)
-
-    return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    return embeddings
 
 
 def load_index_and_meta(index_path: str, meta_path: str, vec_path: str, RQ: str):
+    # 常驻的 HREStore 只在第一次调用时读盘，之后直接复用内存中的 index / meta / vecs
     start_time = time.time()
-    import faiss
-    idx = faiss.read_index(index_path)
-    meta_list = []
-    with open(meta_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                meta_list.append(json.loads(line.strip()))
-            except Exception:
-                meta_list.append({})
-    vecs = np.load(vec_path)
-    if len(meta_list) != vecs.shape[0]:
-        raise ValueError(
-            f"meta 数量 {len(meta_list)} 与 vec 数量{vecs.shape[0]}不一致"
-        )
-    if idx.ntotal != len(meta_list):
-        raise ValueError(
-            f"faiss index 数量 {idx.ntotal} 与 meta 数量 {len(meta_list)} 不一致"
-        )
-    text_to_vecs = {}
-    for meta, vec in zip(meta_list, vecs):
-        original_item = meta.get("original_item", {})
-        if RQ == "RQ1":
-            patch_text = original_item.get("patch")
-        else:
-            patch_text = original_item.get("old")
-        if patch_text:
-            text_to_vecs[patch_text] = vec.astype(np.float32)
+    store = open_store(index_path, meta_path, vec_path, RQ)
     elapsed_time = time.time() - start_time
-    print(f"  [load_index_and_meta] 加载索引和元数据，共 {len(meta_list)} 条，用时: {elapsed_time:.4f}s", file=sys.stderr)
-    return idx, meta_list, text_to_vecs
+    print(f"  [load_index_and_meta] 加载索引和元数据，共 {len(store)} 条，用时: {elapsed_time:.4f}s", file=sys.stderr)
+    return store
 
 
 def process_diff_code(diff_code: str) -> str:
@@ -174,13 +129,15 @@ def retrieve_and_rerank_experiences(
     4. 按该相似度重排序，返回 top-N 经验
     """
     total_start_time = time.time()
-    idx, metas, text_to_vecs = load_index_and_meta(index_path, meta_path, vec_path, RQ)
+    store = load_index_and_meta(index_path, meta_path, vec_path, RQ)
+    metas = store.metas
     embed_start_time = time.time()
     q_vec = embed_texts([query], tokenizer, model).astype('float32')
     print(f"  [retrieve_and_rerank] 查询嵌入用时: {time.time() - embed_start_time:.4f}s", file=sys.stderr)
-    D, I = idx.search(q_vec, top_k_anchors + 20)
+    D, I = store.search(q_vec, top_k_anchors + 20)
 
     all_candidate_experiences = []
+    pending = []
     had_code = set()
 
     if RQ == "RQ2":
@@ -219,54 +176,24 @@ def retrieve_and_rerank_experiences(
                     "meta": patch_meta
                 })
             else:
-                # 找到具有最高score的经验
-                best_exp = None
-                best_score = -float('inf')
-                best_trigger_diff = None
-                for exp in experiences:
-                    # ### KEY: 决定 ref_diff 用于重排序 ### 是谁触发了该经验的更新
-                    trigger_diff = exp.get("trigger_snippet")
-                    trigger_snippets = trigger_diff if isinstance(trigger_diff, list) else [trigger_diff]
-                    valid_snippets = [s for s in trigger_snippets if s and s != query]
-                    if not valid_snippets:
-                        final_score = float(score)
-                    else:
-                        sim_scores = []
-                        used_snippets = []
-                    for snippet in valid_snippets:
-                        # 这里不再在线embed
-                        # 而是直接从text_to_vecs里取trigger 对应的向量
-                        ref_vec = text_to_vecs.get(snippet)
-                        if ref_vec is None:
-                            continue
-                        sim = float(np.dot(q_vec[0], ref_vec))
-                        sim_scores.append(sim)
-                        used_snippets.append(snippet)
-                    if not sim_scores:
-                        final_score = float(score)
-                    elif len(sim_scores) == 1:
-                        final_score = sim_scores[0]
-                    else:  # 最后一个trigger 权重 0.5,其余 trigger 的均值权重 0.5
-                        final_score = float(0.5 * sim_scores[-1] + 0.5 * np.mean(sim_scores[:-1]))
-                    if final_score > best_score:
-                        best_score = final_score
-                        best_exp = exp
-                        best_trigger_diff = valid_snippets
-
-                # 只添加得分最高的经验
-                if best_exp is not None:
-                    all_candidate_experiences.append({
-                        "experience": best_exp["experience"],
-                        "comment": comment,
-                        "diff_snippet": hunk,
-                        "score": best_score,
-                        "old": old,
-                        "new": new,
-                        "trigger_snippet": best_trigger_diff,
-                        "meta": patch_meta
-                    })
+                # 多条经验：先占位，循环结束后对所有候选的 trigger 统一向量化打分，只保留得分最高的经验
+                candidate = {
+                    "experience": None,
+                    "comment": comment,
+                    "diff_snippet": hunk,
+                    "score": float(score),
+                    "old": old,
+                    "new": new,
+                    "trigger_snippet": None,
+                    "meta": patch_meta
+                }
+                all_candidate_experiences.append(candidate)
+                pending.append((candidate, experiences, float(score)))
             had_code.add(old)
 
+    if pending:
+        rerank_experiences(store, q_vec, query, pending, lambda texts: embed_texts(texts, tokenizer, model))
+
     # 过滤掉不包含"experience"字段的条目
     filtered_experiences = [exp for exp in all_candidate_experiences if "experience" in exp]
 
@@ -284,17 +211,10 @@ def retrieve_and_rerank_experiences(
     return all_candidate_experiences[:top_k_anchors]
 
 
-def update_hre_experience(index_path, meta_path, experiences_str, RQ):
+def update_hre_experience(index_path, meta_path, vec_path, experiences_str, RQ):
     start_time = time.time()
     experiences = json.loads(experiences_str)
-    # 读取现有的元数据
-    meta_list = []
-    with open(meta_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                meta_list.append(json.loads(line.strip()))
-            except Exception:
-                meta_list.append({})
+    store = load_index_and_meta(index_path, meta_path, vec_path, RQ)
 
     # 将experiences转换为便于查找的字典
     exp_dict = {}
@@ -303,36 +223,10 @@ def update_hre_experience(index_path, meta_path, experiences_str, RQ):
             key = (exp.get("before_code"))
             exp_dict[key] = exp
 
-    # 更新匹配的元数据条目
-    updated_count = 0
-    for meta_org in meta_list:
-        meta_data_org = meta_org.get("original_item")
-        key = ""
-        if RQ == "RQ2":
-            key = (meta_data_org.get("old"))
-            # key = process_diff_code(key)
-        if key in exp_dict and exp_dict[key]:
-            if "experiences" not in meta_data_org:
-                meta_data_org["experiences"] = []
-
-            new_trigger = exp_dict[key]['trigger_snippet']
-            old_trigger_snippets = exp_dict[key].get("old_trigger_snippets", [])
-            trigger_snippets = old_trigger_snippets if isinstance(old_trigger_snippets, list) else [
-                old_trigger_snippets]
-            trigger_snippets.append(new_trigger)
-            meta_data_org["experiences"].append({
-                "experience": exp_dict[key]['experience'],
-                "trigger_snippet": trigger_snippets
-            })
-            updated_count += 1
-
-    # 写回更新后的元数据，不会新增数据，只会更新已有的meta条目
-    with open(meta_path, 'w', encoding='utf-8') as f:
-        for meta in meta_list:
-            f.write(json.dumps(meta, ensure_ascii=False) + '\n')
-
+    # 只在内存中给匹配的条目追加经验，由 HREStore 异步写回 meta，不会新增数据
     # 注意：这不会影响index_path，因为索引是基于代码片段的向量表示，
     # 而我们只更新了元数据中的经验信息，没有更改任何与索引相关的数据。
+    updated_count = store.update(exp_dict)
     elapsed_time = time.time() - start_time
     print(f"  [update_hre_experience] 更新 {updated_count} 条经验，用时: {elapsed_time:.4f}s", file=sys.stderr)
     return str({"updated_count": updated_count, "message": f"成功更新了{updated_count}条经验数据"})
@@ -357,7 +251,7 @@ def RHE_search_subprocess(RHE_index_path, RHE_meta_path, RHE_vec_path, tok, mod,
         try:
             time0 = time.time()
             print(f"  [update] 开始执行")
-            res = update_hre_experience(RHE_index_path, RHE_meta_path, experiences, RQ)
+            res = update_hre_experience(RHE_index_path, RHE_meta_path, RHE_vec_path, experiences, RQ)
             time1 = time.time() - time0
             print(f"  [update] 更新用时: {time1:.4f}s")
         except Exception as e:
@@ -1239,3 +1133,6 @@ if __name__ == "__main__":
             print(f"     平均每条数据处理时间：{avg_processing_time:.4f} 秒")
         else:
             print("      无可评估样本。")
+
+        # 切换仓库前把常驻 HREStore 中的改动刷回磁盘
+        close_stores()
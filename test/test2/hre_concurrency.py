@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+HRE 评测的并发执行工具。
+
+- RateLimiter：按提供方的每分钟请求数 / token 数限额节流（令牌桶），遇到 429 时全体线程一起退避重试；
+- run_ordered：线程池并发处理样本，同时在途的样本数不超过 max_in_flight，
+  结果按输入顺序在调用线程中提交，中断后已提交的前缀即可用于断点续跑。
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _Bucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # 超过桶容量的单次请求只要求桶是满的，否则永远等不到
+        amount = min(amount, self.capacity)
+        return 0.0 if self.available >= amount else (amount - self.available) / self.rate
+
+
+def _is_rate_limit_error(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+
+class RateLimiter:
+    """
+    rpm / tpm 为 None 时不限制对应维度。call() 先按估算的 token 数取令牌，
+    请求完成后用 record() 按真实用量校正 token 桶。
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_retries: int = 5, backoff: float = 2.0):
+        self.requests = _Bucket(rpm) if rpm else None
+        self.tokens = _Bucket(tpm) if tpm else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+
+    def acquire(self, tokens: int = 0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                delay = self.paused_until - now
+                for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                    if bucket is not None:
+                        bucket.refill(now)
+                        delay = max(delay, bucket.wait_time(amount))
+                if delay <= 0:
+                    if self.requests is not None:
+                        self.requests.available -= 1
+                    if self.tokens is not None:
+                        self.tokens.available -= tokens
+                    return
+            time.sleep(delay)
+
+    def record(self, actual_tokens: int, estimated_tokens: int):
+        if self.tokens is None:
+            return
+        with self.lock:
+            self.tokens.available -= actual_tokens - estimated_tokens
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        for attempt in range(self.max_retries + 1):
+            self.acquire(estimated_tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if not _is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                print(f"  [RateLimiter] 触发限流，{delay:.1f}s 后重试: {e}")
+                with self.lock:
+                    self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+
+def run_ordered(items: List[Any], worker: Callable[[Any], Any], max_in_flight: int,
+                commit: Callable[[Any, Any], None]):
+    """
+    用最多 max_in_flight 个线程执行 worker(item)，commit(item, result) 严格按 items 的顺序调用。
+    某个样本出错时，它之前的结果都已提交，随后抛出该异常。
+    """
+    if max_in_flight <= 1:
+        for item in items:
+            commit(item, worker(item))
+        return
+    done: Dict[int, Any] = {}
+    running = {}
+    next_submit = 0
+    next_commit = 0
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while next_commit < len(items):
+            while next_submit < len(items) and len(running) < max_in_flight:
+                running[pool.submit(worker, items[next_submit])] = next_submit
+                next_submit += 1
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                done[running.pop(future)] = future
+            while next_commit in done:
+                commit(items[next_commit], done.pop(next_commit).result())
+                next_commit += 1
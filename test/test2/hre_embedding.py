@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+HRE 的嵌入服务：按长度分桶的动态批处理 + 持久化的内容哈希 -> 向量缓存。
+
+- 文本先去重、查缓存，只有未命中的才送进模型；
+- 未命中的文本一次分词后按 token 长度排序，按 token 预算（批内最长长度 × 条数）而不是固定条数组批，
+  短文本不再被同批的长 diff 填充到几千个 token；
+- 结果按原始顺序写回，并写入 sqlite 缓存，重复的 query / trigger_snippet / before_code 不再重复嵌入。
+
+前向计算由可替换的后端完成：TorchEmbeddingBackend 是原来的 transformers fp32 路径；
+OnnxEmbeddingBackend 把模型一次性导出为 ONNX 并动态量化为 int8，用 onnxruntime 在 CPU 上多线程推理，
+只需加载量化后的模型文件。parity_check 比较两个后端的向量余弦和检索 top-k 重合度。
+
+    python hre_embedding.py --model-dir Qwen3-Embedding-0.6B --meta ./hre/<repo>/<repo>_code_refinement_hre_meta_plus_0.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from hre_store import content_hash
+
+
+class EmbeddingCache:
+    """sqlite 中的 (模型, 内容哈希) -> float32 向量"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vec BLOB NOT NULL, PRIMARY KEY (model, hash))"
+        )
+        self.conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self.lock:
+            # sqlite 单条语句的参数个数有限，分块查询
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT hash, vec FROM vectors WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [model] + chunk,
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, items: List[Tuple[str, np.ndarray]]):
+        if not items:
+            return
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vectors (model, hash, vec) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(vec, dtype=np.float32).tobytes()) for h, vec in items],
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def length_buckets(lengths: List[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """
+    按长度升序把下标切成批：批的代价是 批内最长长度 × 条数（即 padding 之后的 token 数），
+    超过 max_batch_tokens 或 max_batch_size 就开始新的一批。超长的单条文本独占一批。
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    for i in order:
+        # 升序排列，新加入的一条就是批内最长的
+        if batch and (len(batch) >= max_batch_size or lengths[i] * (len(batch) + 1) > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _mean_pool_numpy(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    mask = attention_mask[..., None].astype(np.float32)
+    emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    return emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+
+
+def model_fingerprint(model_dir: str) -> str:
+    """
+    缓存用的模型标识：本地目录取解析后的目录名 + config.json 的内容哈希，
+    同一个模型用绝对路径、相对路径或软链接加载时标识相同；不是本地目录（如 hub 名）时原样返回。
+    """
+    path = os.path.realpath(model_dir) if model_dir else ""
+    if not path or not os.path.isdir(path):
+        return model_dir
+    config_path = os.path.join(path, "config.json")
+    if not os.path.exists(config_path):
+        return os.path.basename(path)
+    with open(config_path, 'rb') as f:
+        return f"{os.path.basename(path)}-{hashlib.sha1(f.read()).hexdigest()[:12]}"
+
+
+class TorchEmbeddingBackend:
+    """transformers 模型的 fp32 前向 + 均值池化 + L2 归一化"""
+
+    name = "torch"
+
+    def __init__(self, model, device: str = "cpu"):
+        self.model = model
+        self.device = device
+        self.dim = model.config.hidden_size
+        self.model_id = model_fingerprint(getattr(model.config, "_name_or_path", "")) or type(model).__name__
+
+    def encode(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        import torch
+
+        encoded = {
+            "input_ids": torch.from_numpy(input_ids).to(self.device),
+            "attention_mask": torch.from_numpy(attention_mask).to(self.device),
+        }
+        with torch.no_grad():
+            output = self.model(**encoded)
+            emb = _mean_pooling(output, encoded["attention_mask"])
+            emb = torch.nn.functional.normalize(emb, p=2, dim=1)
+        if self.device == "mps":
+            torch.mps.empty_cache()
+        return emb.detach().float().cpu().numpy()
+
+
+class OnnxEmbeddingBackend:
+    """onnxruntime 推理（CPU，intra-op 多线程），池化与归一化在 numpy 中完成"""
+
+    name = "onnx"
+
+    def __init__(self, onnx_path: str, dim: int, threads: Optional[int] = None, model_id: str = ""):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.dim = dim
+        self.model_id = f"{model_id or onnx_path}:{os.path.basename(onnx_path)}"
+
+    def encode(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        hidden = self.session.run(
+            ["last_hidden_state"],
+            {"input_ids": input_ids.astype(np.int64), "attention_mask": attention_mask.astype(np.int64)},
+        )[0]
+        return _mean_pool_numpy(hidden, attention_mask).astype(np.float32)
+
+
+def export_onnx(model_dir: str, onnx_path: str, opset: int = 17):
+    """把 transformers 模型导出为输出 last_hidden_state 的 ONNX（batch / seq 维度可变）"""
+    import torch
+    from transformers import AutoModel
+
+    model = AutoModel.from_pretrained(model_dir, trust_remote_code=True, torch_dtype=torch.float32)
+    model.config.use_cache = False
+    model.eval()
+
+    class _LastHidden(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask):
+            return self.inner(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    dummy = torch.ones((2, 8), dtype=torch.long)
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHidden(model), (dummy, dummy), onnx_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "seq"},
+                "attention_mask": {0: "batch", 1: "seq"},
+                "last_hidden_state": {0: "batch", 1: "seq"},
+            },
+            opset_version=opset,
+        )
+
+
+def quantize_onnx(onnx_path: str, int8_path: str):
+    """权重动态量化为 int8（激活在推理时按批量化），fp32 模型超过 2GB 时权重在外部数据文件中"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8, use_external_data_format=True)
+
+
+def load_onnx_backend(model_dir: str, onnx_dir: Optional[str] = None, quantize: bool = True,
+                      threads: Optional[int] = None) -> OnnxEmbeddingBackend:
+    """第一次调用时导出（并量化）模型，之后直接加载 onnx 文件，不再加载 PyTorch 模型"""
+    onnx_dir = onnx_dir or os.path.join(model_dir, "onnx")
+    os.makedirs(onnx_dir, exist_ok=True)
+    fp32_path = os.path.join(onnx_dir, "model.onnx")
+    target = os.path.join(onnx_dir, "model.int8.onnx") if quantize else fp32_path
+    if not os.path.exists(target):
+        if not os.path.exists(fp32_path):
+            print(f"  [embedding] 导出 ONNX: {fp32_path}")
+            export_onnx(model_dir, fp32_path)
+        if quantize:
+            print(f"  [embedding] int8 动态量化: {target}")
+            quantize_onnx(fp32_path, target)
+    with open(os.path.join(model_dir, "config.json"), 'r', encoding='utf-8') as f:
+        dim = json.load(f)["hidden_size"]
+    return OnnxEmbeddingBackend(target, dim, threads=threads, model_id=model_fingerprint(model_dir))
+
+
+class EmbeddingService:
+    """
+    包装 tokenizer 和嵌入后端的服务，embed(texts) 返回与输入顺序一致的 L2 归一化向量矩阵。
+    model 可以是 transformers 模型（按原来的 embed_texts 做均值池化）或任意后端对象。
+    """
+
+    def __init__(self, tokenizer, model, device: str = "cpu", max_length: int = 4096,
+                 max_batch_tokens: int = 16384, max_batch_size: int = 64,
+                 cache_path: Optional[str] = None, model_id: Optional[str] = None):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.backend = model if isinstance(model, (TorchEmbeddingBackend, OnnxEmbeddingBackend)) \
+            else TorchEmbeddingBackend(model, device)
+        self.device = device
+        self.max_length = max_length
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        # 后端和截断长度不同，同一段文本的向量也不同，所以一起作为缓存的命名空间
+        self.model_id = f"{self.backend.name}:{model_id or self.backend.model_id}@{max_length}"
+        self.dim = self.backend.dim
+        self.stats = {"texts": 0, "cache_hits": 0, "encoded": 0, "batches": 0, "padded_tokens": 0}
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return out
+        hashes = [content_hash(t) for t in texts]
+        unique: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            unique.setdefault(h, t)
+        vectors = self.cache.get_many(self.model_id, list(unique)) if self.cache else {}
+        missing = [h for h in unique if h not in vectors]
+        self.stats["texts"] += len(texts)
+        self.stats["cache_hits"] += len(unique) - len(missing)
+        if missing:
+            encoded = self._encode([unique[h] for h in missing])
+            fresh = list(zip(missing, encoded))
+            vectors.update(fresh)
+            if self.cache:
+                self.cache.put_many(self.model_id, fresh)
+        for i, h in enumerate(hashes):
+            out[i] = vectors[h]
+        return out
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # 只分词一次，拿到真实长度后再按桶组批、补齐
+        tokenized = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        input_ids = tokenized["input_ids"]
+        lengths = [len(ids) for ids in input_ids]
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for batch in length_buckets(lengths, self.max_batch_tokens, self.max_batch_size):
+            features = {key: [tokenized[key][i] for i in batch] for key in ("input_ids", "attention_mask")}
+            encoded = self.tokenizer.pad(features, padding=True, return_tensors="np")
+            out[batch] = self.backend.encode(encoded["input_ids"], encoded["attention_mask"])
+            self.stats["encoded"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["padded_tokens"] += len(batch) * max(lengths[i] for i in batch)
+        return out
+
+    def close(self):
+        if self.cache:
+            self.cache.close()
+
+
+def _mean_pooling(model_output, attention_mask):
+    token_embeddings = model_output.last_hidden_state
+    mask = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
+    return (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+
+_SERVICES: Dict[int, EmbeddingService] = {}
+_SERVICES_LOCK = threading.Lock()
+
+
+def embedding_service(tokenizer, model, **kwargs) -> EmbeddingService:
+    """同一个模型在进程内共用一个 EmbeddingService（以及它的缓存连接）"""
+    with _SERVICES_LOCK:
+        service = _SERVICES.get(id(model))
+        if service is None or service.model is not model:
+            service = _SERVICES[id(model)] = EmbeddingService(tokenizer, model, **kwargs)
+        return service
+
+
+def parity_check(tokenizer, reference, candidate, texts: List[str], k: int = 10,
+                 tolerance: float = 0.99, min_overlap: float = 0.9, max_length: int = 4096) -> dict:
+    """
+    用同一批文本比较两个后端：逐条向量余弦（都已归一化，即点积），
+    以及把这批文本同时当作查询和库时，两边 top-k 检索结果（去掉自身）的平均重合率。
+    """
+    ref = EmbeddingService(tokenizer, reference, max_length=max_length).embed(texts)
+    cand = EmbeddingService(tokenizer, candidate, max_length=max_length).embed(texts)
+    cos = (ref * cand).sum(axis=1)
+    k = min(k, len(texts) - 1)
+    overlap = 1.0
+    if k > 0:
+        def top_k(vecs):
+            sims = vecs @ vecs.T
+            np.fill_diagonal(sims, -np.inf)
+            return np.argsort(-sims, axis=1)[:, :k]
+        ref_top, cand_top = top_k(ref), top_k(cand)
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]))
+    result = {
+        "texts": len(texts),
+        "min_cos": float(cos.min()),
+        "mean_cos": float(cos.mean()),
+        f"overlap@{k}": overlap,
+        "passed": bool(cos.min() >= tolerance and overlap >= min_overlap),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 int8 ONNX 嵌入模型，并与 fp32 transformers 模型做一致性检查")
+    parser.add_argument("--model-dir", required=True)
+    parser.add_argument("--meta", required=True, help="HRE meta jsonl，取其中的代码片段作为检查样本")
+    parser.add_argument("--onnx-dir", default=None)
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.99)
+    args = parser.parse_args()
+
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    from hre_store import read_meta
+
+    texts = []
+    for meta in read_meta(args.meta):
+        old = (meta.get("original_item") or {}).get("old")
+        if old:
+            texts.append(old)
+        if len(texts) >= args.limit:
+            break
+    tokenizer = AutoTokenizer.from_pretrained(args.model_dir, trust_remote_code=True)
+
+    start = time.time()
+    model = AutoModel.from_pretrained(args.model_dir, trust_remote_code=True, torch_dtype=torch.float32).eval()
+    torch_load = time.time() - start
+    start = time.time()
+    onnx_backend = load_onnx_backend(args.model_dir, args.onnx_dir, quantize=not args.no_quantize,
+                                     threads=args.threads)
+    onnx_load = time.time() - start
+
+    for name, backend in (("torch", model), ("onnx", onnx_backend)):
+        service = EmbeddingService(tokenizer, backend)
+        start = time.time()
+        for text in texts[:20]:
+            service.embed([text])
+        print(f"  [{name}] 单条查询平均延迟: {(time.time() - start) / max(1, len(texts[:20])):.4f}s")
+    print(f"  模型加载用时: torch {torch_load:.2f}s, onnx {onnx_load:.2f}s")
+    print(json.dumps(parity_check(tokenizer, model, onnx_backend, texts, k=args.k, tolerance=args.tolerance),
+                     ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,792 @@
+# -*- coding: utf-8 -*-
+"""
+常驻内存的 HRE（历史修复经验）存储。
+
+faiss 索引、meta 和向量在进程内只加载一次，search / add / update 直接操作内存中的
+三份数据并保持一致；落盘由后台线程异步完成，进程退出或调用 close() 时同步刷盘。
+
+meta 的改动不再整文件重写：每次 add / update 只向 `<meta_path>.log` 追加一行操作记录，
+加载时在 meta 快照上重放；日志累计到 compact_every 条后压缩回 meta 快照，
+`<meta_path>.state` 记录快照已包含的最后一个操作序号和快照内容的 sha1：
+压缩时先写 state 再替换快照，加载时快照的 sha1 对不上（替换前中断）就退回上一次快照的序号，
+已并入快照的 "exp" 操作不会被重复重放。
+
+向量保存在 `<vec_path 去掉 .npy>.mmap`（VectorStore）：文件头记录条数 / 维度 / 容量，
+新增向量只写入新行，读取方直接映射文件；第一次打开时从原 .npy 迁移，头中记下 .npy 的大小和 mtime，
+.npy 被重新生成（签名对不上）时重新迁移；close() 时若向量有变化再把全部向量写回 .npy，
+其他直接读 .npy 的程序看到的仍是最新数据。
+向量条数即共享序号：faiss 索引第 i 条、meta 第 i 条和向量第 i 行始终对应同一条经验。
+
+向量按内容哈希（content_hash）查找：经验的 trigger_snippet 在 meta 中带有 trigger_hashes，
+命中经验条目时直接取第 i 行向量；不属于任何条目的片段只嵌入一次，
+追加到 `<vec_path 去掉 .npy>.snip.mmap`，哈希顺序记录在同名的 .keys 文件中。
+
+索引类型按条数自动选择（INDEX_TIERS：Flat -> IVF-Flat -> HNSW -> IVF-PQ），
+跨过阈值或 IVF 的聚类数明显偏小时在后台线程从向量文件重建，重建期间检索继续使用旧索引；
+recall_at_k() 以精确内积检索为基准报告召回率。
+"""
+import atexit
+import hashlib
+import json
+import math
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def read_meta(meta_path: str) -> List[dict]:
+    meta_list = []
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                meta_list.append(json.loads(line.strip()))
+            except Exception:
+                meta_list.append({})
+    return meta_list
+
+
+def patch_key(meta: dict, RQ: str) -> Optional[str]:
+    """经验条目在 meta 中的主键：RQ1 用 patch，其余用 old"""
+    original_item = meta.get("original_item") or {}
+    if RQ == "RQ1":
+        return original_item.get("patch")
+    return original_item.get("old")
+
+
+def content_hash(text: str) -> str:
+    """代码片段的内容哈希，作为向量查找的键"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def trigger_refs(exp: dict) -> List[Tuple[str, str]]:
+    """经验的 (trigger_snippet, 内容哈希) 列表；meta 中已有 trigger_hashes 时直接复用"""
+    snippets = exp.get("trigger_snippet")
+    if not isinstance(snippets, list):
+        snippets = [snippets]
+    hashes = exp.get("trigger_hashes")
+    if not isinstance(hashes, list) or len(hashes) != len(snippets):
+        hashes = [content_hash(s) if s else "" for s in snippets]
+    return list(zip(snippets, hashes))
+
+
+def segment_trigger_scores(q_vec: np.ndarray, segments: List[List[np.ndarray]],
+                           fallback: List[float]) -> np.ndarray:
+    """
+    segments[i] 是第 i 条经验可用的 trigger 向量（按触发顺序），fallback[i] 是没有可用向量时的得分。
+    全部相似度由一次矩阵乘法算出，再按段归约：只有一个 trigger 时取其相似度，
+    多个时最后一个 trigger 权重 0.5、其余 trigger 的均值权重 0.5。
+    """
+    scores = np.asarray(fallback, dtype=np.float64).copy()
+    counts = np.array([len(seg) for seg in segments], dtype=np.int64)
+    if not counts.sum():
+        return scores
+    mat = np.stack([vec for seg in segments for vec in seg]).astype(np.float32, copy=False)
+    sims = (mat @ np.asarray(q_vec, dtype=np.float32)).astype(np.float64)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    csum = np.concatenate(([0.0], np.cumsum(sims)))
+    has = counts > 0
+    multi = counts > 1
+    last = sims[ends[has] - 1]
+    scores[has] = last
+    others_mean = (csum[ends[multi] - 1] - csum[starts[multi]]) / (counts[multi] - 1)
+    scores[multi] = 0.5 * sims[ends[multi] - 1] + 0.5 * others_mean
+    return scores
+
+
+def rerank_experiences(store: "HREStore", q_vec: np.ndarray, query: str,
+                       pending: List[Tuple[dict, List[dict], float]], embed_fn=None):
+    """
+    pending: [(candidate, experiences, anchor_score)]，为每个锚点挑出得分最高的经验并写回 candidate。
+    所有候选的 trigger 向量一次取出（缺失的一次批量嵌入），打分与经验条数无关地向量化完成。
+    """
+    exp_refs = []
+    fallback = []
+    for _, experiences, anchor_score in pending:
+        for exp in experiences:
+            exp_refs.append([(s, h) for s, h in trigger_refs(exp) if s and s != query])
+            fallback.append(anchor_score)
+    flat = store.vectors_for([h for refs in exp_refs for _, h in refs],
+                             [s for refs in exp_refs for s, _ in refs], embed_fn)
+    segments = []
+    offset = 0
+    for refs in exp_refs:
+        segments.append([vec for vec in flat[offset:offset + len(refs)] if vec is not None])
+        offset += len(refs)
+    scores = segment_trigger_scores(q_vec[0], segments, fallback)
+
+    start = 0
+    for candidate, experiences, _ in pending:
+        end = start + len(experiences)
+        # argmax 取第一个最大值，与逐条比较 final_score > best_score 的结果一致
+        best = start + int(np.argmax(scores[start:end]))
+        candidate["experience"] = experiences[best - start]["experience"]
+        candidate["score"] = float(scores[best])
+        candidate["trigger_snippet"] = [s for s, _ in exp_refs[best]]
+        start = end
+
+
+def _file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(大小, mtime_ns)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _atomic_write(path: str, write_fn):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+
+
+class VectorStore:
+    """
+    预分配、可增长的 float32 向量文件，基于 np.memmap。
+
+    文件布局：64 字节头（MAGIC, count, dim, capacity, 源 .npy 的大小和 mtime_ns）+ capacity 行向量。
+    不是从 .npy 迁移来的文件，源签名为 (0, 0)。
+    append 只写入新行，写完数据后再更新头中的 count，中断时不会读到半行。
+    """
+
+    MAGIC = b"HREVEC01"
+    HEADER_SIZE = 64
+
+    def __init__(self, path: str, dim: Optional[int] = None, initial_capacity: int = 1024):
+        self.path = path
+        if not os.path.exists(path):
+            if dim is None:
+                raise ValueError(f"创建向量文件 {path} 需要指定维度")
+            with open(path, 'wb') as f:
+                f.write(self._pack_header(0, dim, initial_capacity, (0, 0)))
+                f.truncate(self.HEADER_SIZE + initial_capacity * dim * 4)
+        self._fh = open(path, 'r+b')
+        magic = self._fh.read(len(self.MAGIC))
+        if magic != self.MAGIC:
+            raise ValueError(f"{path} 不是 HRE 向量文件")
+        self.count, self.dim, self.capacity, *source = struct.unpack("<qqqqq", self._fh.read(40))
+        self.source: Tuple[int, int] = tuple(source)
+        self._map()
+
+    @classmethod
+    def from_npy(cls, npy_path: str, path: str) -> "VectorStore":
+        """把旧的 .npy 整体矩阵迁移成可追加的向量文件"""
+        vecs = np.load(npy_path, mmap_mode='r')
+        store = cls(path, dim=vecs.shape[1], initial_capacity=max(1024, vecs.shape[0] * 2))
+        store.append(vecs)
+        store.set_source(_file_signature(npy_path))
+        return store
+
+    def _pack_header(self, count: int, dim: int, capacity: int, source: Tuple[int, int]) -> bytes:
+        header = self.MAGIC + struct.pack("<qqqqq", count, dim, capacity, *source)
+        return header.ljust(self.HEADER_SIZE, b"\0")
+
+    def _write_header(self):
+        self._fh.seek(0)
+        self._fh.write(self._pack_header(self.count, self.dim, self.capacity, self.source))
+        self._fh.flush()
+
+    def set_source(self, source: Tuple[int, int]):
+        """记录当前内容对应的 .npy 签名"""
+        self.source = tuple(source)
+        self._write_header()
+
+    def _map(self):
+        self._mm = np.memmap(self.path, dtype=np.float32, mode='r+', offset=self.HEADER_SIZE,
+                             shape=(self.capacity, self.dim))
+
+    def _grow(self, needed: int):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self._mm.flush()
+        # 已经交给读取方的视图仍引用旧的映射，文件只增不减，所以旧视图继续有效
+        self._fh.truncate(self.HEADER_SIZE + capacity * self.dim * 4)
+        self.capacity = capacity
+        self._write_header()
+        self._map()
+
+    def vectors(self) -> np.ndarray:
+        """当前全部向量的零拷贝视图"""
+        return self._mm[:self.count]
+
+    def append(self, vecs: np.ndarray) -> range:
+        """追加向量，返回新行的 id 区间"""
+        vecs = np.asarray(vecs, dtype=np.float32)
+        if vecs.ndim != 2 or vecs.shape[1] != self.dim:
+            raise ValueError(f"向量维度 {vecs.shape} 与存储维度 {self.dim} 不一致")
+        start = self.count
+        end = start + vecs.shape[0]
+        if end > self.capacity:
+            self._grow(end)
+        self._mm[start:end] = vecs
+        self._mm.flush()
+        self.count = end
+        self._write_header()
+        return range(start, end)
+
+    def truncate(self, count: int):
+        """丢弃 count 之后的行（用于与 meta 对齐）"""
+        if count < self.count:
+            self.count = count
+            self._write_header()
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self._mm.flush()
+        self._fh.close()
+
+
+def vector_file_path(vec_path: str, suffix: str = ".mmap") -> str:
+    return os.path.splitext(vec_path)[0] + suffix
+
+
+# (条数上限, 索引类型)：条数不超过上限时使用该类型，最后一档没有上限
+INDEX_TIERS = [
+    (20000, "flat"),
+    (200000, "ivf_flat"),
+    (2000000, "hnsw"),
+    (None, "ivf_pq"),
+]
+
+
+def choose_index_kind(n: int) -> str:
+    for limit, kind in INDEX_TIERS:
+        if limit is None or n <= limit:
+            return kind
+    return INDEX_TIERS[-1][1]
+
+
+def ivf_nlist(n: int) -> int:
+    """IVF 聚类数取 4 * sqrt(n)，并保证每个聚类至少有 39 条训练样本"""
+    return max(1, min(int(4 * math.sqrt(max(n, 1))), n // 39 or 1))
+
+
+def index_factory_string(kind: str, n: int, dim: int) -> str:
+    if kind == "flat":
+        return "Flat"
+    if kind == "hnsw":
+        return "HNSW32,Flat"
+    if kind == "ivf_flat":
+        return f"IVF{ivf_nlist(n)},Flat"
+    if kind == "ivf_pq":
+        m = next((m for m in (64, 32, 16, 8, 4, 2, 1) if dim % m == 0), 1)
+        return f"IVF{ivf_nlist(n)},PQ{m}"
+    raise ValueError(f"未知的索引类型 {kind}")
+
+
+def index_kind(index) -> str:
+    import faiss
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def tune_index(index, nprobe: int = 16, ef_search: int = 64):
+    """设置查询时参数：IVF 的 nprobe，HNSW 的 efSearch"""
+    import faiss
+    kind = index_kind(index)
+    if kind in ("ivf_flat", "ivf_pq"):
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    elif kind == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = ef_search
+
+
+def build_index(vecs: np.ndarray, kind: str, train_size: int = 100000, seed: int = 0):
+    """按 kind 新建内积索引；IVF 类先在最多 train_size 条抽样上训练，再分块加入全部向量"""
+    import faiss
+    n, dim = vecs.shape
+    index = faiss.index_factory(dim, index_factory_string(kind, n, dim), faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n, size=min(n, train_size), replace=False))
+        index.train(np.ascontiguousarray(vecs[sample], dtype=np.float32))
+    for start in range(0, n, 65536):
+        index.add(np.ascontiguousarray(vecs[start:start + 65536], dtype=np.float32))
+    return index
+
+
+def exact_top_k(vecs: np.ndarray, q_vecs: np.ndarray, k: int, chunk: int = 65536) -> np.ndarray:
+    """分块精确内积检索，返回每个查询的 top-k 下标"""
+    q_vecs = np.asarray(q_vecs, dtype=np.float32)
+    best_scores = np.full((q_vecs.shape[0], 0), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((q_vecs.shape[0], 0), dtype=np.int64)
+    for start in range(0, vecs.shape[0], chunk):
+        scores = q_vecs @ np.asarray(vecs[start:start + chunk], dtype=np.float32).T
+        ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, ids], axis=1)
+        keep = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_ids = np.take_along_axis(ids, keep, axis=1)
+    return best_ids
+
+
+class HREStore:
+    """
+    index / meta / vecs 常驻内存，三者按位置一一对应。
+
+    - search(q_vecs, k): 直接在内存索引上检索
+    - add(new_metas, new_vecs): 同步追加到索引、meta 和向量
+    - update(exp_dict): 按 key 给已有条目追加经验
+    - vectors_for(hashes, texts, embed_fn): 按内容哈希取向量，缺失的片段嵌入一次后缓存
+    - recall_at_k(k): 当前索引相对精确检索的召回率
+    meta 改动以 O(1) 追加写入操作日志，向量只追加新行；索引标记为 dirty，
+    由后台线程每隔 persist_interval 秒写回磁盘。
+    index_type 为 "auto" 时按条数选择索引类型，也可以固定为 flat / ivf_flat / hnsw / ivf_pq。
+    """
+
+    def __init__(self, index_path: str, meta_path: str, vec_path: str, RQ: str = "RQ2",
+                 persist_interval: float = 5.0, compact_every: int = 1000,
+                 index_type: str = "auto", nprobe: int = 16, ef_search: int = 64):
+        import faiss
+        self._faiss = faiss
+        self.index_path = index_path
+        self.meta_path = meta_path
+        self.vec_path = vec_path
+        self.RQ = RQ
+        self.persist_interval = persist_interval
+        self.compact_every = compact_every
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self._rebuilding: Optional[threading.Thread] = None
+        self.log_path = meta_path + ".log"
+        self.state_path = meta_path + ".state"
+        self.lock = threading.RLock()
+
+        self.index = faiss.read_index(index_path)
+        self.metas = read_meta(meta_path)
+        mmap_path = vector_file_path(vec_path)
+        self.vector_store = None
+        if os.path.exists(mmap_path):
+            store = VectorStore(mmap_path)
+            source = _file_signature(vec_path)
+            # 旧版本迁移的文件没有源签名 (0, 0)，沿用它，close() 时写回 .npy 补上签名
+            if source is None or store.source in ((0, 0), source):
+                self.vector_store = store
+            else:
+                # .npy 在迁移之后被重新生成，旧的向量文件会和新的 meta / 索引错位
+                print(f"  [HREStore] {vec_path} 已变化，重新迁移向量文件")
+                store.close()
+                os.remove(mmap_path)
+        if self.vector_store is None:
+            self.vector_store = VectorStore.from_npy(vec_path, mmap_path)
+        self._npy_count = self.vector_store.count if self.vector_store.source != (0, 0) else -1
+
+        # 内容哈希 -> 位置列表（同一段代码可能出现多次），以及内容哈希 -> 向量行号
+        self.key_to_pos: Dict[str, List[int]] = {}
+        self.hash_to_id: Dict[str, int] = {}
+        for pos, meta in enumerate(self.metas[:self.vecs.shape[0]]):
+            self._index_meta(pos, meta)
+
+        self._seq = self._read_state()
+        self._snapshot_seq = self._seq
+        self._log_ops = self._replay_log()
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+        self._dirty = set()
+        self._reconcile()
+        self._open_snippets()
+
+        if len(self.metas) != self.vecs.shape[0]:
+            raise ValueError(
+                f"meta 数量 {len(self.metas)} 与 vec 数量{self.vecs.shape[0]}不一致"
+            )
+        if self.index.ntotal != len(self.metas):
+            raise ValueError(
+                f"faiss index 数量 {self.index.ntotal} 与 meta 数量 {len(self.metas)} 不一致"
+            )
+
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._persist_loop, name="hre-store-writer", daemon=True)
+        self._writer.start()
+        tune_index(self.index, self.nprobe, self.ef_search)
+        self._maybe_rebuild()
+
+    @property
+    def vecs(self) -> np.ndarray:
+        return self.vector_store.vectors()
+
+    def _reconcile(self):
+        """
+        以向量条数为共享序号对齐三份数据：add 时先写向量、再写索引和 meta 日志，
+        中断后多出来的向量行被丢弃，索引缺失（异步落盘尚未完成）的部分从向量补齐。
+        """
+        n_meta = len(self.metas)
+        if self.vector_store.count > n_meta:
+            print(f"  [HREStore] 丢弃 {self.vector_store.count - n_meta} 条没有 meta 的向量")
+            self.vector_store.truncate(n_meta)
+        if self.index.ntotal > self.vector_store.count:
+            self.index.reset()
+        if self.index.ntotal < self.vector_store.count:
+            self.index.add(np.ascontiguousarray(self.vecs[self.index.ntotal:]))
+            self._dirty.add("index")
+
+    def _index_meta(self, pos: int, meta: dict):
+        key = patch_key(meta, self.RQ)
+        if key:
+            key_hash = content_hash(key)
+            self.key_to_pos.setdefault(key_hash, []).append(pos)
+            self.hash_to_id.setdefault(key_hash, pos)
+
+    # =========================
+    # 片段向量缓存
+    # =========================
+    def _open_snippets(self):
+        """片段向量和它们的哈希分别追加写入 .snip.mmap / .snip.keys，加载时按较短的一方对齐"""
+        self.snip_path = vector_file_path(self.vec_path, ".snip.mmap")
+        self.snip_keys_path = vector_file_path(self.vec_path, ".snip.keys")
+        self.snippet_store: Optional[VectorStore] = None
+        self.snippet_ids: Dict[str, int] = {}
+        keys: List[str] = []
+        if os.path.exists(self.snip_path):
+            self.snippet_store = VectorStore(self.snip_path)
+            if os.path.exists(self.snip_keys_path):
+                with open(self.snip_keys_path, 'r', encoding='utf-8') as f:
+                    keys = [line.strip() for line in f if line.strip()]
+            if len(keys) > self.snippet_store.count:
+                keys = keys[:self.snippet_store.count]
+                _atomic_write(self.snip_keys_path, lambda f: f.write("".join(k + '\n' for k in keys).encode("utf-8")))
+            self.snippet_store.truncate(len(keys))
+        for i, key in enumerate(keys):
+            self.snippet_ids.setdefault(key, i)
+        self._snip_keys = open(self.snip_keys_path, 'a', encoding='utf-8')
+
+    def _vector(self, key_hash: str) -> Optional[np.ndarray]:
+        vec_id = self.hash_to_id.get(key_hash)
+        if vec_id is not None:
+            return self.vecs[vec_id]
+        snip_id = self.snippet_ids.get(key_hash)
+        if snip_id is not None:
+            return self.snippet_store.vectors()[snip_id]
+        return None
+
+    def vectors_for(self, hashes: List[str], texts: Optional[List[str]] = None,
+                    embed_fn=None) -> List[Optional[np.ndarray]]:
+        """
+        按内容哈希取向量（mmap 的零拷贝行）。给出 texts 和 embed_fn 时，
+        没有存储向量的片段批量嵌入一次并写入片段缓存，否则对应位置返回 None。
+        """
+        with self.lock:
+            vecs = [self._vector(h) if h else None for h in hashes]
+            if embed_fn is None or texts is None:
+                return vecs
+            missing: Dict[str, str] = {}
+            for h, text, vec in zip(hashes, texts, vecs):
+                if vec is None and h and text:
+                    missing.setdefault(h, text)
+        if not missing:
+            return vecs
+        new_vecs = np.asarray(embed_fn(list(missing.values())), dtype=np.float32)
+        with self.lock:
+            fresh = [(h, v) for h, v in zip(missing, new_vecs) if self._vector(h) is None]
+            if fresh:
+                if self.snippet_store is None:
+                    self.snippet_store = VectorStore(self.snip_path, dim=self.vector_store.dim)
+                ids = self.snippet_store.append(np.stack([v for _, v in fresh]))
+                for (h, _), snip_id in zip(fresh, ids):
+                    self.snippet_ids[h] = snip_id
+                    self._snip_keys.write(h + '\n')
+                self._wake.set()
+            return [self._vector(h) if h else None for h in hashes]
+
+    # =========================
+    # 操作日志
+    # =========================
+    def _read_state(self) -> int:
+        """当前 meta 快照已包含的最后一个操作序号"""
+        if not os.path.exists(self.state_path):
+            return 0
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if "sha1" in state and _file_sha1(self.meta_path) != state["sha1"]:
+            # 写完 state、替换快照之前中断：磁盘上仍是上一次的快照
+            return int(state.get("prev_seq", 0))
+        return int(state.get("seq", 0))
+
+    def _replay_log(self) -> int:
+        """在 meta 快照上重放快照之后的操作，返回日志中待压缩的操作数"""
+        if not os.path.exists(self.log_path):
+            return 0
+        snapshot_seq = self._seq
+        pending = 0
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except Exception:
+                    # 进程中断时最后一行可能没写完
+                    continue
+                seq = op.get("seq", 0)
+                self._seq = max(self._seq, seq)
+                if seq <= snapshot_seq:
+                    continue
+                pending += 1
+                if op.get("op") == "add":
+                    if op["pos"] == len(self.metas):
+                        self.metas.append(op["meta"])
+                        self._index_meta(op["pos"], op["meta"])
+                elif op.get("op") == "exp":
+                    self._apply_experience(op["key"], op["entry"])
+        return pending
+
+    def _append_log(self, op: dict):
+        self._seq += 1
+        op["seq"] = self._seq
+        self._log.write(json.dumps(op, ensure_ascii=False) + '\n')
+        self._log_ops += 1
+
+    def _apply_experience(self, key: str, entry: dict) -> int:
+        positions = self.key_to_pos.get(content_hash(key), [])
+        for pos in positions:
+            meta_data_org = self.metas[pos].get("original_item")
+            meta_data_org.setdefault("experiences", []).append({
+                "experience": entry["experience"],
+                "trigger_snippet": list(entry["trigger_snippet"]),
+                "trigger_hashes": [h for _, h in trigger_refs(entry)]
+            })
+        return len(positions)
+
+    def __len__(self):
+        return len(self.metas)
+
+    def contains(self, key: str) -> bool:
+        return content_hash(key) in self.key_to_pos
+
+    def search(self, q_vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self.lock:
+            return self.index.search(np.ascontiguousarray(q_vecs, dtype=np.float32), k)
+
+    # =========================
+    # 索引类型选择与后台重建
+    # =========================
+    def _target_kind(self, n: int) -> str:
+        return choose_index_kind(n) if self.index_type == "auto" else self.index_type
+
+    def _needs_rebuild(self) -> bool:
+        n = self.index.ntotal
+        kind = index_kind(self.index)
+        if kind != self._target_kind(n):
+            return True
+        if kind in ("ivf_flat", "ivf_pq"):
+            # 条数增长后聚类过少，每个聚类过大，需要重新训练
+            return ivf_nlist(n) >= 2 * self._faiss.extract_index_ivf(self.index).nlist
+        return False
+
+    def _maybe_rebuild(self):
+        with self.lock:
+            if self._closed or (self._rebuilding is not None and self._rebuilding.is_alive()):
+                return
+            if not self._needs_rebuild():
+                return
+            self._rebuilding = threading.Thread(target=self._rebuild, name="hre-store-reindex", daemon=True)
+            self._rebuilding.start()
+
+    def _rebuild(self):
+        """在向量文件的快照上构建新索引，补上构建期间新增的行后原子替换"""
+        with self.lock:
+            n = self.vector_store.count
+            vecs = self.vecs
+            kind = self._target_kind(n)
+        start = time.time()
+        try:
+            index = build_index(vecs, kind)
+            tune_index(index, self.nprobe, self.ef_search)
+            with self.lock:
+                if self.vector_store.count > n:
+                    index.add(np.ascontiguousarray(self.vecs[n:]))
+                old_kind = index_kind(self.index)
+                self.index = index
+                self._mark_dirty("index")
+        except Exception as e:
+            print(f"  [HREStore] 索引重建失败: {e}")
+            return
+        print(f"  [HREStore] 索引 {old_kind} -> {kind}（{n} 条），重建用时 {time.time() - start:.2f}s，"
+              f"{self.recall_at_k()}")
+
+    def recall_at_k(self, k: int = 25, n_queries: int = 200, seed: int = 0) -> dict:
+        """抽取库中向量作为查询，比较当前索引与精确内积检索的 top-k 重合率和平均检索耗时"""
+        with self.lock:
+            vecs = self.vecs
+            kind = index_kind(self.index)
+        n = vecs.shape[0]
+        k = min(k, n)
+        if not k:
+            return {"index": kind, f"recall@{k}": 1.0, "search_ms": 0.0}
+        rng = np.random.default_rng(seed)
+        q_vecs = np.asarray(vecs[np.sort(rng.choice(n, size=min(n, n_queries), replace=False))], dtype=np.float32)
+        start = time.time()
+        _, I = self.search(q_vecs, k)
+        search_ms = (time.time() - start) * 1000 / q_vecs.shape[0]
+        exact = exact_top_k(vecs, q_vecs, k)
+        recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(I, exact)]))
+        return {"index": kind, f"recall@{k}": recall, "search_ms": search_ms}
+
+    def add(self, new_metas: List[dict], new_vecs: np.ndarray) -> int:
+        if not new_metas:
+            return 0
+        new_vecs = np.ascontiguousarray(new_vecs, dtype=np.float32)
+        if new_vecs.shape[0] != len(new_metas):
+            raise ValueError(f"新增 meta 数量 {len(new_metas)} 与向量数量 {new_vecs.shape[0]} 不一致")
+        with self.lock:
+            old_total = self.index.ntotal
+            ids = self.vector_store.append(new_vecs)
+            if ids.start != old_total:
+                raise ValueError(f"向量序号 {ids.start} 与 faiss 数量 {old_total} 不一致")
+            self.index.add(new_vecs)
+            for offset, meta in enumerate(new_metas):
+                for exp in meta.get("experiences") or []:
+                    exp.setdefault("trigger_hashes", [h for _, h in trigger_refs(exp)])
+                self.metas.append(meta)
+                self._index_meta(old_total + offset, meta)
+                self._append_log({"op": "add", "pos": old_total + offset, "meta": meta})
+            # 基本一致性校验
+            if self.vecs.shape[0] != self.index.ntotal:
+                raise ValueError(f"vecs 数量 {self.vecs.shape[0]} 与 faiss 数量 {self.index.ntotal} 不一致")
+            if old_total + len(new_metas) != self.index.ntotal:
+                raise ValueError("faiss 增量数量异常")
+            self._mark_dirty("index")
+        self._maybe_rebuild()
+        return len(new_metas)
+
+    def update(self, exp_dict: Dict[str, dict]) -> int:
+        """
+        exp_dict: key(before_code) -> {"experience", "trigger_snippet", "old_trigger_snippets"}
+        给每个匹配的 meta 条目追加一条经验，返回更新条数；不会新增条目，索引和向量不变。
+        """
+        updated_count = 0
+        with self.lock:
+            for key, exp in exp_dict.items():
+                if not exp:
+                    continue
+                old_trigger_snippets = exp.get("old_trigger_snippets", [])
+                if not isinstance(old_trigger_snippets, list):
+                    old_trigger_snippets = [old_trigger_snippets]
+                entry = {
+                    "experience": exp['experience'],
+                    "trigger_snippet": old_trigger_snippets + [exp['trigger_snippet']]
+                }
+                count = self._apply_experience(key, entry)
+                if count:
+                    self._append_log({"op": "exp", "key": key, "entry": entry})
+                    updated_count += count
+            if updated_count:
+                self._wake.set()
+        return updated_count
+
+    # =========================
+    # 持久化
+    # =========================
+    def _mark_dirty(self, *parts):
+        self._dirty.update(parts)
+        self._wake.set()
+
+    def _persist_loop(self):
+        while not self._closed:
+            self._wake.wait(self.persist_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"  [HREStore] 异步落盘失败: {e}")
+
+    def flush(self):
+        """把 dirty 的索引写回磁盘（临时文件 + 原子替换），日志过长时压缩"""
+        with self.lock:
+            dirty, self._dirty = self._dirty, set()
+            index_bytes = self._faiss.serialize_index(self.index) if "index" in dirty else None
+        if index_bytes is not None:
+            _atomic_write(self.index_path, lambda f: f.write(index_bytes.tobytes()))
+        with self.lock:
+            self.vector_store.flush()
+            if self.snippet_store is not None:
+                self.snippet_store.flush()
+            self._snip_keys.flush()
+            self._log.flush()
+            if self._log_ops >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """把当前的 meta 视图写成新快照，记录序号后清空操作日志"""
+        with self.lock:
+            self._log.flush()
+            data = "".join(json.dumps(meta, ensure_ascii=False) + '\n' for meta in self.metas).encode("utf-8")
+            state = {"seq": self._seq, "sha1": hashlib.sha1(data).hexdigest(), "prev_seq": self._snapshot_seq}
+            # 先写 state 再替换快照，任一步中断后 _read_state 都能判断快照包含到哪个序号
+            _atomic_write(self.state_path, lambda f: f.write(json.dumps(state).encode("utf-8")))
+            _atomic_write(self.meta_path, lambda f: f.write(data))
+            self._snapshot_seq = self._seq
+            self._log.close()
+            self._log = open(self.log_path, 'w', encoding='utf-8')
+            self._log_ops = 0
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer.join()
+        if self._rebuilding is not None:
+            self._rebuilding.join()
+        self.flush()
+        with self.lock:
+            if self._log_ops:
+                self.compact()
+            self._log.close()
+            if self.vector_store.count != self._npy_count:
+                # 向量有增减时写回 .npy，并更新头中的签名，下次打开不会误判为 .npy 被重新生成
+                _atomic_write(self.vec_path, lambda f: np.save(f, np.asarray(self.vecs)))
+                self.vector_store.set_source(_file_signature(self.vec_path))
+            self.vector_store.close()
+            self._snip_keys.close()
+            if self.snippet_store is not None:
+                self.snippet_store.close()
+
+
+_STORES: Dict[Tuple[str, str, str, str], HREStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def open_store(index_path: str, meta_path: str, vec_path: str, RQ: str = "RQ2", **kwargs: Any) -> HREStore:
+    """同一组文件在进程内只加载一次，之后返回常驻的 HREStore"""
+    key = (index_path, meta_path, vec_path, RQ)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = HREStore(index_path, meta_path, vec_path, RQ, **kwargs)
+        return store
+
+
+def close_stores():
+    """刷盘并关闭所有已打开的 HREStore（例如切换仓库或进程退出时）"""
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+        _STORES.clear()
+    for store in stores:
+        store.close()
+
+
+atexit.register(close_stores)
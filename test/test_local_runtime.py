@@ -0,0 +1,52 @@
+from utils.agents.openharmony.local_backends import MockBackend
+from utils.agents.openharmony.local_runtime import LocalModelRegistry, LocalModelSpec
+
+
+def test_truncate_keeps_marker_within_budget():
+    backend = MockBackend()
+    prompt = " ".join(f"w{i}" for i in range(500))
+    for budget in (1, 2, 3, 4, 5, 32, 48):
+        assert backend.count_tokens(backend.truncate(prompt, budget)) <= budget
+
+
+def test_over_budget_prompt_is_truncated_and_admitted():
+    registry = LocalModelRegistry()
+    registry.register("task", LocalModelSpec(name="m", device="cpu", max_context=64, max_new_tokens=16, backend="mock"))
+    try:
+        results = registry.infer("task", [" ".join(f"w{i}" for i in range(500))], run_id="run")
+        entry = registry.invocations_for("run")[-1]
+        assert entry["truncated"] == 1
+        assert entry["rejected"] == 0
+        assert results[0].text
+    finally:
+        registry.close()
+
+
+def test_released_run_drops_its_invocations():
+    registry = LocalModelRegistry()
+    try:
+        registry.record("task", 1, {"run_id": "a"})
+        registry.record("task", 2, {"run_id": "b"})
+        assert [entry["payload_size"] for entry in registry.release("a")] == [1]
+        assert registry.invocations_for("a") == []
+        assert [entry["run_id"] for entry in registry.invocations] == ["b"]
+    finally:
+        registry.close()
+
+
+def test_run_many_records_failed_pr_and_continues():
+    from types import SimpleNamespace
+
+    from utils.agents.openharmony.base import AgentBlackboard
+    from utils.agents.openharmony.batch import run_many
+
+    def run_fn(pr_sample, **kwargs):
+        if pr_sample.pr_number == 2:
+            raise ValueError("boom")
+        return {"ok": True}
+
+    samples = [SimpleNamespace(repo="r", pr_number=n) for n in range(4)]
+    for ordered in (True, False):
+        results = list(run_many(run_fn, AgentBlackboard(), samples, concurrency=2, ordered=ordered))
+        assert sorted(result["pr_number"] for result in results) == [0, 1, 2, 3]
+        assert [result["error"] for result in results if "error" in result] == ["boom"]
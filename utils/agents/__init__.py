@@ -2,11 +2,15 @@
 from .openharmony import (
     AgentArtifact,
     AgentBlackboard,
+    AsyncCloudLLMClient,
     BaseAgent,
     CloudLLMClient,
     CloudOpenHarmonyPipeline,
     ContextAgent,
+    DeviceScheduler,
+    DeviceSpec,
     FixGeneratorAgent,
+    InferenceBackend,
     LineLocatorAgent,
     LocalModelRegistry,
     LocalModelSpec,
@@ -15,7 +19,10 @@ from .openharmony import (
     OpenHarmonyReviewOrchestrator,
     ProjectContextAgent,
     ReflectorAgent,
+    ResponseCache,
+    RetryPolicy,
     ReviewCommentAgent,
+    register_backend,
 )
 
 __all__ = [
@@ -31,8 +38,15 @@ __all__ = [
     "ProjectContextAgent",
     "OpenHarmonyReviewOrchestrator",
     "CloudLLMClient",
+    "AsyncCloudLLMClient",
+    "RetryPolicy",
+    "ResponseCache",
     "CloudOpenHarmonyPipeline",
     "LocalModelSpec",
     "LocalModelRegistry",
     "LocalOpenHarmonyPipeline",
+    "InferenceBackend",
+    "register_backend",
+    "DeviceScheduler",
+    "DeviceSpec",
 ]
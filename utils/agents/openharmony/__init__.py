@@ -1,5 +1,5 @@
 """OpenHarmony multi-agent implementations."""
-from .base import AgentArtifact, AgentBlackboard, BaseAgent
+from .base import AgentArtifact, AgentBlackboard, BaseAgent, LazyPayload, materialize
 from .context_agent import ContextAgent
 from .fix_generator_agent import FixGeneratorAgent
 from .line_locator_agent import LineLocatorAgent
@@ -8,13 +8,19 @@ from .project_context_agent import ProjectContextAgent
 from .reflector_agent import ReflectorAgent
 from .review_comment_agent import ReviewCommentAgent
 from .orchestrator import OpenHarmonyReviewOrchestrator
-from .cloud_runtime import CloudLLMClient, CloudOpenHarmonyPipeline
+from .cloud_runtime import AsyncCloudLLMClient, CloudLLMClient, CloudOpenHarmonyPipeline, RetryPolicy
+from .response_cache import ResponseCache
+from .context_packer import ContextPacker, ContextSource
+from .device_scheduler import DeviceScheduler, DeviceSpec
+from .local_backends import InferenceBackend, register_backend
 from .local_runtime import LocalModelRegistry, LocalModelSpec, LocalOpenHarmonyPipeline
 
 __all__ = [
     "AgentArtifact",
     "AgentBlackboard",
     "BaseAgent",
+    "LazyPayload",
+    "materialize",
     "ProjectContextAgent",
     "ContextAgent",
     "NeedReviewAgent",
@@ -24,8 +30,17 @@ __all__ = [
     "ReflectorAgent",
     "OpenHarmonyReviewOrchestrator",
     "CloudLLMClient",
+    "AsyncCloudLLMClient",
+    "RetryPolicy",
+    "ResponseCache",
+    "ContextPacker",
+    "ContextSource",
     "CloudOpenHarmonyPipeline",
     "LocalModelSpec",
     "LocalModelRegistry",
     "LocalOpenHarmonyPipeline",
+    "InferenceBackend",
+    "register_backend",
+    "DeviceScheduler",
+    "DeviceSpec",
 ]
@@ -1,9 +1,68 @@
 """Base classes shared across OpenHarmony review agents."""
 from __future__ import annotations
 
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+
+DEFAULT_NAMESPACE = "default"
+
+
+class LazyPayload(Mapping[str, Any]):
+    """Artifact payload built by ``loader`` on first access.
+
+    Agents publish references (e.g. to the ``PRReviewSample``) instead of
+    serialized copies; the dict is only built when a key is read or the
+    artifact is serialized, and then cached.
+    """
+
+    def __init__(self, loader: Callable[[], Dict[str, Any]]) -> None:
+        self._loader: Optional[Callable[[], Dict[str, Any]]] = loader
+        self._data: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def materialized(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self._data
+        if data is None:
+            with self._lock:
+                if self._data is None:
+                    assert self._loader is not None
+                    self._data = self._loader()
+                    self._loader = None
+                data = self._data
+        return data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.to_dict()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __repr__(self) -> str:
+        return f"LazyPayload({self._data!r})" if self.materialized else "LazyPayload(<deferred>)"
+
+
+def materialize(value: Any) -> Any:
+    """Recursively replace :class:`LazyPayload` values with plain dicts, e.g. before ``json.dumps``."""
+
+    if isinstance(value, LazyPayload):
+        value = value.to_dict()
+    if isinstance(value, dict):
+        return {key: materialize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [materialize(item) for item in value]
+    return value
 
 
 @dataclass
@@ -11,24 +70,83 @@ class AgentArtifact:
     """Container for agent outputs stored on the blackboard."""
 
     name: str
-    payload: Dict[str, Any]
+    payload: Mapping[str, Any]
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    def view(self) -> Mapping[str, Any]:
+        """Read-only view of ``payload`` without copying it."""
 
-class AgentBlackboard:
-    """Simple in-memory blackboard for coordinating agents."""
+        if isinstance(self.payload, LazyPayload):
+            return self.payload
+        return MappingProxyType(self.payload)
 
-    def __init__(self) -> None:
-        self._store: Dict[str, AgentArtifact] = {}
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-dict form of ``payload`` with every lazy part materialized."""
 
-    def push(self, key: str, artifact: AgentArtifact) -> None:
-        self._store[key] = artifact
+        return materialize(self.payload)
 
-    def pull(self, key: str) -> Optional[AgentArtifact]:
-        return self._store.get(key)
 
-    def as_dict(self) -> Dict[str, AgentArtifact]:
-        return dict(self._store)
+class AgentBlackboard:
+    """In-memory blackboard for coordinating agents.
+
+    Artifacts live in per-run namespaces. The active namespace is carried by a
+    context variable, so agents keep calling ``push``/``pull`` with plain keys
+    while concurrent runs (threads or asyncio tasks) each see only their own
+    artifacts. Code outside any :meth:`namespace` block uses ``"default"``.
+    """
+
+    def __init__(self) -> None:
+        self._namespaces: Dict[str, Dict[str, AgentArtifact]] = {DEFAULT_NAMESPACE: {}}
+        self._lock = threading.RLock()
+        self._current: ContextVar[str] = ContextVar(f"blackboard_namespace_{id(self)}", default=DEFAULT_NAMESPACE)
+
+    @property
+    def current_namespace(self) -> str:
+        return self._current.get()
+
+    @contextmanager
+    def namespace(self, run_id: Any) -> Iterator[str]:
+        """Route ``push``/``pull`` in the enclosed block to the namespace ``run_id``."""
+
+        name = str(run_id)
+        with self._lock:
+            self._namespaces.setdefault(name, {})
+        token = self._current.set(name)
+        try:
+            yield name
+        finally:
+            self._current.reset(token)
+
+    def push(self, key: str, artifact: AgentArtifact, *, namespace: Optional[str] = None) -> None:
+        name = namespace or self._current.get()
+        with self._lock:
+            self._namespaces.setdefault(name, {})[key] = artifact
+
+    def pull(self, key: str, *, namespace: Optional[str] = None) -> Optional[AgentArtifact]:
+        name = namespace or self._current.get()
+        with self._lock:
+            return self._namespaces.get(name, {}).get(key)
+
+    def as_dict(self, *, namespace: Optional[str] = None) -> Mapping[str, AgentArtifact]:
+        """Read-only live view of one namespace; nothing is copied."""
+
+        name = namespace or self._current.get()
+        with self._lock:
+            store = self._namespaces.setdefault(name, {})
+        return MappingProxyType(store)
+
+    def namespaces(self) -> List[str]:
+        with self._lock:
+            return list(self._namespaces)
+
+    def release(self, namespace: str) -> None:
+        """Drop all artifacts of a finished run."""
+
+        with self._lock:
+            if namespace == DEFAULT_NAMESPACE:
+                self._namespaces[DEFAULT_NAMESPACE] = {}
+            else:
+                self._namespaces.pop(namespace, None)
 
 
 class BaseAgent:
@@ -51,5 +169,12 @@ class BaseAgent:
             except Exception:
                 self.rules_cache = {}
 
+    def publish(self, payload: Mapping[str, Any]) -> AgentArtifact:
+        """Wrap ``payload`` into an artifact and push it under this agent's name."""
+
+        artifact = AgentArtifact(name=self.name, payload=payload)
+        self.blackboard.push(self.name, artifact)
+        return artifact
+
     def run(self, *args: Any, **kwargs: Any) -> AgentArtifact:
         raise NotImplementedError
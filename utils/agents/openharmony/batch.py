@@ -0,0 +1,114 @@
+"""Bounded-concurrency batch execution over a stream of PR samples."""
+from __future__ import annotations
+
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set
+
+from data.pr_data.processing.outputs import QuestionOutputPaths
+from data.pr_data.processing.structures import PRReviewSample
+
+from .base import AgentBlackboard
+
+LOGGER = logging.getLogger(__name__)
+
+RunFn = Callable[..., Dict[str, Any]]
+
+ON_ERROR_POLICIES = ("record", "raise")
+
+QUESTION_RESULT_FIELDS = {
+    1: ("need_review", "decisions"),
+    2: ("review_comments", "comments"),
+    3: ("issues", "issues"),
+    4: ("fixes", "fixes"),
+}
+
+
+def save_question_outputs(output_paths: QuestionOutputPaths, result: Dict[str, Any]) -> None:
+    """Append the records of one pipeline result to the four question output files."""
+
+    for question_id, (section, records_key) in QUESTION_RESULT_FIELDS.items():
+        records = (result.get(section) or {}).get(records_key) or []
+        if records:
+            output_paths.save_outputs(question_id, records)
+
+
+def run_many(
+    run_fn: RunFn,
+    blackboard: AgentBlackboard,
+    samples: Iterable[PRReviewSample],
+    *,
+    concurrency: int = 4,
+    ordered: bool = True,
+    enable_fix_generation: bool = True,
+    output_paths: Optional[QuestionOutputPaths] = None,
+    on_error: str = "record",
+) -> Iterator[Dict[str, Any]]:
+    """Run ``run_fn`` over ``samples`` with at most ``concurrency`` PRs in flight.
+
+    ``samples`` is consumed lazily, each PR gets its own blackboard namespace
+    that is released once its result is produced, and results are yielded in
+    input order (``ordered=True``) or as they complete. When ``output_paths``
+    is given every result is appended to the question files as it is yielded,
+    so memory stays bounded by ``concurrency`` regardless of dataset size.
+
+    With ``on_error="record"`` a PR that raises yields
+    ``{"repo", "pr_number", "error"}`` and the batch continues; with
+    ``"raise"`` the exception propagates once the results finished before it
+    have been yielded.
+    """
+
+    if on_error not in ON_ERROR_POLICIES:
+        raise ValueError(f"on_error must be one of {ON_ERROR_POLICIES}, got {on_error!r}")
+    concurrency = max(1, concurrency)
+
+    def _run_one(seq: int, pr_sample: PRReviewSample) -> Dict[str, Any]:
+        run_id = f"{pr_sample.repo}#{pr_sample.pr_number}#{seq}"
+        try:
+            result = run_fn(pr_sample, enable_fix_generation=enable_fix_generation, run_id=run_id)
+        except Exception as exc:
+            if on_error == "raise":
+                raise
+            LOGGER.warning("Review of %s#%s failed: %s", pr_sample.repo, pr_sample.pr_number, exc)
+            result = {"error": str(exc)}
+        finally:
+            blackboard.release(run_id)
+        result.setdefault("repo", pr_sample.repo)
+        result.setdefault("pr_number", pr_sample.pr_number)
+        return result
+
+    def _emit(future: Future) -> Dict[str, Any]:
+        result = future.result()
+        if output_paths is not None:
+            save_question_outputs(output_paths, result)
+        return result
+
+    def _emit_done(done: Set[Future]) -> Iterator[Dict[str, Any]]:
+        # Yield every finished result before re-raising, so completed PRs are not lost.
+        failed: List[Future] = [future for future in done if future.exception() is not None]
+        for future in done:
+            if future.exception() is None:
+                yield _emit(future)
+        if failed:
+            failed[0].result()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if ordered:
+            queue: Deque[Future] = deque()
+            for seq, pr_sample in enumerate(samples):
+                queue.append(executor.submit(_run_one, seq, pr_sample))
+                if len(queue) >= concurrency:
+                    yield _emit(queue.popleft())
+            while queue:
+                yield _emit(queue.popleft())
+        else:
+            pending: Set[Future] = set()
+            for seq, pr_sample in enumerate(samples):
+                pending.add(executor.submit(_run_one, seq, pr_sample))
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from _emit_done(done)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _emit_done(done)
@@ -0,0 +1,197 @@
+"""Throughput / tail-latency benchmark of the cloud pipeline against :class:`MockLLMServer`.
+
+Example::
+
+    python -m utils.agents.openharmony.benchmark --prs 40 --hunks 8 \
+        --concurrency 1 4 16 --latency-ms 150 --client async --batch-size 16
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from data.pr_data.processing.diff_parser import DiffParser
+from data.pr_data.processing.structures import DiffFile, PRReviewSample
+
+from .base import AgentBlackboard
+from .batch import run_many
+from .cloud_runtime import AsyncCloudLLMClient, CloudLLMClient, CloudOpenHarmonyPipeline, RetryPolicy
+from .mock_server import MockLLMServer, MockServerConfig, percentile
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements for one concurrency setting."""
+
+    concurrency: int
+    prs: int
+    wall_seconds: float
+    prs_per_second: float
+    pr_latency_p50: float
+    pr_latency_p95: float
+    pr_latency_p99: float
+    cloud_share: float
+    server: Dict[str, Any] = field(default_factory=dict)
+
+
+def synthetic_samples(count: int, *, hunks: int = 6, files: int = 2, seed: int = 0) -> List[PRReviewSample]:
+    """Build ``count`` PRs with ``files`` x ``hunks`` hunks of long added lines."""
+
+    rng = random.Random(seed)
+    samples: List[PRReviewSample] = []
+    for pr_number in range(count):
+        diff_files: List[DiffFile] = []
+        for file_index in range(files):
+            patch_parts = []
+            for hunk_index in range(hunks):
+                start = 1 + hunk_index * 40
+                added = rng.randint(2, 8)
+                body = "\n".join("+" + "x" * rng.randint(40, 160) for _ in range(added))
+                patch_parts.append(f"@@ -{start},2 +{start},{added + 1} @@\n{body}\n ctx\n-old\n")
+            diff_files.append(
+                DiffFile(file_path=f"src/module_{file_index}.cpp", hunks=DiffParser.parse("".join(patch_parts)))
+            )
+        samples.append(
+            PRReviewSample(
+                repo="benchmark",
+                pr_number=pr_number,
+                metadata={"title": f"benchmark PR {pr_number}"},
+                diff_files=diff_files,
+            )
+        )
+    return samples
+
+
+def _cloud_share(result: Dict[str, Any]) -> List[bool]:
+    flags: List[bool] = []
+    for decision in result["need_review"].get("decisions", []):
+        flags.append(decision.get("source") == "cloud")
+    for comment in result["review_comments"].get("comments", []):
+        flags.append(comment["review_comment"].get("source") == "cloud")
+    for fix in result["fixes"].get("fixes", []):
+        flags.append(fix.get("source") == "cloud")
+    return flags
+
+
+def run_benchmark(
+    samples: Sequence[PRReviewSample],
+    client_factory: Callable[[], CloudLLMClient],
+    *,
+    concurrency_levels: Iterable[int] = (1, 4, 16),
+    server: Optional[MockLLMServer] = None,
+    hunk_workers: Optional[int] = None,
+    enable_fix_generation: bool = True,
+) -> List[BenchmarkResult]:
+    """Run the cloud pipeline over ``samples`` once per concurrency level.
+
+    A fresh client and pipeline are built per level so connection pools and
+    caches do not carry over between measurements.
+    """
+
+    results: List[BenchmarkResult] = []
+    for concurrency in concurrency_levels:
+        if server is not None:
+            server.reset_stats()
+        client = client_factory()
+        pipeline = CloudOpenHarmonyPipeline(llm_client=client, blackboard=AgentBlackboard(), hunk_workers=hunk_workers)
+        latencies: List[float] = []
+
+        def timed_run(pr_sample: PRReviewSample, **kwargs: Any) -> Dict[str, Any]:
+            started = time.perf_counter()
+            outcome = pipeline.run(pr_sample, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            return outcome
+
+        cloud_flags: List[bool] = []
+        started = time.perf_counter()
+        for outcome in run_many(
+            timed_run,
+            pipeline.blackboard,
+            samples,
+            concurrency=concurrency,
+            enable_fix_generation=enable_fix_generation,
+            on_error="raise",
+        ):
+            cloud_flags.extend(_cloud_share(outcome))
+        wall = time.perf_counter() - started
+        client.close()
+        latencies.sort()
+        results.append(
+            BenchmarkResult(
+                concurrency=concurrency,
+                prs=len(samples),
+                wall_seconds=wall,
+                prs_per_second=len(samples) / wall if wall else 0.0,
+                pr_latency_p50=percentile(latencies, 50),
+                pr_latency_p95=percentile(latencies, 95),
+                pr_latency_p99=percentile(latencies, 99),
+                cloud_share=sum(cloud_flags) / len(cloud_flags) if cloud_flags else 0.0,
+                server=server.stats() if server is not None else {},
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark CloudOpenHarmonyPipeline against a local mock LLM server.")
+    parser.add_argument("--prs", type=int, default=20, help="Number of synthetic PRs")
+    parser.add_argument("--hunks", type=int, default=6, help="Hunks per file")
+    parser.add_argument("--files", type=int, default=2, help="Files per PR")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="PR-level concurrency levels")
+    parser.add_argument("--hunk-workers", type=int, default=None, help="Enable the hunk-level scheduler")
+    parser.add_argument("--client", choices=["sync", "async"], default="async")
+    parser.add_argument("--max-in-flight", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=None, help="Pack prompts into batched requests")
+    parser.add_argument("--latency", choices=["constant", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--response-tokens", type=int, default=32)
+    parser.add_argument("--ms-per-token", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--no-fix", action="store_true", help="Skip 问题四 fix generation")
+    args = parser.parse_args()
+
+    config = MockServerConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        sigma=args.sigma,
+        response_tokens=args.response_tokens,
+        ms_per_token=args.ms_per_token,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    )
+    samples = synthetic_samples(args.prs, hunks=args.hunks, files=args.files)
+    with MockLLMServer(config) as server:
+        client_kwargs: Dict[str, Any] = {
+            "endpoint": server.url,
+            "model": "mock",
+            "batch_size": args.batch_size,
+            "retry": RetryPolicy(backoff_base=0.05),
+        }
+        if args.client == "async":
+            factory: Callable[[], CloudLLMClient] = lambda: AsyncCloudLLMClient(  # noqa: E731
+                max_in_flight=args.max_in_flight, **client_kwargs
+            )
+        else:
+            factory = lambda: CloudLLMClient(**client_kwargs)  # noqa: E731
+        results = run_benchmark(
+            samples,
+            factory,
+            concurrency_levels=args.concurrency,
+            server=server,
+            hunk_workers=args.hunk_workers,
+            enable_fix_generation=not args.no_fix,
+        )
+    for result in results:
+        print(json.dumps(asdict(result), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,46 @@
 """Cloud runtime pipeline for OpenHarmony review agents."""
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-from dataclasses import dataclass
+import random
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 try:  # pragma: no cover - optional dependency
     import requests
 except Exception:  # pragma: no cover - tolerate missing dependency
     requests = None  # type: ignore
 
-from data.pr_data.processing.structures import PRReviewSample
+try:  # pragma: no cover - optional dependency
+    import aiohttp
+except Exception:  # pragma: no cover - tolerate missing dependency
+    aiohttp = None  # type: ignore
+
+from data.pr_data.processing.outputs import QuestionOutputPaths
+from data.pr_data.processing.structures import DiffFile, DiffHunk, PRReviewSample
 
 from .base import AgentArtifact, AgentBlackboard
+from .batch import run_many
 from .fix_generator_agent import FixGeneratorAgent
 from .line_locator_agent import LineLocatorAgent
 from .need_review_agent import NeedReviewAgent
 from .orchestrator import OpenHarmonyReviewOrchestrator
 from .project_context_agent import ProjectContextAgent
 from .reflector_agent import ReflectorAgent
+from .response_cache import ResponseCache, cache_key
 from .review_comment_agent import ReviewCommentAgent
 from .context_agent import ContextAgent
+from .context_packer import PromptBudget, Tokenizer, hunk_sources
 
 LOGGER = logging.getLogger(__name__)
 
+CloudCall = Tuple[str, Dict[str, Any]]
+
 
 @dataclass
 class CloudCallResult:
@@ -33,10 +48,58 @@ class CloudCallResult:
 
     payload: Dict[str, Any]
     used_cloud: bool
+    source: str = "cloud"
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with jitter for throttled (429) and 5xx responses."""
+
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    retry_statuses: FrozenSet[int] = field(default_factory=lambda: frozenset({429, 500, 502, 503, 504}))
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status: int, retry_after: Optional[str] = None) -> None:
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _BudgetExhausted(Exception):
+    """Raised when the per-call time budget runs out before a successful attempt."""
 
 
 class CloudLLMClient:
-    """Minimal REST client wrapping云端 LLM 调用."""
+    """Minimal REST client wrapping云端 LLM 调用.
+
+    HTTP connections are reused through a per-thread ``requests.Session``;
+    429/5xx responses and transport errors are retried according to
+    ``retry``, and ``budget`` caps the total seconds spent on one call
+    across all attempts (``timeout`` still bounds each single attempt).
+    ``decoding`` is merged into every request body; with a ``cache`` set,
+    successful responses are stored under (endpoint, model, prompt hash,
+    decoding) and identical prompts are answered from disk.
+
+    Setting ``batch_size`` declares that the provider accepts packed requests:
+    :meth:`call_json_batch` then posts ``{"model": ..., "prompts": [...]}`` to
+    ``batch_endpoint`` (default ``endpoint``) and expects a JSON array of
+    results in prompt order, either bare or under ``"results"``.
+
+    ``max_prompt_tokens`` is the model's prompt budget: agents then pack hunk
+    context and related history into it (see :mod:`context_packer`), measured
+    with ``tokenizer`` or the built-in estimate.
+    """
 
     def __init__(
         self,
@@ -46,43 +109,388 @@ class CloudLLMClient:
         api_key: Optional[str] = None,
         timeout: float = 30.0,
         response_field: Optional[str] = None,
+        retry: Optional[RetryPolicy] = None,
+        budget: Optional[float] = None,
+        decoding: Optional[Dict[str, Any]] = None,
+        cache: Optional[ResponseCache] = None,
+        batch_size: Optional[int] = None,
+        batch_endpoint: Optional[str] = None,
+        max_prompt_tokens: Optional[int] = None,
+        tokenizer: Optional[Tokenizer] = None,
     ) -> None:
         self.endpoint = endpoint
         self.model = model
         self.api_key = api_key
         self.timeout = timeout
         self.response_field = response_field
+        self.retry = retry or RetryPolicy()
+        self.budget = budget
+        self.decoding = dict(decoding or {})
+        self.cache = cache
+        self.batch_size = batch_size
+        self.batch_endpoint = batch_endpoint
+        self.max_prompt_tokens = max_prompt_tokens
+        self.tokenizer = tokenizer
+        self._local = threading.local()
+        # Every thread's session, so ``close`` can release all pooled connections.
+        self._sessions: List[Any] = []
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.endpoint and self.model)
+
+    def prompt_budget(self) -> Optional[PromptBudget]:
+        if not self.max_prompt_tokens:
+            return None
+        if self.tokenizer is None:
+            return PromptBudget(self.max_prompt_tokens)
+        return PromptBudget(self.max_prompt_tokens, self.tokenizer)
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _request_body(self, prompt: str) -> Dict[str, Any]:
+        return {**self.decoding, "model": self.model, "prompt": prompt}
+
+    def _batch_body(self, prompts: Sequence[str]) -> Dict[str, Any]:
+        return {**self.decoding, "model": self.model, "prompts": list(prompts)}
+
+    def _cache_key(self, prompt: str) -> str:
+        return cache_key(endpoint=self.endpoint, model=self.model, prompt=prompt, params=self.decoding)
+
+    def _cached(self, prompt: str) -> Optional[CloudCallResult]:
+        if self.cache is None:
+            return None
+        payload = self.cache.get(self._cache_key(prompt))
+        return CloudCallResult(payload=payload, used_cloud=True) if payload is not None else None
+
+    def _remember(self, prompt: str, result: CloudCallResult) -> CloudCallResult:
+        if self.cache is not None and result.used_cloud:
+            self.cache.put(self._cache_key(prompt), result.payload)
+        return result
+
+    def _parse_payload(self, data: Any) -> Dict[str, Any]:
+        if isinstance(data, str):
+            data = json.loads(data)
+        if self.response_field and isinstance(data, dict):
+            data = data.get(self.response_field, data)
+        if isinstance(data, str):
+            data = json.loads(data)
+        if not isinstance(data, dict):
+            raise ValueError("Cloud response is not a JSON object")
+        return data
+
+    def _split_batch(self, data: Any, count: int) -> List[Optional[Dict[str, Any]]]:
+        """Parse a packed response into ``count`` payloads; unusable items become ``None``."""
+
+        if isinstance(data, str):
+            data = json.loads(data)
+        if isinstance(data, dict):
+            data = data.get("results")
+        if not isinstance(data, list):
+            raise ValueError("Cloud batch response is not a JSON array")
+        items: List[Optional[Dict[str, Any]]] = []
+        for index in range(count):
+            try:
+                items.append(self._parse_payload(data[index]))
+            except Exception:
+                items.append(None)
+        return items
+
+    def _attempt_timeout(self, deadline: Optional[float]) -> Optional[float]:
+        """Timeout for the next attempt, or ``None`` once the budget is spent."""
+
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        return min(self.timeout, remaining)
+
+    def _session(self) -> Any:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()  # type: ignore[union-attr]
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def _post(self, url: str, body: Dict[str, Any]) -> Any:
+        """POST ``body`` with retries; returns the decoded JSON or raises after the last attempt."""
+
+        if requests is None:
+            raise RuntimeError("requests is not installed")
+        deadline = time.monotonic() + self.budget if self.budget else None
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout(deadline)
+            if timeout is None:
+                raise _BudgetExhausted(f"budget of {self.budget}s exhausted after {attempt} attempts")
+            try:
+                response = self._session().post(url, json=body, headers=self._headers(), timeout=timeout)
+                if response.status_code in self.retry.retry_statuses:
+                    raise _RetryableStatus(response.status_code, response.headers.get("Retry-After"))
+                response.raise_for_status()
+                return response.json()
+            except (_RetryableStatus, requests.ConnectionError, requests.Timeout) as exc:  # type: ignore[union-attr]
+                if attempt >= self.retry.max_retries:
+                    raise
+                time.sleep(self.retry.delay(attempt, getattr(exc, "retry_after", None)))
+                attempt += 1
 
     def call_json(self, prompt: str, *, default: Dict[str, Any]) -> CloudCallResult:
         """Call the cloud endpoint, falling back to ``default`` on failure."""
 
-        if not self.endpoint or not self.model or requests is None:
+        if not self.enabled:
             return CloudCallResult(payload=dict(default), used_cloud=False)
-        headers = {"Content-Type": "application/json"}
-        if self.api_key:
-            headers["Authorization"] = f"Bearer {self.api_key}"
-        payload = {"model": self.model, "prompt": prompt}
+        cached = self._cached(prompt)
+        if cached is not None:
+            return cached
         try:
-            response = requests.post(  # type: ignore[operator]
-                self.endpoint,
-                json=payload,
-                headers=headers,
-                timeout=self.timeout,
-            )
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, str):
-                data = json.loads(data)
-            if self.response_field and isinstance(data, dict):
-                data = data.get(self.response_field, data)
-            if isinstance(data, str):
-                data = json.loads(data)
-            if not isinstance(data, dict):
-                raise ValueError("Cloud response is not a JSON object")
-            return CloudCallResult(payload=data, used_cloud=True)
+            data = self._post(self.endpoint, self._request_body(prompt))  # type: ignore[arg-type]
+            result = CloudCallResult(payload=self._parse_payload(data), used_cloud=True)
         except Exception as exc:  # pragma: no cover - network errors
             LOGGER.debug("Cloud call failed, fallback to default: %s", exc)
             return CloudCallResult(payload=dict(default), used_cloud=False)
+        return self._remember(prompt, result)
+
+    def call_json_many(self, calls: Sequence[CloudCall]) -> List[CloudCallResult]:
+        """Run several ``(prompt, default)`` calls; results keep the input order."""
+
+        return [self.call_json(prompt, default=default) for prompt, default in calls]
+
+    def call_json_batch(
+        self,
+        prompts: Sequence[str],
+        defaults: Sequence[Dict[str, Any]],
+    ) -> List[CloudCallResult]:
+        """Answer ``prompts`` with as few round trips as the provider allows.
+
+        With ``batch_size`` set, cached prompts are answered locally and the
+        rest are packed ``batch_size`` per request; otherwise this falls back
+        to :meth:`call_json_many`. Every item that is missing or malformed in
+        a response, or whose request failed, falls back to its own default.
+        """
+
+        if len(prompts) != len(defaults):
+            raise ValueError("prompts and defaults must have the same length")
+        if not self.enabled or not self.batch_size or self.batch_size < 2:
+            return self.call_json_many(list(zip(prompts, defaults)))
+        results: List[Optional[CloudCallResult]] = [self._cached(prompt) for prompt in prompts]
+        pending = [index for index, result in enumerate(results) if result is None]
+        chunks = [pending[start : start + self.batch_size] for start in range(0, len(pending), self.batch_size)]
+        answered = self._send_chunks(
+            [([prompts[i] for i in chunk], [defaults[i] for i in chunk]) for chunk in chunks]
+        )
+        for chunk, chunk_results in zip(chunks, answered):
+            for index, result in zip(chunk, chunk_results):
+                results[index] = result
+        return results  # type: ignore[return-value]
+
+    def _chunk_results(
+        self,
+        prompts: Sequence[str],
+        defaults: Sequence[Dict[str, Any]],
+        items: Sequence[Optional[Dict[str, Any]]],
+    ) -> List[CloudCallResult]:
+        results: List[CloudCallResult] = []
+        for prompt, default, item in zip(prompts, defaults, items):
+            if item is None:
+                results.append(CloudCallResult(payload=dict(default), used_cloud=False))
+            else:
+                results.append(self._remember(prompt, CloudCallResult(payload=item, used_cloud=True)))
+        return results
+
+    def _send_chunk(self, prompts: Sequence[str], defaults: Sequence[Dict[str, Any]]) -> List[CloudCallResult]:
+        try:
+            data = self._post(self.batch_endpoint or self.endpoint, self._batch_body(prompts))  # type: ignore[arg-type]
+            items = self._split_batch(data, len(prompts))
+        except Exception as exc:  # pragma: no cover - network errors
+            LOGGER.debug("Cloud batch call failed, fallback to defaults: %s", exc)
+            items = [None] * len(prompts)
+        return self._chunk_results(prompts, defaults, items)
+
+    def _send_chunks(self, chunks: Sequence[Tuple[List[str], List[Dict[str, Any]]]]) -> List[List[CloudCallResult]]:
+        return [self._send_chunk(prompts, defaults) for prompts, defaults in chunks]
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        return self.cache.stats() if self.cache is not None else None
+
+    def close(self) -> None:
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+            # Threads that call again after close get a fresh session instead of a closed one.
+            self._local = threading.local()
+        for session in sessions:
+            session.close()
+
+
+class AsyncCloudLLMClient(CloudLLMClient):
+    """Cloud client that issues requests concurrently on a private event loop.
+
+    One ``aiohttp`` session (a connection pool of ``pool_size`` sockets) lives
+    on a background loop thread shared by every caller, and a semaphore keeps
+    at most ``max_in_flight`` requests outstanding across all threads and PRs.
+    ``call_json_many`` and packed ``call_json_batch`` chunks are gathered, so a
+    stage costs roughly its slowest request. Without ``aiohttp`` installed it
+    behaves like :class:`CloudLLMClient`.
+    """
+
+    def __init__(self, *, max_in_flight: int = 16, pool_size: Optional[int] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.max_in_flight = max(1, max_in_flight)
+        self.pool_size = pool_size or self.max_in_flight
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._http: Any = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+
+    def __enter__(self) -> "AsyncCloudLLMClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="cloud-llm-loop", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def _submit(self, coro: Any) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    async def _open(self) -> None:
+        if self._http is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)  # type: ignore[union-attr]
+            self._http = aiohttp.ClientSession(connector=connector, headers=self._headers())  # type: ignore[union-attr]
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def _apost(self, url: str, body: Dict[str, Any]) -> Any:
+        await self._open()
+        deadline = time.monotonic() + self.budget if self.budget else None
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout(deadline)
+            if timeout is None:
+                raise _BudgetExhausted(f"budget of {self.budget}s exhausted after {attempt} attempts")
+            try:
+                async with self._semaphore:  # type: ignore[union-attr]
+                    async with self._http.post(
+                        url,
+                        json=body,
+                        timeout=aiohttp.ClientTimeout(total=timeout),  # type: ignore[union-attr]
+                    ) as response:
+                        if response.status in self.retry.retry_statuses:
+                            raise _RetryableStatus(response.status, response.headers.get("Retry-After"))
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            except (_RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:  # type: ignore[union-attr]
+                if attempt >= self.retry.max_retries:
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt, getattr(exc, "retry_after", None)))
+                attempt += 1
+
+    async def _acall(self, prompt: str, default: Dict[str, Any]) -> CloudCallResult:
+        cached = self._cached(prompt)
+        if cached is not None:
+            return cached
+        try:
+            data = await self._apost(self.endpoint, self._request_body(prompt))  # type: ignore[arg-type]
+            result = CloudCallResult(payload=self._parse_payload(data), used_cloud=True)
+        except Exception as exc:  # pragma: no cover - network errors
+            LOGGER.debug("Cloud call failed, fallback to default: %s", exc)
+            return CloudCallResult(payload=dict(default), used_cloud=False)
+        return self._remember(prompt, result)
+
+    async def _asend_chunk(self, prompts: Sequence[str], defaults: Sequence[Dict[str, Any]]) -> List[CloudCallResult]:
+        try:
+            data = await self._apost(self.batch_endpoint or self.endpoint, self._batch_body(prompts))  # type: ignore[arg-type]
+            items = self._split_batch(data, len(prompts))
+        except Exception as exc:  # pragma: no cover - network errors
+            LOGGER.debug("Cloud batch call failed, fallback to defaults: %s", exc)
+            items = [None] * len(prompts)
+        return self._chunk_results(prompts, defaults, items)
+
+    async def _agather(self, calls: Sequence[CloudCall]) -> List[CloudCallResult]:
+        return list(await asyncio.gather(*(self._acall(prompt, default) for prompt, default in calls)))
+
+    async def _agather_chunks(
+        self, chunks: Sequence[Tuple[List[str], List[Dict[str, Any]]]]
+    ) -> List[List[CloudCallResult]]:
+        return list(await asyncio.gather(*(self._asend_chunk(prompts, defaults) for prompts, defaults in chunks)))
+
+    def call_json(self, prompt: str, *, default: Dict[str, Any]) -> CloudCallResult:
+        if not self.enabled or aiohttp is None:
+            return super().call_json(prompt, default=default)
+        return self._submit(self._acall(prompt, default))
+
+    def call_json_many(self, calls: Sequence[CloudCall]) -> List[CloudCallResult]:
+        if not calls:
+            return []
+        if not self.enabled or aiohttp is None:
+            return super().call_json_many(calls)
+        return self._submit(self._agather(calls))
+
+    def _send_chunks(self, chunks: Sequence[Tuple[List[str], List[Dict[str, Any]]]]) -> List[List[CloudCallResult]]:
+        if not chunks:
+            return []
+        if aiohttp is None:
+            return super()._send_chunks(chunks)
+        return self._submit(self._agather_chunks(chunks))
+
+    def close(self) -> None:
+        super().close()
+        with self._start_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        if self._http is not None:
+            asyncio.run_coroutine_threadsafe(self._http.close(), loop).result()
+            self._http = None
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join()
+        loop.close()
+
+
+def _call_batch(client: Any, calls: Sequence[CloudCall]) -> List[CloudCallResult]:
+    """Send one stage's ``(prompt, default)`` calls through ``call_json_batch`` when the client offers it."""
+
+    if not calls:
+        return []
+    call_batch = getattr(client, "call_json_batch", None)
+    if call_batch is not None:
+        return call_batch([prompt for prompt, _ in calls], [default for _, default in calls])
+    return [client.call_json(prompt, default=default) for prompt, default in calls]
+
+
+def _fit_prompt(
+    client: Any,
+    pr_sample: PRReviewSample,
+    file_path: str,
+    hunk_range: Sequence[int],
+    template: Callable[[str], str],
+    snippet: Optional[str],
+) -> str:
+    """Render ``template`` with ``snippet``, or with packed hunk context when the client has a prompt budget."""
+
+    budget_of = getattr(client, "prompt_budget", None)
+    budget = budget_of() if budget_of is not None else None
+    if budget is None:
+        return template(snippet)
+    file_obj = pr_sample.get_file(file_path)
+    hunk = file_obj.get_hunk_by_range(tuple(hunk_range)) if file_obj else None
+    return budget.fill(template, hunk_sources(pr_sample, file_obj, hunk, fallback=snippet or ""))
 
 
 def _merge_structured(default: Dict[str, Any], update: Dict[str, Any], allowed_keys: Iterable[str]) -> Dict[str, Any]:
@@ -103,13 +511,14 @@ class CloudNeedReviewAgent(NeedReviewAgent):
         self.llm_client = llm_client
 
     @staticmethod
-    def build_prompt(pr_sample: PRReviewSample, decision: Dict[str, Any]) -> str:
-        file_obj = pr_sample.get_file(decision["file_path"])
-        snippet = ""
-        if file_obj:
-            hunk = file_obj.get_hunk_by_range(tuple(decision["hunk_range"]["new"]))
-            if hunk:
-                snippet = hunk.render_snippet(context=3)
+    def build_prompt(pr_sample: PRReviewSample, decision: Dict[str, Any], snippet: Optional[str] = None) -> str:
+        if snippet is None:
+            file_obj = pr_sample.get_file(decision["file_path"])
+            snippet = ""
+            if file_obj:
+                hunk = file_obj.get_hunk_by_range(tuple(decision["hunk_range"]["new"]))
+                if hunk:
+                    snippet = hunk.render_snippet(context=3)
         metadata = pr_sample.metadata
         return (
             "任务：问题一（代码片段评审必要性判断）\n"
@@ -121,20 +530,38 @@ class CloudNeedReviewAgent(NeedReviewAgent):
             "请仅给出 JSON，对应字段 {\"need_review\": bool, \"reason\": str}."
         )
 
+    def prompt_for(self, pr_sample: PRReviewSample, decision: Dict[str, Any]) -> str:
+        return _fit_prompt(
+            self.llm_client,
+            pr_sample,
+            decision["file_path"],
+            decision["hunk_range"]["new"],
+            lambda snippet: self.build_prompt(pr_sample, decision, snippet),
+            None,
+        )
+
+    @staticmethod
+    def merge_result(decision: Dict[str, Any], result: CloudCallResult) -> Dict[str, Any]:
+        merged = _merge_structured(decision, result.payload, ["need_review", "reason"])
+        merged.setdefault("source", result.source if result.used_cloud else "heuristic")
+        return merged
+
+    def judge_hunk(self, pr_sample: PRReviewSample, diff_file: DiffFile, hunk: DiffHunk) -> Dict[str, Any]:
+        decision = super().judge_hunk(pr_sample, diff_file, hunk)
+        if not self.llm_client:
+            return decision
+        result = self.llm_client.call_json(self.prompt_for(pr_sample, decision), default=decision)
+        return self.merge_result(decision, result)
+
     def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
-        artifact = super().run(pr_sample)
         if not self.llm_client:
-            return artifact
-        updated: List[Dict[str, Any]] = []
-        for decision in artifact.payload.get("decisions", []):
-            prompt = self.build_prompt(pr_sample, decision)
-            result = self.llm_client.call_json(prompt, default=decision)
-            merged = _merge_structured(decision, result.payload, ["need_review", "reason"])
-            merged.setdefault("source", "cloud" if result.used_cloud else "heuristic")
-            updated.append(merged)
-        artifact.payload["decisions"] = updated
-        self.blackboard.push(self.name, artifact)
-        return artifact
+            return super().run(pr_sample)
+        decisions: List[Dict[str, Any]] = []
+        for diff_file in pr_sample.diff_files:
+            for hunk in diff_file.hunks:
+                decisions.append(super().judge_hunk(pr_sample, diff_file, hunk))
+        results = _call_batch(self.llm_client, [(self.prompt_for(pr_sample, d), d) for d in decisions])
+        return self.collect(pr_sample, [self.merge_result(d, r) for d, r in zip(decisions, results)])
 
 
 class CloudReviewCommentAgent(ReviewCommentAgent):
@@ -156,36 +583,53 @@ class CloudReviewCommentAgent(ReviewCommentAgent):
             "请输出 JSON，对应字段 {\"summary\": str, \"rationale\": str, \"context_snippet\": str}."
         )
 
+    def cloud_call(self, pr_sample: PRReviewSample, decision: Dict[str, Any], comment: Dict[str, Any]) -> CloudCall:
+        file_obj = pr_sample.get_file(comment["file_path"])
+        snippet = comment["review_comment"].get("context_snippet", "")
+        if file_obj:
+            hunk = file_obj.get_hunk_by_range(tuple(comment["hunk_range"]["new"]))
+            if hunk:
+                snippet = hunk.render_snippet(context=3)
+        prompt = _fit_prompt(
+            self.llm_client,
+            pr_sample,
+            comment["file_path"],
+            comment["hunk_range"]["new"],
+            lambda context: self.build_prompt(pr_sample, decision, context),
+            snippet,
+        )
+        return prompt, comment["review_comment"]
+
+    @staticmethod
+    def merge_result(comment: Dict[str, Any], result: CloudCallResult) -> Dict[str, Any]:
+        merged_comment = _merge_structured(
+            comment["review_comment"],
+            result.payload,
+            ["summary", "rationale", "context_snippet"],
+        )
+        merged_comment.setdefault("source", result.source if result.used_cloud else "heuristic")
+        return {**comment, "review_comment": merged_comment}
+
+    def comment_for(self, pr_sample: PRReviewSample, decision: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        comment = super().comment_for(pr_sample, decision)
+        if comment is None or not self.llm_client:
+            return comment
+        prompt, default = self.cloud_call(pr_sample, decision, comment)
+        return self.merge_result(comment, self.llm_client.call_json(prompt, default=default))
+
     def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
-        artifact = super().run(pr_sample)
         if not self.llm_client:
-            return artifact
-        enhanced: List[Dict[str, Any]] = []
+            return super().run(pr_sample)
         need_review_artifact = self.blackboard.pull("need_review")
-        decisions = need_review_artifact.payload["decisions"] if need_review_artifact else []
-        decision_map = {(d["file_path"], tuple(d["hunk_range"]["new"])): d for d in decisions}
-        for comment in artifact.payload.get("comments", []):
-            file_path = comment["file_path"]
-            new_range = tuple(comment["hunk_range"]["new"])
-            decision = decision_map.get((file_path, new_range), {})
-            file_obj = pr_sample.get_file(file_path)
-            snippet = comment["review_comment"].get("context_snippet", "")
-            if file_obj:
-                hunk = file_obj.get_hunk_by_range(new_range)
-                if hunk:
-                    snippet = hunk.render_snippet(context=3)
-            prompt = self.build_prompt(pr_sample, decision, snippet)
-            result = self.llm_client.call_json(prompt, default=comment["review_comment"])
-            merged_comment = _merge_structured(
-                comment["review_comment"],
-                result.payload,
-                ["summary", "rationale", "context_snippet"],
-            )
-            merged_comment.setdefault("source", "cloud" if result.used_cloud else "heuristic")
-            enhanced.append({**comment, "review_comment": merged_comment})
-        artifact.payload["comments"] = enhanced
-        self.blackboard.push(self.name, artifact)
-        return artifact
+        if not need_review_artifact:
+            raise RuntimeError("Need review results missing")
+        pending: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        for decision in need_review_artifact.payload["decisions"]:
+            comment = super().comment_for(pr_sample, decision)
+            if comment is not None:
+                pending.append((decision, comment))
+        results = _call_batch(self.llm_client, [self.cloud_call(pr_sample, d, c) for d, c in pending])
+        return self.collect(pr_sample, [self.merge_result(c, r) for (_, c), r in zip(pending, results)])
 
 
 class CloudLineLocatorAgent(LineLocatorAgent):
@@ -205,38 +649,68 @@ class CloudLineLocatorAgent(LineLocatorAgent):
             "请返回 JSON 数组 issues，每个元素包含 line_no, issue_type, issue_desc, evidence。"
         )
 
-    def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
-        artifact = super().run(pr_sample)
-        if not self.llm_client:
-            return artifact
-        refined: List[Dict[str, Any]] = list(artifact.payload.get("issues", []))
-        review_artifact = self.blackboard.pull("review_comment")
-        if not review_artifact:
-            return artifact
-        for comment in review_artifact.payload.get("comments", []):
-            file_obj = pr_sample.get_file(comment["file_path"])
-            snippet = comment["review_comment"].get("context_snippet", "")
-            if file_obj:
-                hunk = file_obj.get_hunk_by_range(tuple(comment["hunk_range"]["new"]))
-                if hunk:
-                    snippet = hunk.render_snippet(context=3)
-            prompt = self.build_prompt(pr_sample, comment, snippet)
-            default = {"issues": []}
-            result = self.llm_client.call_json(prompt, default=default)
-            for issue in result.payload.get("issues", []):
-                merged_issue = {
+    @staticmethod
+    def _snippet(pr_sample: PRReviewSample, item: Dict[str, Any]) -> str:
+        file_obj = pr_sample.get_file(item["file_path"])
+        snippet = item["review_comment"].get("context_snippet", "")
+        if file_obj:
+            hunk = file_obj.get_hunk_by_range(tuple(item["hunk_range"]["new"]))
+            if hunk:
+                snippet = hunk.render_snippet(context=3)
+        return snippet
+
+    def cloud_call(self, pr_sample: PRReviewSample, item: Dict[str, Any]) -> CloudCall:
+        prompt = _fit_prompt(
+            self.llm_client,
+            pr_sample,
+            item["file_path"],
+            item["hunk_range"]["new"],
+            lambda context: self.build_prompt(pr_sample, item, context),
+            self._snippet(pr_sample, item),
+        )
+        return prompt, {"issues": []}
+
+    def merge_result(
+        self,
+        pr_sample: PRReviewSample,
+        item: Dict[str, Any],
+        issues: List[Dict[str, Any]],
+        result: CloudCallResult,
+    ) -> List[Dict[str, Any]]:
+        snippet = self._snippet(pr_sample, item)
+        for issue in result.payload.get("issues", []):
+            issues.append(
+                {
                     "pr_number": pr_sample.pr_number,
-                    "file_path": comment["file_path"],
+                    "file_path": item["file_path"],
                     "line_no": issue.get("line_no"),
                     "issue_type": issue.get("issue_type", "unknown"),
                     "issue_desc": issue.get("issue_desc", ""),
                     "evidence": issue.get("evidence", snippet[:160]),
-                    "source": "cloud" if result.used_cloud else "heuristic",
+                    "source": result.source if result.used_cloud else "heuristic",
                 }
-                refined.append(merged_issue)
-        artifact.payload["issues"] = refined
-        self.blackboard.push(self.name, artifact)
-        return artifact
+            )
+        return issues
+
+    def locate(self, pr_sample: PRReviewSample, item: Dict[str, Any]) -> List[Dict[str, Any]]:
+        issues = super().locate(pr_sample, item)
+        if not self.llm_client:
+            return issues
+        prompt, default = self.cloud_call(pr_sample, item)
+        return self.merge_result(pr_sample, item, issues, self.llm_client.call_json(prompt, default=default))
+
+    def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
+        if not self.llm_client:
+            return super().run(pr_sample)
+        review_artifact = self.blackboard.pull("review_comment")
+        if not review_artifact:
+            raise RuntimeError("Review comments missing")
+        items = review_artifact.payload.get("comments", [])
+        results = _call_batch(self.llm_client, [self.cloud_call(pr_sample, item) for item in items])
+        issues: List[Dict[str, Any]] = []
+        for item, result in zip(items, results):
+            issues.extend(self.merge_result(pr_sample, item, super().locate(pr_sample, item), result))
+        return self.collect(pr_sample, issues)
 
 
 class CloudFixGeneratorAgent(FixGeneratorAgent):
@@ -256,49 +730,66 @@ class CloudFixGeneratorAgent(FixGeneratorAgent):
             "请输出 JSON 字段 {\"fixed_lines\": [str], \"fix_desc\": str, \"can_auto_apply\": bool}."
         )
 
+    @staticmethod
+    def _original_line(pr_sample: PRReviewSample, issue: Dict[str, Any]) -> str:
+        file_obj = pr_sample.get_file(issue["file_path"])
+        if file_obj:
+            line_obj = file_obj.get_line_by_new_no(issue.get("line_no"))
+            return line_obj.content if line_obj else ""
+        return ""
+
+    def cloud_call(self, pr_sample: PRReviewSample, issue: Dict[str, Any]) -> CloudCall:
+        return self.build_prompt(pr_sample, issue, self._original_line(pr_sample, issue)), {}
+
+    def merge_result(
+        self,
+        pr_sample: PRReviewSample,
+        issue: Dict[str, Any],
+        heuristic_fix: Optional[Dict[str, Any]],
+        result: CloudCallResult,
+    ) -> Dict[str, Any]:
+        original_line = self._original_line(pr_sample, issue)
+        merged_fix = {
+            "pr_number": pr_sample.pr_number,
+            "file_path": issue["file_path"],
+            "original_lines": [original_line] if original_line else [],
+            "fixed_lines": result.payload.get("fixed_lines")
+            if isinstance(result.payload.get("fixed_lines"), list)
+            else None,
+            "fix_desc": result.payload.get("fix_desc", issue.get("issue_desc", "")),
+            "can_auto_apply": bool(result.payload.get("can_auto_apply", False)),
+            "source": result.source if result.used_cloud else "heuristic",
+        }
+        if not merged_fix["fixed_lines"]:
+            fallback_lines = heuristic_fix.get("fixed_lines") if heuristic_fix else None
+            if isinstance(fallback_lines, list) and fallback_lines:
+                merged_fix["fixed_lines"] = fallback_lines
+            elif original_line:
+                merged_fix["fixed_lines"] = [original_line]
+            else:
+                merged_fix["fixed_lines"] = []
+        return merged_fix
+
+    def fix_for(self, pr_sample: PRReviewSample, issue: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        heuristic_fix = super().fix_for(pr_sample, issue)
+        if not self.llm_client:
+            return heuristic_fix
+        prompt, default = self.cloud_call(pr_sample, issue)
+        result = self.llm_client.call_json(prompt, default=default)
+        return self.merge_result(pr_sample, issue, heuristic_fix, result)
+
     def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
-        artifact = super().run(pr_sample)
         if not self.llm_client:
-            return artifact
-        heuristics_lookup: Dict[str, Dict[str, Any]] = {}
-        for fix in artifact.payload.get("fixes", []):
-            heuristics_lookup.setdefault(fix.get("file_path", ""), fix)
+            return super().run(pr_sample)
         locator_artifact = self.blackboard.pull("line_locator")
         if not locator_artifact:
-            return artifact
+            raise RuntimeError("Line locator results missing")
+        issues = locator_artifact.payload.get("issues", [])
+        results = _call_batch(self.llm_client, [self.cloud_call(pr_sample, issue) for issue in issues])
         fixes: List[Dict[str, Any]] = []
-        for issue in locator_artifact.payload.get("issues", []):
-            file_obj = pr_sample.get_file(issue["file_path"])
-            original_line = ""
-            if file_obj:
-                line_obj = file_obj.get_line_by_new_no(issue.get("line_no"))
-                original_line = line_obj.content if line_obj else ""
-            prompt = self.build_prompt(pr_sample, issue, original_line)
-            result = self.llm_client.call_json(prompt, default={})
-            merged_fix = {
-                "pr_number": pr_sample.pr_number,
-                "file_path": issue["file_path"],
-                "original_lines": [original_line] if original_line else [],
-                "fixed_lines": result.payload.get("fixed_lines")
-                if isinstance(result.payload.get("fixed_lines"), list)
-                else None,
-                "fix_desc": result.payload.get("fix_desc", issue.get("issue_desc", "")),
-                "can_auto_apply": bool(result.payload.get("can_auto_apply", False)),
-                "source": "cloud" if result.used_cloud else "heuristic",
-            }
-            if not merged_fix["fixed_lines"]:
-                fallback = heuristics_lookup.get(issue["file_path"])
-                fallback_lines = fallback.get("fixed_lines") if fallback else None
-                if isinstance(fallback_lines, list) and fallback_lines:
-                    merged_fix["fixed_lines"] = fallback_lines
-                elif original_line:
-                    merged_fix["fixed_lines"] = [original_line]
-                else:
-                    merged_fix["fixed_lines"] = []
-            fixes.append(merged_fix)
-        artifact.payload["fixes"] = fixes
-        self.blackboard.push(self.name, artifact)
-        return artifact
+        for issue, result in zip(issues, results):
+            fixes.append(self.merge_result(pr_sample, issue, super().fix_for(pr_sample, issue), result))
+        return self.collect(pr_sample, fixes)
 
 
 class CloudOpenHarmonyPipeline:
@@ -310,6 +801,7 @@ class CloudOpenHarmonyPipeline:
         llm_client: Optional[CloudLLMClient] = None,
         blackboard: Optional[AgentBlackboard] = None,
         reflector_rules_path: Optional[str] = None,
+        hunk_workers: Optional[int] = None,
     ) -> None:
         self.blackboard = blackboard or AgentBlackboard()
         self.llm_client = llm_client
@@ -333,10 +825,38 @@ class CloudOpenHarmonyPipeline:
             line_locator_agent=line_agent,
             fix_generator_agent=fix_agent,
             reflector_agent=reflector_agent,
+            hunk_workers=hunk_workers,
         )
 
-    def run(self, pr_sample: PRReviewSample, *, enable_fix_generation: bool = True) -> Dict[str, Any]:
-        return self.orchestrator.run(pr_sample, enable_fix_generation=enable_fix_generation)
+    def run(
+        self,
+        pr_sample: PRReviewSample,
+        *,
+        enable_fix_generation: bool = True,
+        run_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return self.orchestrator.run(pr_sample, enable_fix_generation=enable_fix_generation, run_id=run_id)
+
+    def run_many(
+        self,
+        samples: Iterable[PRReviewSample],
+        *,
+        concurrency: int = 4,
+        ordered: bool = True,
+        enable_fix_generation: bool = True,
+        output_paths: Optional[QuestionOutputPaths] = None,
+        on_error: str = "record",
+    ) -> Iterator[Dict[str, Any]]:
+        return run_many(
+            self.run,
+            self.blackboard,
+            samples,
+            concurrency=concurrency,
+            ordered=ordered,
+            enable_fix_generation=enable_fix_generation,
+            output_paths=output_paths,
+            on_error=on_error,
+        )
 
     def reflect(self, successful_samples: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         if not self.orchestrator.reflector_agent:
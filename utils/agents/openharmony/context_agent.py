@@ -2,10 +2,11 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Any, Dict
 
 from data.pr_data.processing.structures import PRReviewSample
 
-from .base import AgentArtifact, AgentBlackboard, BaseAgent
+from .base import AgentArtifact, AgentBlackboard, BaseAgent, LazyPayload
 
 
 class ContextAgent(BaseAgent):
@@ -17,12 +18,15 @@ class ContextAgent(BaseAgent):
 
     def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
         project_context = self.blackboard.pull("project_context")
-        payload = {
-            "pr_number": pr_sample.pr_number,
-            "metadata": pr_sample.metadata,
-            "files": [diff_file.to_dict(include_lines=False) for diff_file in pr_sample.diff_files],
-            "project_context": project_context.payload if project_context else None,
-        }
-        artifact = AgentArtifact(name=self.name, payload=payload)
-        self.blackboard.push(self.name, artifact)
-        return artifact
+
+        # Only the sample and the project artifact are referenced here; the
+        # serialized file list is built if someone actually reads it.
+        def load() -> Dict[str, Any]:
+            return {
+                "pr_number": pr_sample.pr_number,
+                "metadata": pr_sample.metadata,
+                "files": [diff_file.to_dict(include_lines=False) for diff_file in pr_sample.diff_files],
+                "project_context": project_context.payload if project_context else None,
+            }
+
+        return self.publish(LazyPayload(load))
@@ -0,0 +1,205 @@
+"""Token-budget-aware packing of prompt context."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from data.pr_data.processing.structures import DiffFile, DiffHunk, PRReviewSample
+
+from .local_backends import estimate_tokens
+
+Tokenizer = Callable[[str], int]
+
+TRUNCATION_MARK = "…"
+
+
+@dataclass
+class ContextSource:
+    """One candidate block of prompt context.
+
+    Sources are packed in ascending ``priority``. When ``text`` does not fit,
+    the ``fallbacks`` (progressively smaller renderings of the same content)
+    are tried in order, and the last candidate is truncated line by line,
+    keeping its ``"head"`` or ``"tail"``. A block that would keep fewer than
+    ``min_tokens`` tokens is dropped instead.
+    """
+
+    name: str
+    text: str
+    priority: int = 0
+    fallbacks: Sequence[str] = ()
+    keep: str = "head"
+    min_tokens: int = 8
+    title: str = ""
+
+
+@dataclass
+class PackedContext:
+    sections: Dict[str, str] = field(default_factory=dict)
+    titles: Dict[str, str] = field(default_factory=dict)
+    tokens: int = 0
+    budget: int = 0
+    truncated: List[str] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+
+    def render(self) -> str:
+        blocks = []
+        for name, text in self.sections.items():
+            title = self.titles.get(name)
+            blocks.append(f"{title}\n{text}" if title else text)
+        return "\n".join(blocks)
+
+
+class ContextPacker:
+    """Greedily fills a token budget from prioritized :class:`ContextSource` blocks.
+
+    Packing only depends on the sources, the budget and the tokenizer, so the
+    same inputs always produce the same prompt (cache keys stay stable).
+    """
+
+    def __init__(self, budget: int, *, tokenizer: Optional[Tokenizer] = None) -> None:
+        self.budget = max(0, budget)
+        self.tokenizer = tokenizer or estimate_tokens
+
+    def pack(self, sources: Iterable[ContextSource]) -> PackedContext:
+        packed = PackedContext(budget=self.budget)
+        remaining = self.budget
+        for source in sorted(sources, key=lambda item: item.priority):
+            header_cost = self.tokenizer(source.title) if source.title else 0
+            available = remaining - header_cost
+            text: Optional[str] = None
+            for candidate in (source.text, *source.fallbacks):
+                if candidate and self.tokenizer(candidate) <= available:
+                    text = candidate
+                    break
+            if text is None:
+                candidates = [candidate for candidate in (source.text, *source.fallbacks) if candidate]
+                if candidates and available >= source.min_tokens:
+                    text = self._truncate(candidates[-1], available, source.keep)
+                    if text:
+                        packed.truncated.append(source.name)
+            if not text:
+                if source.text:
+                    packed.dropped.append(source.name)
+                continue
+            cost = self.tokenizer(text) + header_cost
+            packed.sections[source.name] = text
+            if source.title:
+                packed.titles[source.name] = source.title
+            packed.tokens += cost
+            remaining -= cost
+        return packed
+
+    def _truncate(self, text: str, limit: int, keep: str) -> str:
+        """Keep whole lines from one end; cut the boundary line by characters if needed."""
+
+        lines = text.splitlines()
+        if keep == "tail":
+            lines.reverse()
+        limit -= self.tokenizer(TRUNCATION_MARK)
+        kept: List[str] = []
+        used = 0
+        for line in lines:
+            cost = self.tokenizer(line) + 1
+            if used + cost > limit:
+                partial = self._cut_line(line, limit - used - 1, keep)
+                if partial:
+                    kept.append(partial)
+                break
+            kept.append(line)
+            used += cost
+        if not kept:
+            return ""
+        if keep == "tail":
+            kept.reverse()
+            return "\n".join([TRUNCATION_MARK] + kept)
+        return "\n".join(kept + [TRUNCATION_MARK])
+
+    def _cut_line(self, line: str, limit: int, keep: str) -> str:
+        if limit <= 0:
+            return ""
+        low, high = 0, len(line)
+        while low < high:
+            middle = (low + high + 1) // 2
+            piece = line[:middle] if keep == "head" else line[len(line) - middle :]
+            if self.tokenizer(piece) <= limit:
+                low = middle
+            else:
+                high = middle - 1
+        return line[:low] if keep == "head" else line[len(line) - low :]
+
+
+@dataclass
+class PromptBudget:
+    """Token budget of a complete prompt and the tokenizer that measures it."""
+
+    max_tokens: int
+    tokenizer: Tokenizer = estimate_tokens
+
+    def fill(self, template: Callable[[str], str], sources: Sequence[ContextSource]) -> str:
+        """Render ``template`` with as much of ``sources`` as fits in the budget."""
+
+        overhead = self.tokenizer(template(""))
+        packed = ContextPacker(self.max_tokens - overhead, tokenizer=self.tokenizer).pack(sources)
+        return template(packed.render())
+
+
+def _comment_text(comment: Dict[str, object]) -> str:
+    body = comment.get("body") or comment.get("comment") or ""
+    return " ".join(str(body).split())
+
+
+def hunk_sources(
+    pr_sample: PRReviewSample,
+    diff_file: Optional[DiffFile],
+    hunk: Optional[DiffHunk],
+    *,
+    context_lines: int = 3,
+    fallback: str = "",
+) -> List[ContextSource]:
+    """Prioritized context for a hunk: the change itself, then review history, then commits."""
+
+    sources: List[ContextSource] = []
+    if hunk is not None:
+        sources.append(
+            ContextSource(
+                name="hunk",
+                text=hunk.render_snippet(context=context_lines),
+                fallbacks=(hunk.render_snippet(context=0),),
+                priority=0,
+            )
+        )
+    elif fallback:
+        sources.append(ContextSource(name="hunk", text=fallback, priority=0))
+    if diff_file is None:
+        return sources
+    comments = [
+        _comment_text(comment)
+        for comment in diff_file.historical_comments
+        if isinstance(comment, dict) and comment.get("path") in (None, diff_file.file_path)
+    ]
+    comments = [text for text in comments if text]
+    if comments:
+        sources.append(
+            ContextSource(
+                name="history_comments",
+                title="相关历史评论：",
+                text="\n".join(f"- {text}" for text in comments),
+                priority=1,
+            )
+        )
+    commits = pr_sample.commit_history.get(diff_file.file_path, [])
+    if commits:
+        sources.append(
+            ContextSource(
+                name="history_commits",
+                title="相关提交：",
+                text="\n".join(
+                    f"- {str(commit.get('sha') or '')[:10]} {commit.get('date') or ''} changes={commit.get('changes')}"
+                    for commit in commits
+                ),
+                keep="tail",
+                priority=2,
+            )
+        )
+    return sources
@@ -0,0 +1,285 @@
+"""Device-aware priority scheduler for local inference requests."""
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .local_backends import GenerationResult, InferenceBackend, create_backend
+
+
+class AdmissionError(RuntimeError):
+    """Raised for a request that can never fit the model's context window."""
+
+
+@dataclass
+class DeviceSpec:
+    """One execution device (``cuda:0``, ``cpu``, or a fake name in tests).
+
+    ``max_batch_tokens`` is the admission budget of a single batch: requests
+    are only grouped while their estimated prompt + generation tokens fit.
+    """
+
+    name: str
+    max_batch_tokens: int = 65536
+
+
+@dataclass
+class _Request:
+    spec: Any
+    prompt: str
+    tokens: int
+    max_new_tokens: int
+    future: Future
+    enqueued: float
+    home: str
+
+    @property
+    def model_key(self) -> Tuple[str, str]:
+        return self.spec.backend, self.spec.name
+
+
+@dataclass
+class _DeviceState:
+    spec: DeviceSpec
+    queue: List[Tuple[int, int, _Request]] = field(default_factory=list)
+    running: bool = False
+    batches: int = 0
+    requests: int = 0
+    stolen: int = 0
+    busy_seconds: float = 0.0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    completion_tokens: int = 0
+    thread: Optional[threading.Thread] = None
+
+
+class DeviceScheduler:
+    """Per-device priority queues with dynamic batching and work stealing.
+
+    Requests are queued on the device named by their ``LocalModelSpec`` and
+    dispatched in ascending ``priority`` (FIFO within a priority). A device
+    worker forms a batch from the head request plus further queued requests
+    of the same model, bounded by ``max_batch_size`` and the device's
+    ``max_batch_tokens``, waiting up to ``max_wait_ms`` for stragglers. An idle
+    device steals from the longest queue of a busy device unless the model
+    spec is ``pinned``; the stolen batch runs on a replica of the model built
+    for the thief device. Unknown device names are registered on first use,
+    so CPU-only fake devices work in tests.
+    """
+
+    def __init__(
+        self,
+        devices: Optional[Iterable[DeviceSpec]] = None,
+        *,
+        work_stealing: bool = True,
+        backend_factory: Callable[[Any], InferenceBackend] = create_backend,
+    ) -> None:
+        self.work_stealing = work_stealing
+        self.backend_factory = backend_factory
+        self._cond = threading.Condition()
+        self._devices: Dict[str, _DeviceState] = {}
+        self._backends: Dict[Tuple[str, str, str], InferenceBackend] = {}
+        self._backend_lock = threading.Lock()
+        self._seq = itertools.count()
+        self._closed = False
+        self._started = time.perf_counter()
+        for device in devices or ():
+            self.add_device(device)
+
+    def add_device(self, device: DeviceSpec) -> None:
+        with self._cond:
+            if device.name in self._devices:
+                self._devices[device.name].spec = device
+                return
+            state = _DeviceState(spec=device)
+            self._devices[device.name] = state
+            state.thread = threading.Thread(target=self._worker, args=(state,), name=f"device-{device.name}", daemon=True)
+            state.thread.start()
+
+    def backend_for(self, spec: Any, device: Optional[str] = None) -> InferenceBackend:
+        """Backend instance of ``spec`` on ``device`` (its home device by default)."""
+
+        device = device or spec.device
+        key = (spec.backend, spec.name, device)
+        with self._backend_lock:
+            backend = self._backends.get(key)
+            if backend is None:
+                backend = self._backends[key] = self.backend_factory(replace(spec, device=device))
+            return backend
+
+    def submit(self, spec: Any, prompt: str, *, max_new_tokens: int) -> "Future[GenerationResult]":
+        future: "Future[GenerationResult]" = Future()
+        tokens = self.backend_for(spec).count_tokens(prompt) + max_new_tokens
+        if tokens > spec.max_context:
+            future.set_exception(
+                AdmissionError(f"{tokens} estimated tokens exceed max_context {spec.max_context} of {spec.name}")
+            )
+            return future
+        if spec.device not in self._devices:
+            self.add_device(DeviceSpec(name=spec.device))
+        request = _Request(spec, prompt, tokens, max_new_tokens, future, time.perf_counter(), spec.device)
+        with self._cond:
+            heapq.heappush(self._devices[spec.device].queue, (spec.priority, next(self._seq), request))
+            self._cond.notify_all()
+        return future
+
+    def _steal_victim(self, thief: _DeviceState) -> Optional[_DeviceState]:
+        candidates = [
+            state
+            for state in self._devices.values()
+            if state is not thief
+            and state.running
+            and any(not entry[2].spec.pinned for entry in state.queue)
+        ]
+        return max(candidates, key=lambda state: len(state.queue), default=None)
+
+    def _take_batch(self, source: _DeviceState, thief: _DeviceState, stealing: bool) -> List[_Request]:
+        """Pop the head request and every queued request of the same model that fits."""
+
+        skipped: List[Tuple[int, int, _Request]] = []
+        head: Optional[_Request] = None
+        while source.queue:
+            entry = heapq.heappop(source.queue)
+            if stealing and entry[2].spec.pinned:
+                skipped.append(entry)
+                continue
+            head = entry[2]
+            break
+        if head is None:
+            for entry in skipped:
+                heapq.heappush(source.queue, entry)
+            return []
+        batch = [head]
+        budget = thief.spec.max_batch_tokens - head.tokens
+        while source.queue and len(batch) < head.spec.max_batch_size:
+            entry = heapq.heappop(source.queue)
+            request = entry[2]
+            if request.model_key == head.model_key and request.tokens <= budget:
+                batch.append(request)
+                budget -= request.tokens
+            else:
+                skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(source.queue, entry)
+        return batch
+
+    def _fill(self, state: _DeviceState, batch: List[_Request]) -> None:
+        """Wait up to ``max_wait_ms`` for more same-model requests on this device."""
+
+        head = batch[0]
+        deadline = time.perf_counter() + head.spec.max_wait_ms / 1000.0
+        budget = state.spec.max_batch_tokens - sum(request.tokens for request in batch)
+        while len(batch) < head.spec.max_batch_size and not self._closed:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+            kept: List[Tuple[int, int, _Request]] = []
+            while state.queue and len(batch) < head.spec.max_batch_size:
+                entry = heapq.heappop(state.queue)
+                request = entry[2]
+                if request.model_key == head.model_key and request.tokens <= budget:
+                    batch.append(request)
+                    budget -= request.tokens
+                else:
+                    kept.append(entry)
+            for entry in kept:
+                heapq.heappush(state.queue, entry)
+
+    def _worker(self, state: _DeviceState) -> None:
+        while True:
+            with self._cond:
+                batch: List[_Request] = []
+                while not batch:
+                    if self._closed:
+                        return
+                    if state.queue:
+                        batch = self._take_batch(state, state, stealing=False)
+                        if batch:
+                            self._fill(state, batch)
+                            break
+                    victim = self._steal_victim(state) if self.work_stealing else None
+                    if victim is not None:
+                        batch = self._take_batch(victim, state, stealing=True)
+                        if batch:
+                            state.stolen += len(batch)
+                            break
+                    self._cond.wait()
+                state.running = True
+            self._run(state, batch)
+            with self._cond:
+                state.running = False
+                self._cond.notify_all()
+
+    def _run(self, state: _DeviceState, batch: List[_Request]) -> None:
+        head = batch[0]
+        started = time.perf_counter()
+        try:
+            backend = self.backend_for(head.spec, state.spec.name)
+            outputs = backend.generate(
+                [request.prompt for request in batch],
+                max_new_tokens=max(request.max_new_tokens for request in batch),
+            )
+        except Exception as exc:
+            for request in batch:
+                request.future.set_exception(exc)
+            return
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            state.batches += 1
+            state.requests += len(batch)
+            state.busy_seconds += elapsed
+            for request, output in zip(batch, outputs):
+                wait = started - request.enqueued
+                state.queue_wait_total += wait
+                state.queue_wait_max = max(state.queue_wait_max, wait)
+                state.completion_tokens += output.completion_tokens
+        for request, output in zip(batch, outputs):
+            output.seconds = elapsed
+            output.batch_size = len(batch)
+            output.queue_seconds = started - request.enqueued
+            output.device = state.spec.name
+            request.future.set_result(output)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-device utilization, queue depth/wait, batching and throughput figures."""
+
+        wall = time.perf_counter() - self._started
+        with self._cond:
+            return {
+                name: {
+                    "utilization": state.busy_seconds / wall if wall else 0.0,
+                    "queue_depth": len(state.queue),
+                    "batches": state.batches,
+                    "requests": state.requests,
+                    "mean_batch_size": state.requests / state.batches if state.batches else 0.0,
+                    "stolen": state.stolen,
+                    "mean_queue_wait": state.queue_wait_total / state.requests if state.requests else 0.0,
+                    "max_queue_wait": state.queue_wait_max,
+                    "busy_seconds": state.busy_seconds,
+                    "tokens_per_sec": state.completion_tokens / state.busy_seconds if state.busy_seconds else 0.0,
+                }
+                for name, state in self._devices.items()
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            pending = [entry[2] for state in self._devices.values() for entry in state.queue]
+            for state in self._devices.values():
+                state.queue.clear()
+            self._cond.notify_all()
+            threads = [state.thread for state in self._devices.values() if state.thread is not None]
+        for request in pending:
+            request.future.set_exception(RuntimeError("scheduler closed"))
+        for thread in threads:
+            thread.join()
+        with self._backend_lock:
+            backends, self._backends = list(self._backends.values()), {}
+        for backend in backends:
+            backend.close()
@@ -2,9 +2,9 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from data.pr_data.processing.structures import PRReviewSample
+from data.pr_data.processing.structures import LONG_LINE_THRESHOLD, PRReviewSample
 
 from .base import AgentArtifact, AgentBlackboard, BaseAgent
 
@@ -16,30 +16,36 @@ class FixGeneratorAgent(BaseAgent):
         super().__init__("fix_generator", blackboard)
         self.load_rules(rules_path)
 
+    def fix_for(self, pr_sample: PRReviewSample, issue: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Draft a fix for one issue, or ``None`` when no fix applies."""
+
+        file_obj = pr_sample.get_file(issue["file_path"])
+        if not file_obj:
+            return None
+        target_line = file_obj.get_line_by_new_no(issue["line_no"])
+        original = target_line.content if target_line else ""
+        if len(original) <= self.rules_cache.get("long_line_threshold", LONG_LINE_THRESHOLD):
+            return None
+        suggested = original[:100] + " // TODO: 拆分逻辑，遵循OpenHarmony代码规范"
+        return {
+            "pr_number": pr_sample.pr_number,
+            "file_path": issue["file_path"],
+            "original_lines": [original],
+            "fixed_lines": [suggested],
+            "fix_desc": issue["issue_desc"],
+            "can_auto_apply": False,
+        }
+
+    def collect(self, pr_sample: PRReviewSample, fixes: List[Dict[str, Any]]) -> AgentArtifact:
+        return self.publish({"fixes": fixes})
+
     def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
         locator_artifact = self.blackboard.pull("line_locator")
         if not locator_artifact:
             raise RuntimeError("Line locator results missing")
         fixes: List[Dict[str, Any]] = []
         for issue in locator_artifact.payload.get("issues", []):
-            file_obj = pr_sample.get_file(issue["file_path"])
-            if not file_obj:
-                continue
-            target_line = file_obj.get_line_by_new_no(issue["line_no"])
-            original = target_line.content if target_line else ""
-            if len(original) <= self.rules_cache.get("long_line_threshold", 100):
-                continue
-            suggested = original[:100] + " // TODO: 拆分逻辑，遵循OpenHarmony代码规范"
-            fixes.append(
-                {
-                    "pr_number": pr_sample.pr_number,
-                    "file_path": issue["file_path"],
-                    "original_lines": [original],
-                    "fixed_lines": [suggested],
-                    "fix_desc": issue["issue_desc"],
-                    "can_auto_apply": False,
-                }
-            )
-        artifact = AgentArtifact(name=self.name, payload={"fixes": fixes})
-        self.blackboard.push(self.name, artifact)
-        return artifact
+            fix = self.fix_for(pr_sample, issue)
+            if fix is not None:
+                fixes.append(fix)
+        return self.collect(pr_sample, fixes)
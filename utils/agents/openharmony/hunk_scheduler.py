@@ -0,0 +1,113 @@
+"""Hunk-level dataflow scheduler for the review agent chain."""
+from __future__ import annotations
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from data.pr_data.processing.structures import PRReviewSample
+
+from .fix_generator_agent import FixGeneratorAgent
+from .line_locator_agent import LineLocatorAgent
+from .need_review_agent import NeedReviewAgent
+from .review_comment_agent import ReviewCommentAgent
+
+
+class HunkDAGScheduler:
+    """Runs need_review → review_comment → line_locator → fix_generator per hunk.
+
+    Every hunk is an independent chain of tasks: as soon as a hunk is judged
+    to need review its comment task is submitted, while other hunks may still
+    be waiting on their need-review call, and each located issue fans out into
+    its own fix task. The calling thread only dispatches successors, so the
+    PR finishes roughly when its slowest hunk chain does instead of after the
+    sum of four stage barriers. Outputs are reassembled in hunk order and
+    published through each agent's ``collect``, so the blackboard and results
+    match the stage-by-stage run.
+    """
+
+    def __init__(
+        self,
+        *,
+        need_review_agent: NeedReviewAgent,
+        review_comment_agent: ReviewCommentAgent,
+        line_locator_agent: LineLocatorAgent,
+        fix_generator_agent: FixGeneratorAgent,
+        max_workers: int = 8,
+    ) -> None:
+        self.need_review_agent = need_review_agent
+        self.review_comment_agent = review_comment_agent
+        self.line_locator_agent = line_locator_agent
+        self.fix_generator_agent = fix_generator_agent
+        self.max_workers = max(1, max_workers)
+
+    def run(self, pr_sample: PRReviewSample, *, enable_fix_generation: bool = True) -> Dict[str, Any]:
+        hunks = [(diff_file, hunk) for diff_file in pr_sample.diff_files for hunk in diff_file.hunks]
+        decisions: List[Optional[Dict[str, Any]]] = [None] * len(hunks)
+        comments: List[Optional[Dict[str, Any]]] = [None] * len(hunks)
+        issues: List[List[Dict[str, Any]]] = [[] for _ in hunks]
+        fixes: List[Dict[int, Dict[str, Any]]] = [{} for _ in hunks]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending: Set[Future] = set()
+
+            def submit(stage: str, key: Tuple[int, ...], fn: Callable[..., Any], *args: Any) -> None:
+                # Worker threads do not inherit context variables; copy them so
+                # blackboard namespaces stay visible inside agent calls.
+                context = contextvars.copy_context()
+                future = executor.submit(context.run, fn, pr_sample, *args)
+                future.stage, future.key = stage, key  # type: ignore[attr-defined]
+                pending.add(future)
+
+            for index, (diff_file, hunk) in enumerate(hunks):
+                submit("need_review", (index,), self.need_review_agent.judge_hunk, diff_file, hunk)
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, key = future.stage, future.key  # type: ignore[attr-defined]
+                    result = future.result()
+                    index = key[0]
+                    if stage == "need_review":
+                        decisions[index] = result
+                        if result.get("need_review"):
+                            submit("review_comment", key, self.review_comment_agent.comment_for, result)
+                    elif stage == "review_comment":
+                        if result is not None:
+                            comments[index] = result
+                            submit("line_locator", key, self.line_locator_agent.locate, result)
+                    elif stage == "line_locator":
+                        issues[index] = result
+                        if enable_fix_generation:
+                            for issue_index, issue in enumerate(result):
+                                submit(
+                                    "fix_generator",
+                                    (index, issue_index),
+                                    self.fix_generator_agent.fix_for,
+                                    issue,
+                                )
+                    elif stage == "fix_generator" and result is not None:
+                        fixes[index][key[1]] = result
+
+        need_review_artifact = self.need_review_agent.collect(
+            pr_sample, [decision for decision in decisions if decision is not None]
+        )
+        review_artifact = self.review_comment_agent.collect(
+            pr_sample, [comment for comment in comments if comment is not None]
+        )
+        locator_artifact = self.line_locator_agent.collect(
+            pr_sample, [issue for hunk_issues in issues for issue in hunk_issues]
+        )
+        fix_payload: Dict[str, Any] = {"fixes": []}
+        if enable_fix_generation:
+            fix_artifact = self.fix_generator_agent.collect(
+                pr_sample,
+                [hunk_fixes[i] for hunk_fixes in fixes for i in sorted(hunk_fixes)],
+            )
+            fix_payload = fix_artifact.payload
+        return {
+            "need_review": need_review_artifact.payload,
+            "review_comments": review_artifact.payload,
+            "issues": locator_artifact.payload,
+            "fixes": fix_payload,
+        }
@@ -4,7 +4,7 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Any, Dict, List
 
-from data.pr_data.processing.structures import PRReviewSample
+from data.pr_data.processing.structures import LONG_LINE_THRESHOLD, PRReviewSample
 
 from .base import AgentArtifact, AgentBlackboard, BaseAgent
 
@@ -16,34 +16,48 @@ class LineLocatorAgent(BaseAgent):
         super().__init__("line_locator", blackboard)
         self.load_rules(rules_path)
 
+    def locate(self, pr_sample: PRReviewSample, item: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return the issues found in the hunk referenced by one review comment."""
+
+        issues: List[Dict[str, Any]] = []
+        file_obj = pr_sample.get_file(item["file_path"])
+        if not file_obj:
+            return issues
+        new_range = item["hunk_range"]["new"]
+        hunk = file_obj.get_hunk_by_range(tuple(new_range))
+        if not hunk:
+            return issues
+        threshold = self.rules_cache.get("long_line_threshold", LONG_LINE_THRESHOLD)
+        stats = hunk.ensure_stats()
+        if stats.max_line_length <= threshold:
+            return issues
+        # 阈值不低于默认值时，只需检查解析阶段记录的长行
+        candidates = [hunk.lines[i] for i in stats.long_lines] if threshold >= LONG_LINE_THRESHOLD else hunk.lines
+        for line in candidates:
+            if line.status == "added" and len(line.content) > threshold:
+                issue_type = "maintainability"
+                desc = "新增行过长，建议拆分提升可读性"
+                evidence = line.content[:160]
+                issues.append(
+                    {
+                        "pr_number": pr_sample.pr_number,
+                        "file_path": file_obj.file_path,
+                        "line_no": line.new_line_no,
+                        "issue_type": issue_type,
+                        "issue_desc": desc,
+                        "evidence": evidence,
+                    }
+                )
+        return issues
+
+    def collect(self, pr_sample: PRReviewSample, issues: List[Dict[str, Any]]) -> AgentArtifact:
+        return self.publish({"issues": issues})
+
     def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
         review_artifact = self.blackboard.pull("review_comment")
         if not review_artifact:
             raise RuntimeError("Review comments missing")
         issues: List[Dict[str, Any]] = []
         for item in review_artifact.payload.get("comments", []):
-            file_obj = pr_sample.get_file(item["file_path"])
-            if not file_obj:
-                continue
-            new_range = item["hunk_range"]["new"]
-            hunk = file_obj.get_hunk_by_range(tuple(new_range))
-            if not hunk:
-                continue
-            for line in hunk.lines:
-                if line.status == "added" and len(line.content) > self.rules_cache.get("long_line_threshold", 100):
-                    issue_type = "maintainability"
-                    desc = "新增行过长，建议拆分提升可读性"
-                    evidence = line.content[:160]
-                    issues.append(
-                        {
-                            "pr_number": pr_sample.pr_number,
-                            "file_path": file_obj.file_path,
-                            "line_no": line.new_line_no,
-                            "issue_type": issue_type,
-                            "issue_desc": desc,
-                            "evidence": evidence,
-                        }
-                    )
-        artifact = AgentArtifact(name=self.name, payload={"issues": issues})
-        self.blackboard.push(self.name, artifact)
-        return artifact
+            issues.extend(self.locate(pr_sample, item))
+        return self.collect(pr_sample, issues)
@@ -0,0 +1,192 @@
+"""Pluggable local inference backends."""
+from __future__ import annotations
+
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .mock_server import canned_response
+
+_TOKEN_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af]|\w+|[^\w\s]")
+
+TRUNCATION_MARKER = "\n...\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokenizer-free token estimate: one token per CJK character, word or symbol."""
+
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+@dataclass
+class GenerationResult:
+    """Output of one prompt together with the measured cost of producing it."""
+
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    seconds: float = 0.0
+    batch_size: int = 1
+    queue_seconds: float = 0.0
+    device: str = ""
+
+
+class InferenceBackend:
+    """Interface every local inference engine implements.
+
+    ``generate`` receives a whole batch so engines that support padding or
+    continuous batching can run it in one forward pass.
+    """
+
+    name = "base"
+
+    def count_tokens(self, text: str) -> int:
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Keep the head and tail of ``text`` within ``max_tokens``; the middle is dropped.
+
+        The tokens of the marker replacing the middle count against ``max_tokens``.
+        """
+
+        tokens = list(_TOKEN_PATTERN.finditer(text))
+        if max_tokens <= 0 or len(tokens) <= max_tokens:
+            return text
+        keep = max_tokens - estimate_tokens(TRUNCATION_MARKER)
+        if keep < 2:
+            return text[tokens[-max_tokens].start() :]
+        head = keep // 2
+        tail = keep - head
+        return text[: tokens[head - 1].end()] + TRUNCATION_MARKER + text[tokens[-tail].start() :]
+
+    def generate(self, prompts: List[str], *, max_new_tokens: int) -> List[GenerationResult]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        return None
+
+
+class HeuristicBackend(InferenceBackend):
+    """Placeholder used when no model is configured; agents keep their rule-based path."""
+
+    name = "heuristic"
+
+    def generate(self, prompts: List[str], *, max_new_tokens: int) -> List[GenerationResult]:
+        return [GenerationResult(text="", prompt_tokens=self.count_tokens(p), completion_tokens=0) for p in prompts]
+
+
+class MockBackend(InferenceBackend):
+    """CPU-only backend returning the canned task answers of :mod:`mock_server`.
+
+    ``ms_per_token`` simulates decode cost per generated token of the longest
+    item in the batch, which is how padded batch decoding scales.
+    """
+
+    name = "mock"
+
+    def __init__(self, *, ms_per_token: float = 0.0, response_tokens: int = 32) -> None:
+        self.ms_per_token = ms_per_token
+        self.response_tokens = response_tokens
+
+    def generate(self, prompts: List[str], *, max_new_tokens: int) -> List[GenerationResult]:
+        texts = [json.dumps(canned_response(prompt, self.response_tokens), ensure_ascii=False) for prompt in prompts]
+        completion = [min(max_new_tokens, self.count_tokens(text)) for text in texts]
+        if self.ms_per_token and completion:
+            time.sleep(max(completion) * self.ms_per_token / 1000.0)
+        return [
+            GenerationResult(text=text, prompt_tokens=self.count_tokens(prompt), completion_tokens=tokens)
+            for prompt, text, tokens in zip(prompts, texts, completion)
+        ]
+
+
+class TransformersBackend(InferenceBackend):
+    """Hugging Face ``transformers`` causal LM running padded batches, CPU by default."""
+
+    name = "transformers"
+
+    def __init__(self, model_path: str, *, device: str = "cpu", threads: Optional[int] = None) -> None:
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("TransformersBackend requires `torch` and `transformers`") from exc
+        if threads:
+            torch.set_num_threads(threads)
+        if device.startswith("cuda") and not torch.cuda.is_available():
+            device = "cpu"
+        self._torch = torch
+        self.device = device
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model_path)
+        self.model.to(device)
+        self.model.eval()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        ids = self.tokenizer.encode(text, add_special_tokens=False)
+        if max_tokens <= 0 or len(ids) <= max_tokens:
+            return text
+        keep = max_tokens - self.count_tokens(TRUNCATION_MARKER)
+        if keep < 2:
+            return self.tokenizer.decode(ids[-max_tokens:])
+        # Decoding and re-encoding can merge tokens at the seams, so shrink until it fits.
+        while True:
+            head = keep // 2
+            tail = keep - head
+            truncated = self.tokenizer.decode(ids[:head]) + TRUNCATION_MARKER + self.tokenizer.decode(ids[-tail:])
+            if keep < 2 or self.count_tokens(truncated) <= max_tokens:
+                return truncated
+            keep -= 1
+
+    def generate(self, prompts: List[str], *, max_new_tokens: int) -> List[GenerationResult]:
+        torch = self._torch
+        encoded = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+        with torch.inference_mode():
+            output = self.model.generate(
+                **encoded,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.pad_token_id,
+            )
+        generated = output[:, encoded["input_ids"].shape[1] :]
+        texts = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+        prompt_tokens = encoded["attention_mask"].sum(dim=1).tolist()
+        completion_tokens = (generated != self.tokenizer.pad_token_id).sum(dim=1).tolist()
+        return [
+            GenerationResult(text=text, prompt_tokens=int(p), completion_tokens=int(c))
+            for text, p, c in zip(texts, prompt_tokens, completion_tokens)
+        ]
+
+
+BackendFactory = Callable[..., InferenceBackend]
+
+BACKENDS: Dict[str, BackendFactory] = {
+    "heuristic": lambda spec: HeuristicBackend(),
+    "mock": lambda spec: MockBackend(**spec.backend_options),
+    "transformers": lambda spec: TransformersBackend(
+        spec.model_path or spec.name,
+        device=spec.device,
+        **spec.backend_options,
+    ),
+}
+
+
+def register_backend(name: str, factory: BackendFactory) -> None:
+    """Make ``LocalModelSpec(backend=name)`` build its engine with ``factory(spec)``."""
+
+    BACKENDS[name] = factory
+
+
+def create_backend(spec: Any) -> InferenceBackend:
+    try:
+        factory = BACKENDS[spec.backend]
+    except KeyError as exc:
+        raise ValueError(f"Unknown local inference backend: {spec.backend}") from exc
+    return factory(spec)
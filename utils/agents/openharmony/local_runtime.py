@@ -1,39 +1,83 @@
 """Local multi-GPU runtime for OpenHarmony review agents."""
 from __future__ import annotations
 
-from dataclasses import dataclass
+import json
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
 
+from data.pr_data.processing.outputs import QuestionOutputPaths
 from data.pr_data.processing.structures import PRReviewSample
 
-from .base import AgentArtifact, AgentBlackboard
+from .base import DEFAULT_NAMESPACE, AgentArtifact, AgentBlackboard
+from .batch import run_many
+from .cloud_runtime import (
+    CloudCallResult,
+    CloudFixGeneratorAgent,
+    CloudLineLocatorAgent,
+    CloudNeedReviewAgent,
+    CloudReviewCommentAgent,
+)
 from .context_agent import ContextAgent
-from .fix_generator_agent import FixGeneratorAgent
-from .line_locator_agent import LineLocatorAgent
-from .need_review_agent import NeedReviewAgent
+from .context_packer import PromptBudget
+from .device_scheduler import DeviceScheduler, DeviceSpec
+from .local_backends import GenerationResult
 from .orchestrator import OpenHarmonyReviewOrchestrator
 from .project_context_agent import ProjectContextAgent
 from .reflector_agent import ReflectorAgent
-from .review_comment_agent import ReviewCommentAgent
 
 
 @dataclass
 class LocalModelSpec:
-    """Description of a locally部署的模型."""
+    """Description of a locally部署的模型.
+
+    ``backend`` selects the inference engine (see ``local_backends.BACKENDS``);
+    the default ``"heuristic"`` performs no inference and keeps the agents on
+    their rule-based path. ``max_context`` bounds prompt plus generated tokens.
+    Lower ``priority`` values are dispatched first; ``pinned`` models are never
+    moved to another device by work stealing.
+    """
 
     name: str
     device: str
     max_context: int
     priority: int = 0
+    backend: str = "heuristic"
+    model_path: Optional[str] = None
+    max_new_tokens: int = 256
+    max_batch_size: int = 8
+    max_wait_ms: float = 5.0
+    backend_options: Dict[str, Any] = field(default_factory=dict)
+    pinned: bool = False
+
+    @property
+    def generation_budget(self) -> int:
+        """Tokens reserved for generation; at most half of the context window."""
+
+        return min(self.max_new_tokens, self.max_context // 2)
+
+    @property
+    def prompt_budget(self) -> int:
+        return self.max_context - self.generation_budget
 
 
 class LocalModelRegistry:
-    """Tracks task-to-model映射并记录调用日志."""
+    """Tracks task-to-model映射, schedules local inference and records调用日志.
 
-    def __init__(self) -> None:
+    Inference requests go through a :class:`DeviceScheduler` with one priority
+    queue per device; pass ``devices`` to set per-device batch token budgets.
+    """
+
+    max_unscoped_invocations = 10000
+
+    def __init__(self, devices: Optional[Iterable[DeviceSpec]] = None, *, work_stealing: bool = True) -> None:
         self._registry: Dict[str, LocalModelSpec] = {}
-        self._invocations: List[Dict[str, Any]] = []
+        # Invocation log per run_id, so a finished run's entries can be dropped in O(1).
+        self._invocations: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.scheduler = DeviceScheduler(devices, work_stealing=work_stealing)
 
     def register(self, task: str, spec: LocalModelSpec) -> None:
         self._registry[task] = spec
@@ -41,6 +85,56 @@ class LocalModelRegistry:
     def resolve(self, task: str) -> LocalModelSpec:
         return self._registry.get(task, LocalModelSpec(name="heuristic", device="cpu", max_context=4096))
 
+    def has_backend(self, task: str) -> bool:
+        return self.resolve(task).backend != "heuristic"
+
+    def infer(self, task: str, prompts: Sequence[str], *, run_id: Optional[str] = None) -> List[GenerationResult]:
+        """Generate completions for ``prompts`` on the task's model and log the measured cost."""
+
+        if not prompts:
+            return []
+        spec = self.resolve(task)
+        backend = self.scheduler.backend_for(spec)
+        max_new_tokens = spec.generation_budget
+        truncated = [backend.truncate(prompt, spec.prompt_budget) for prompt in prompts]
+        started = time.perf_counter()
+        futures = [self.scheduler.submit(spec, prompt, max_new_tokens=max_new_tokens) for prompt in truncated]
+        results: List[GenerationResult] = []
+        rejected = 0
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception:
+                # A rejected or failed item yields empty text, so its agent falls back to the heuristic.
+                rejected += 1
+                results.append(GenerationResult(text="", prompt_tokens=0, completion_tokens=0))
+        elapsed = time.perf_counter() - started
+        completion_tokens = sum(result.completion_tokens for result in results)
+        self.record(
+            task,
+            sum(result.prompt_tokens for result in results),
+            {
+                "run_id": run_id,
+                "backend": spec.backend,
+                "prompts": len(prompts),
+                "truncated": sum(1 for before, after in zip(prompts, truncated) if before != after),
+                "completion_tokens": completion_tokens,
+                "seconds": elapsed,
+                "tokens_per_sec": completion_tokens / elapsed if elapsed else 0.0,
+                "mean_batch_size": sum(result.batch_size for result in results) / len(results),
+                "queue_seconds": max(result.queue_seconds for result in results),
+                "rejected": rejected,
+                "executed_on": sorted({result.device for result in results if result.device}),
+            },
+        )
+        return results
+
+    def device_stats(self) -> Dict[str, Dict[str, Any]]:
+        return self.scheduler.stats()
+
+    def close(self) -> None:
+        self.scheduler.close()
+
     def record(self, task: str, payload_size: int, extra: Optional[Dict[str, Any]] = None) -> None:
         spec = self.resolve(task)
         entry = {
@@ -53,63 +147,148 @@ class LocalModelRegistry:
         }
         if extra:
             entry.update(extra)
-        self._invocations.append(entry)
+        run_id = entry.get("run_id")
+        with self._lock:
+            entries = self._invocations.setdefault(run_id, [])
+            entries.append(entry)
+            # Entries outside any run are never released; keep only the most recent ones.
+            if run_id in (None, DEFAULT_NAMESPACE) and len(entries) > self.max_unscoped_invocations:
+                del entries[: len(entries) - self.max_unscoped_invocations]
 
     @property
     def invocations(self) -> List[Dict[str, Any]]:
-        return list(self._invocations)
+        with self._lock:
+            return [entry for entries in self._invocations.values() for entry in entries]
+
+    def invocations_for(self, run_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._invocations.get(str(run_id), ()))
+
+    def release(self, run_id: str) -> List[Dict[str, Any]]:
+        """Drop and return the invocation log of a finished run."""
+
+        with self._lock:
+            return self._invocations.pop(str(run_id), [])
+
+
+def _extract_json(text: str) -> Optional[Dict[str, Any]]:
+    """Pull the first JSON object out of free-form model output."""
+
+    start = text.find("{")
+    end = text.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
 
 
-class LocalNeedReviewAgent(NeedReviewAgent):
-    """NeedReviewAgent enhanced with本地模型调度记录."""
+class LocalLLMClient:
+    """Exposes a task's local model through the ``CloudLLMClient`` call API.
+
+    The instance is falsy while the task is served by the heuristic backend,
+    so the agents skip prompting and keep their rule-based outputs.
+    """
+
+    def __init__(self, registry: LocalModelRegistry, task: str, blackboard: AgentBlackboard) -> None:
+        self.registry = registry
+        self.task = task
+        self.blackboard = blackboard
+
+    def __bool__(self) -> bool:
+        return self.registry.has_backend(self.task)
+
+    def prompt_budget(self) -> Optional[PromptBudget]:
+        """The model's prompt window, measured with its own tokenizer."""
+
+        if not self.registry.has_backend(self.task):
+            return None
+        spec = self.registry.resolve(self.task)
+        return PromptBudget(spec.prompt_budget, self.registry.scheduler.backend_for(spec).count_tokens)
+
+    def call_json(self, prompt: str, *, default: Dict[str, Any]) -> CloudCallResult:
+        return self.call_json_batch([prompt], [default])[0]
+
+    def call_json_batch(self, prompts: Sequence[str], defaults: Sequence[Dict[str, Any]]) -> List[CloudCallResult]:
+        generations = self.registry.infer(self.task, prompts, run_id=self.blackboard.current_namespace)
+        results: List[CloudCallResult] = []
+        for generation, default in zip(generations, defaults):
+            payload = _extract_json(generation.text)
+            if payload is None:
+                results.append(CloudCallResult(payload=dict(default), used_cloud=False))
+            else:
+                results.append(CloudCallResult(payload=payload, used_cloud=True, source="local"))
+        return results
+
+
+class LocalNeedReviewAgent(CloudNeedReviewAgent):
+    """NeedReviewAgent enhanced with本地模型推理与调度记录."""
 
     def __init__(self, blackboard: AgentBlackboard, *, registry: LocalModelRegistry, **kwargs: Any) -> None:
-        super().__init__(blackboard, **kwargs)
+        super().__init__(blackboard, llm_client=LocalLLMClient(registry, "need_review", blackboard), **kwargs)  # type: ignore[arg-type]
         self.registry = registry
 
-    def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
-        artifact = super().run(pr_sample)
-        self.registry.record("need_review", len(artifact.payload.get("decisions", [])))
+    def publish(self, payload: Dict[str, Any]) -> AgentArtifact:
+        artifact = super().publish(payload)
+        self.registry.record(
+            "need_review",
+            len(artifact.payload.get("decisions", [])),
+            {"run_id": self.blackboard.current_namespace},
+        )
         return artifact
 
 
-class LocalReviewCommentAgent(ReviewCommentAgent):
-    """ReviewCommentAgent with本地模型日志."""
+class LocalReviewCommentAgent(CloudReviewCommentAgent):
+    """ReviewCommentAgent with本地模型推理与日志."""
 
     def __init__(self, blackboard: AgentBlackboard, *, registry: LocalModelRegistry, **kwargs: Any) -> None:
-        super().__init__(blackboard, **kwargs)
+        super().__init__(blackboard, llm_client=LocalLLMClient(registry, "review_comment", blackboard), **kwargs)  # type: ignore[arg-type]
         self.registry = registry
 
-    def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
-        artifact = super().run(pr_sample)
+    def publish(self, payload: Dict[str, Any]) -> AgentArtifact:
+        artifact = super().publish(payload)
         payload_size = sum(len(c["review_comment"]["context_snippet"]) for c in artifact.payload.get("comments", []))
-        self.registry.record("review_comment", payload_size)
+        self.registry.record(
+            "review_comment",
+            payload_size,
+            {"run_id": self.blackboard.current_namespace},
+        )
         return artifact
 
 
-class LocalLineLocatorAgent(LineLocatorAgent):
-    """LineLocatorAgent that logs GPU 分配."""
+class LocalLineLocatorAgent(CloudLineLocatorAgent):
+    """LineLocatorAgent that runs on the assigned GPU/CPU 模型."""
 
     def __init__(self, blackboard: AgentBlackboard, *, registry: LocalModelRegistry, **kwargs: Any) -> None:
-        super().__init__(blackboard, **kwargs)
+        super().__init__(blackboard, llm_client=LocalLLMClient(registry, "line_locator", blackboard), **kwargs)  # type: ignore[arg-type]
         self.registry = registry
 
-    def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
-        artifact = super().run(pr_sample)
-        self.registry.record("line_locator", len(artifact.payload.get("issues", [])))
+    def publish(self, payload: Dict[str, Any]) -> AgentArtifact:
+        artifact = super().publish(payload)
+        self.registry.record(
+            "line_locator",
+            len(artifact.payload.get("issues", [])),
+            {"run_id": self.blackboard.current_namespace},
+        )
         return artifact
 
 
-class LocalFixGeneratorAgent(FixGeneratorAgent):
-    """FixGeneratorAgent with GPU usage tracing."""
+class LocalFixGeneratorAgent(CloudFixGeneratorAgent):
+    """FixGeneratorAgent with local inference and GPU usage tracing."""
 
     def __init__(self, blackboard: AgentBlackboard, *, registry: LocalModelRegistry, **kwargs: Any) -> None:
-        super().__init__(blackboard, **kwargs)
+        super().__init__(blackboard, llm_client=LocalLLMClient(registry, "fix_generator", blackboard), **kwargs)  # type: ignore[arg-type]
         self.registry = registry
 
-    def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
-        artifact = super().run(pr_sample)
-        self.registry.record("fix_generator", len(artifact.payload.get("fixes", [])))
+    def publish(self, payload: Dict[str, Any]) -> AgentArtifact:
+        artifact = super().publish(payload)
+        self.registry.record(
+            "fix_generator",
+            len(artifact.payload.get("fixes", [])),
+            {"run_id": self.blackboard.current_namespace},
+        )
         return artifact
 
 
@@ -122,6 +301,7 @@ class LocalOpenHarmonyPipeline:
         registry: Optional[LocalModelRegistry] = None,
         blackboard: Optional[AgentBlackboard] = None,
         reflector_rules_path: Optional[Path] = None,
+        hunk_workers: Optional[int] = None,
     ) -> None:
         self.registry = registry or LocalModelRegistry()
         self.blackboard = blackboard or AgentBlackboard()
@@ -146,6 +326,7 @@ class LocalOpenHarmonyPipeline:
             line_locator_agent=line_agent,
             fix_generator_agent=fix_agent,
             reflector_agent=reflector_agent,
+            hunk_workers=hunk_workers,
         )
 
     def _ensure_default_models(self) -> None:
@@ -170,11 +351,47 @@ class LocalOpenHarmonyPipeline:
                 LocalModelSpec(name="codeqwen-7b", device="cuda:0", max_context=16384, priority=1),
             )
 
-    def run(self, pr_sample: PRReviewSample, *, enable_fix_generation: bool = True) -> Dict[str, Any]:
-        result = self.orchestrator.run(pr_sample, enable_fix_generation=enable_fix_generation)
-        result["scheduler_log"] = self.registry.invocations
+    def run(
+        self,
+        pr_sample: PRReviewSample,
+        *,
+        enable_fix_generation: bool = True,
+        run_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        try:
+            result = self.orchestrator.run(pr_sample, enable_fix_generation=enable_fix_generation, run_id=run_id)
+        except Exception:
+            if run_id is not None:
+                self.registry.release(run_id)
+            raise
+        if run_id is not None:
+            # The run's namespace is released by the caller, so its log leaves the registry with the result.
+            result["scheduler_log"] = self.registry.release(run_id)
+        else:
+            result["scheduler_log"] = self.registry.invocations
         return result
 
+    def run_many(
+        self,
+        samples: Iterable[PRReviewSample],
+        *,
+        concurrency: int = 4,
+        ordered: bool = True,
+        enable_fix_generation: bool = True,
+        output_paths: Optional[QuestionOutputPaths] = None,
+        on_error: str = "record",
+    ) -> Iterator[Dict[str, Any]]:
+        return run_many(
+            self.run,
+            self.blackboard,
+            samples,
+            concurrency=concurrency,
+            ordered=ordered,
+            enable_fix_generation=enable_fix_generation,
+            output_paths=output_paths,
+            on_error=on_error,
+        )
+
     def reflect(self, successful_samples: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         if not self.orchestrator.reflector_agent:
             return None
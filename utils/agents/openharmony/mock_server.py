@@ -0,0 +1,247 @@
+"""Local stand-in for the cloud LLM endpoint used by :class:`CloudLLMClient`.
+
+The server speaks the same JSON protocol as the client: ``POST {"model", "prompt"}``
+returns one JSON object, ``POST {"model", "prompts": [...]}`` returns
+``{"results": [...]}``. Responses are schema-valid for the four review tasks
+(问题一 ~ 问题四), so ``CloudOpenHarmonyPipeline`` can run end to end offline.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+_TASK_MARKERS = {
+    "问题一": "need_review",
+    "问题二": "review_comment",
+    "问题三": "line_locator",
+    "问题四": "fix_generator",
+}
+_LINE_RANGE = re.compile(r"新 \[(\d+), (\d+)\]|'new': \[(\d+), (\d+)\]")
+
+
+@dataclass
+class MockServerConfig:
+    """Latency, failure and payload-size knobs of :class:`MockLLMServer`.
+
+    ``latency`` picks the distribution of the base delay: ``"constant"``
+    (``latency_ms``), ``"uniform"`` (``latency_ms ± jitter_ms``) or
+    ``"lognormal"`` (median ``latency_ms``, shape ``sigma``, long tail).
+    ``response_tokens`` pads free-text fields to roughly that many tokens and
+    each token adds ``ms_per_token`` to the delay. ``error_rate`` and
+    ``throttle_rate`` are the probabilities of answering 500 and 429.
+    """
+
+    latency: str = "lognormal"
+    latency_ms: float = 200.0
+    jitter_ms: float = 50.0
+    sigma: float = 0.5
+    response_tokens: int = 32
+    ms_per_token: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    batch_overhead_ms: float = 0.0
+    seed: Optional[int] = 0
+
+    def base_delay(self, rng: random.Random) -> float:
+        if self.latency == "constant":
+            delay = self.latency_ms
+        elif self.latency == "uniform":
+            delay = rng.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        elif self.latency == "lognormal":
+            delay = self.latency_ms * rng.lognormvariate(0.0, self.sigma)
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.latency}")
+        return max(0.0, delay) / 1000.0
+
+
+def detect_task(prompt: str) -> Optional[str]:
+    for marker, task in _TASK_MARKERS.items():
+        if marker in prompt:
+            return task
+    return None
+
+
+def _filler(prompt: str, tokens: int) -> str:
+    digest = hashlib.md5(prompt.encode("utf-8")).hexdigest()
+    words = [digest[i : i + 4] for i in range(0, len(digest), 4)]
+    return " ".join(words[i % len(words)] for i in range(tokens))
+
+
+def canned_response(prompt: str, tokens: int = 32) -> Dict[str, Any]:
+    """Deterministic, schema-valid answer for one of the four task prompts."""
+
+    task = detect_task(prompt)
+    seed = int(hashlib.md5(prompt.encode("utf-8")).hexdigest(), 16)
+    text = _filler(prompt, tokens)
+    if task == "need_review":
+        return {"need_review": seed % 3 != 0, "reason": f"mock: {text}"}
+    if task == "review_comment":
+        return {"summary": "mock review comment", "rationale": text, "context_snippet": ""}
+    if task == "line_locator":
+        match = _LINE_RANGE.search(prompt)
+        start, end = (1, 1)
+        if match:
+            groups = [int(g) for g in match.groups() if g is not None]
+            start, end = groups[0], max(groups[0], groups[1])
+        line_no = start + seed % (end - start + 1)
+        return {
+            "issues": [
+                {"line_no": line_no, "issue_type": "maintainability", "issue_desc": f"mock: {text}", "evidence": ""}
+            ]
+        }
+    if task == "fix_generator":
+        return {"fixed_lines": [f"// mock fix {seed % 1000}"], "fix_desc": text, "can_auto_apply": False}
+    return {"text": text}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_MockHTTPServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - BaseHTTPRequestHandler API
+        return
+
+    def _reply(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        encoded = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def do_GET(self) -> None:  # noqa: N802 - BaseHTTPRequestHandler API
+        if self.path.rstrip("/") == "/stats":
+            self._reply(200, self.server.owner.stats())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # noqa: N802 - BaseHTTPRequestHandler API
+        owner = self.server.owner
+        started = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            self._reply(400, {"error": "invalid JSON"})
+            return
+        prompts: List[str] = body["prompts"] if isinstance(body.get("prompts"), list) else [body.get("prompt", "")]
+        status, delay = owner.plan(len(prompts), "prompts" in body)
+        time.sleep(delay)
+        if status == 429:
+            self._reply(429, {"error": "throttled"}, {"Retry-After": "0"})
+        elif status != 200:
+            self._reply(status, {"error": "injected failure"})
+        else:
+            tokens = owner.config.response_tokens
+            results = [canned_response(prompt, tokens) for prompt in prompts]
+            self._reply(200, {"results": results} if "prompts" in body else results[0])
+        owner.record(status, len(prompts), time.perf_counter() - started)
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    owner: "MockLLMServer"
+
+
+class MockLLMServer:
+    """Threaded local HTTP server emulating the cloud LLM endpoint.
+
+    Use as a context manager; ``url`` is the endpoint to hand to
+    ``CloudLLMClient(endpoint=..., batch_endpoint=...)`` and ``stats()``
+    reports request counts and server-side latency percentiles.
+    """
+
+    def __init__(self, config: Optional[MockServerConfig] = None, *, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or MockServerConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._status_counts: Dict[int, int] = {}
+        self._prompt_count = 0
+        self._httpd = _MockHTTPServer((host, port), _Handler)
+        self._httpd.owner = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/generate"
+
+    def plan(self, prompt_count: int, batched: bool) -> Tuple[int, float]:
+        """Draw the status code and delay for one request."""
+
+        config = self.config
+        with self._lock:
+            draw = self._rng.random()
+            delay = config.base_delay(self._rng)
+        delay += prompt_count * config.response_tokens * config.ms_per_token / 1000.0
+        if batched:
+            delay += config.batch_overhead_ms / 1000.0
+        if draw < config.throttle_rate:
+            return 429, 0.0
+        if draw < config.throttle_rate + config.error_rate:
+            return 500, delay
+        return 200, delay
+
+    def record(self, status: int, prompt_count: int, elapsed: float) -> None:
+        with self._lock:
+            self._status_counts[status] = self._status_counts.get(status, 0) + 1
+            if status == 200:
+                self._latencies.append(elapsed)
+                self._prompt_count += prompt_count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counts = dict(self._status_counts)
+            prompts = self._prompt_count
+        return {
+            "requests": sum(counts.values()),
+            "status_counts": {str(status): count for status, count in sorted(counts.items())},
+            "prompts_served": prompts,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._latencies.clear()
+            self._status_counts.clear()
+            self._prompt_count = 0
+
+    def start(self) -> "MockLLMServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-llm-server", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
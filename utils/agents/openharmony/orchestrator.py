@@ -1,13 +1,16 @@
 """Orchestrator coordinating all OpenHarmony review agents."""
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional
 
+from data.pr_data.processing.outputs import QuestionOutputPaths
 from data.pr_data.processing.structures import PRReviewSample
 
 from .base import AgentBlackboard, AgentArtifact
+from .batch import run_many
 from .context_agent import ContextAgent
 from .fix_generator_agent import FixGeneratorAgent
+from .hunk_scheduler import HunkDAGScheduler
 from .line_locator_agent import LineLocatorAgent
 from .need_review_agent import NeedReviewAgent
 from .project_context_agent import ProjectContextAgent
@@ -29,6 +32,7 @@ class OpenHarmonyReviewOrchestrator:
         line_locator_agent: LineLocatorAgent | None = None,
         fix_generator_agent: FixGeneratorAgent | None = None,
         reflector_agent: ReflectorAgent | None = None,
+        hunk_workers: Optional[int] = None,
     ) -> None:
         self.blackboard = blackboard or AgentBlackboard()
         self.project_context_agent = project_context_agent or ProjectContextAgent(self.blackboard)
@@ -38,10 +42,41 @@ class OpenHarmonyReviewOrchestrator:
         self.line_locator_agent = line_locator_agent or LineLocatorAgent(self.blackboard)
         self.fix_generator_agent = fix_generator_agent or FixGeneratorAgent(self.blackboard)
         self.reflector_agent = reflector_agent
+        # ``hunk_workers`` switches the four review stages from stage barriers
+        # to per-hunk pipelining; ``None`` keeps the sequential stage order.
+        self.hunk_scheduler: Optional[HunkDAGScheduler] = None
+        if hunk_workers is not None:
+            self.hunk_scheduler = HunkDAGScheduler(
+                need_review_agent=self.need_review_agent,
+                review_comment_agent=self.review_comment_agent,
+                line_locator_agent=self.line_locator_agent,
+                fix_generator_agent=self.fix_generator_agent,
+                max_workers=hunk_workers,
+            )
 
-    def run(self, pr_sample: PRReviewSample, *, enable_fix_generation: bool = True) -> Dict[str, Any]:
+    def run(
+        self,
+        pr_sample: PRReviewSample,
+        *,
+        enable_fix_generation: bool = True,
+        run_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Review one PR.
+
+        With ``run_id`` the agents read and write an isolated blackboard
+        namespace, so several PRs can be reviewed concurrently on one instance.
+        """
+
+        if run_id is None:
+            return self._run_stages(pr_sample, enable_fix_generation=enable_fix_generation)
+        with self.blackboard.namespace(run_id):
+            return self._run_stages(pr_sample, enable_fix_generation=enable_fix_generation)
+
+    def _run_stages(self, pr_sample: PRReviewSample, *, enable_fix_generation: bool) -> Dict[str, Any]:
         self.project_context_agent.run(pr_sample)
         self.context_agent.run(pr_sample)
+        if self.hunk_scheduler is not None:
+            return self.hunk_scheduler.run(pr_sample, enable_fix_generation=enable_fix_generation)
         need_review_artifact = self.need_review_agent.run(pr_sample)
         review_artifact = self.review_comment_agent.run(pr_sample)
         locator_artifact = self.line_locator_agent.run(pr_sample)
@@ -56,6 +91,29 @@ class OpenHarmonyReviewOrchestrator:
         }
         return results
 
+    def run_many(
+        self,
+        samples: Iterable[PRReviewSample],
+        *,
+        concurrency: int = 4,
+        ordered: bool = True,
+        enable_fix_generation: bool = True,
+        output_paths: Optional[QuestionOutputPaths] = None,
+        on_error: str = "record",
+    ) -> Iterator[Dict[str, Any]]:
+        """Review a stream of PRs with bounded concurrency; see :func:`batch.run_many`."""
+
+        return run_many(
+            self.run,
+            self.blackboard,
+            samples,
+            concurrency=concurrency,
+            ordered=ordered,
+            enable_fix_generation=enable_fix_generation,
+            output_paths=output_paths,
+            on_error=on_error,
+        )
+
     def reflect(self, successful_samples: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         if not self.reflector_agent:
             return None
@@ -0,0 +1,144 @@
+"""Persistent prompt → response cache for cloud LLM calls."""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+def cache_key(
+    *,
+    endpoint: Optional[str],
+    model: Optional[str],
+    prompt: str,
+    params: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Stable key over (endpoint, model, prompt hash, decoding params)."""
+
+    material = json.dumps(
+        {
+            "endpoint": endpoint,
+            "model": model,
+            "params": params or {},
+            "prompt": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """sqlite-backed response cache with TTL and size-bounded LRU eviction.
+
+    Entries older than ``ttl`` seconds are treated as misses and purged. When
+    the stored payloads exceed ``max_bytes`` the least recently used entries are
+    evicted down to ``evict_ratio`` of the limit. ``stats()`` reports hit rate
+    for the lifetime of this instance.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = 512 * 1024 * 1024,
+        evict_ratio: float = 0.9,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_ratio = evict_ratio
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT payload, size, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            payload, size, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(payload)
+
+    def put(self, key: str, payload: Dict[str, Any]) -> None:
+        encoded = json.dumps(payload, ensure_ascii=False)
+        size = len(encoded.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, size, now, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self.max_bytes is not None and self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * self.evict_ratio))
+
+    def _evict(self, target_bytes: int) -> None:
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total_bytes <= target_bytes:
+                break
+            doomed.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def purge_expired(self) -> int:
+        if self.ttl is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from data.pr_data.processing.structures import PRReviewSample
 
@@ -16,29 +16,35 @@ class ReviewCommentAgent(BaseAgent):
         super().__init__("review_comment", blackboard)
         self.load_rules(rules_path)
 
+    def comment_for(self, pr_sample: PRReviewSample, decision: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Build the comment for one need-review decision, or ``None`` if it needs no review."""
+
+        if not decision["need_review"]:
+            return None
+        file_obj = pr_sample.get_file(decision["file_path"])
+        hunk = file_obj.get_hunk_by_range(tuple(decision["hunk_range"]["new"])) if file_obj else None
+        context_lines = hunk.render_snippet() if hunk else ""
+        return {
+            "pr_number": pr_sample.pr_number,
+            "file_path": decision["file_path"],
+            "hunk_range": decision["hunk_range"],
+            "review_comment": {
+                "summary": "建议检查此变更是否符合OpenHarmony模块规范",
+                "context_snippet": context_lines,
+                "rationale": decision["reason"],
+            },
+        }
+
+    def collect(self, pr_sample: PRReviewSample, comments: List[Dict[str, Any]]) -> AgentArtifact:
+        return self.publish({"comments": comments})
+
     def run(self, pr_sample: PRReviewSample) -> AgentArtifact:
         need_review_artifact = self.blackboard.pull("need_review")
         if not need_review_artifact:
             raise RuntimeError("Need review results missing")
         review_comments: List[Dict[str, Any]] = []
         for decision in need_review_artifact.payload["decisions"]:
-            if not decision["need_review"]:
-                continue
-            file_obj = pr_sample.get_file(decision["file_path"])
-            hunk = file_obj.get_hunk_by_range(tuple(decision["hunk_range"]["new"])) if file_obj else None
-            context_lines = hunk.render_snippet() if hunk else ""
-            review_comments.append(
-                {
-                    "pr_number": pr_sample.pr_number,
-                    "file_path": decision["file_path"],
-                    "hunk_range": decision["hunk_range"],
-                    "review_comment": {
-                        "summary": "建议检查此变更是否符合OpenHarmony模块规范",
-                        "context_snippet": context_lines,
-                        "rationale": decision["reason"],
-                    },
-                }
-            )
-        artifact = AgentArtifact(name=self.name, payload={"comments": review_comments})
-        self.blackboard.push(self.name, artifact)
-        return artifact
+            comment = self.comment_for(pr_sample, decision)
+            if comment is not None:
+                review_comments.append(comment)
+        return self.collect(pr_sample, review_comments)
@@ -1,58 +1,84 @@
 import os
+from enum import Enum
+from functools import lru_cache
 
 
-# 判断文件是否是一个代码文件
-def is_code_file(file_path):
-    # 常见的代码文件扩展名
-    code_extensions = {
-        '.cpp', '.c', '.cc', '.h', '.hpp',
-        '.xml', '.ets', '.js', '.ts', '.mjs', '.rs', '.css', '.html',
-        '.py',
-        '.gn', '.gni',
-        '.rc', '.idl',
-        '.java',
-        '.go', '.rb', '.php', '.sql', '.swift',
-        '.kt', '.kts', '.scala', '.cs', '.cxx', '.hxx', '.m', '.mm'
-    }
-
-    # 常见的配置文件扩展名
-    config_extensions = {
-        '.conf', '.config', '.ini', '.properties', '.cfg', '.toml', '.env', '.yaml', '.yml'
-    }
-
-    # 常见的非代码文件扩展名（文档、资源、二进制等）
-    non_code_extensions = {
-        '.txt', '.log', '.md', '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
-        '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.ico', '.svg', '.webp',
-        '.zip', '.tar', '.gz', '.rar', '.7z',
-        '.exe', '.dll', '.so', '.dylib', '.bin',
-        '.cer', '.crt', '.pem', '.key', '.p12', '.pfx',
-        '.gitignore', '.gitattributes', '.lock', '.sum',
-        '.license', '.LICENSE', '.notice', '.NOTICE'
-    }
-
-    # 获取文件扩展名
-    _, ext = os.path.splitext(file_path.lower())
+class FileCategory(str, Enum):
+    """文件类别：代码 / 配置 / 文档 / 二进制资源 / 未知"""
+    CODE = 'code'
+    CONFIG = 'config'
+    DOC = 'doc'
+    BINARY = 'binary'
+    UNKNOWN = 'unknown'
+
+
+# 常见的代码文件扩展名
+CODE_EXTENSIONS = frozenset({
+    '.cpp', '.c', '.cc', '.h', '.hpp',
+    '.xml', '.ets', '.js', '.ts', '.mjs', '.rs', '.css', '.html',
+    '.py',
+    '.gn', '.gni',
+    '.rc', '.idl',
+    '.java',
+    '.go', '.rb', '.php', '.sql', '.swift',
+    '.kt', '.kts', '.scala', '.cs', '.cxx', '.hxx', '.m', '.mm'
+})
+
+# 常见的配置文件扩展名
+CONFIG_EXTENSIONS = frozenset({
+    '.conf', '.config', '.ini', '.properties', '.cfg', '.toml', '.env', '.yaml', '.yml',
+    '.gitignore', '.gitattributes', '.lock', '.sum'
+})
 
-    # 移除扩展名中的点号（如果有）
-    ext = ext.lstrip('.')
+# 常见的文档类扩展名
+DOC_EXTENSIONS = frozenset({
+    '.txt', '.log', '.md', '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+    '.license', '.notice'
+})
 
-    # 特殊处理没有扩展名的文件
-    if not ext:
-        # 检查是否为特定的配置文件名（无扩展名）
-        return False
+# 常见的二进制/资源类扩展名（图片、压缩包、可执行文件、证书等）
+BINARY_EXTENSIONS = frozenset({
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.ico', '.svg', '.webp',
+    '.zip', '.tar', '.gz', '.rar', '.7z',
+    '.exe', '.dll', '.so', '.dylib', '.bin',
+    '.cer', '.crt', '.pem', '.key', '.p12', '.pfx'
+})
 
-    # 如果是明确的代码扩展名
-    if '.' + ext in code_extensions:
-        return True
+# 扩展名 -> 类别 的查找表，模块加载时构建一次
+_EXTENSION_TABLE = {}
+for _category, _extensions in (
+        (FileCategory.BINARY, BINARY_EXTENSIONS),
+        (FileCategory.DOC, DOC_EXTENSIONS),
+        (FileCategory.CONFIG, CONFIG_EXTENSIONS),
+        (FileCategory.CODE, CODE_EXTENSIONS),
+):
+    for _ext in _extensions:
+        _EXTENSION_TABLE[_ext] = _category
+del _category, _extensions, _ext
 
-    # 如果是明确的配置扩展名
-    if '.' + ext in config_extensions:
-        return False
 
-    # 如果是明确的非代码扩展名
-    if '.' + ext in non_code_extensions:
-        return False
+@lru_cache(maxsize=65536)
+def classify_path(file_path):
+    """
+    根据扩展名判断文件类别，结果按路径缓存；同一路径在评论循环中反复出现时只计算一次
+    """
+    if not file_path:
+        return FileCategory.UNKNOWN
+    # 获取文件扩展名（没有扩展名的文件直接视为未知）
+    _, ext = os.path.splitext(file_path.lower())
+    if not ext or ext == '.':
+        return FileCategory.UNKNOWN
+    return _EXTENSION_TABLE.get(ext, FileCategory.UNKNOWN)
+
+
+def classify_paths(paths):
+    """
+    批量判断文件类别，适用于一整列路径（list / pandas.Series 等可迭代对象），返回与输入顺序一致的类别列表
+    """
+    return [classify_path(path) for path in paths]
 
-    # 对于未知扩展名，默认认为不是代码文件
-    return False
+
+# 判断文件是否是一个代码文件
+def is_code_file(file_path):
+    # 配置文件、文档、二进制以及未知扩展名都不认为是代码文件
+    return classify_path(file_path) is FileCategory.CODE